@@ -0,0 +1,124 @@
+import argparse
+import json
+
+import reservations
+from pricing import SERVICE_CATEGORIES
+
+# Revenue and load-factor reporting. BookingStats folds bookings into
+# per-flight aggregates (seats sold, ancillary revenue, service mix) in one
+# pass; reservations keeps one instance up to date as bookings are made and
+# cancelled, so /api/stats only has to combine it with the seat counts.
+
+class BookingStats:
+    def __init__(self, version=None):
+        self.version = version
+        # Writes from this process that have started but not yet been folded in
+        self.pending = 0
+        # flight_number -> {"destination", "sold", "withServices", "revenue", "services"}
+        self.flights = {}
+
+    @classmethod
+    def from_bookings(cls, bookings, version=None):
+        stats = cls(version)
+        for booking in bookings:
+            stats.add(booking)
+        return stats
+
+    def _flight(self, booking):
+        flight = self.flights.get(booking["flight_number"])
+        if flight is None:
+            flight = self.flights[booking["flight_number"]] = {
+                "destination": booking["destination"],
+                "sold": 0,
+                "withServices": 0,
+                "revenue": 0.0,
+                "services": {category: {} for category in SERVICE_CATEGORIES}
+            }
+        return flight
+
+    def add(self, booking, sign=1):
+        flight = self._flight(booking)
+        flight["sold"] += sign
+        flight["revenue"] += sign * booking["total_cost"]
+        services = booking["services"]
+        if services:
+            flight["withServices"] += sign
+            for category in SERVICE_CATEGORIES:
+                mix = flight["services"][category]
+                mix[services[category]] = mix.get(services[category], 0) + sign
+                if not mix[services[category]]:
+                    del mix[services[category]]
+
+    def remove(self, booking):
+        self.add(booking, -1)
+
+    def report(self, availability):
+        # Combine the aggregates with {flight: {"destination", "seatsLeft"}}
+        flights = {}
+        destinations = {}
+        for flight_number in list(availability) + [f for f in self.flights if f not in availability]:
+            info = availability.get(flight_number, {})
+            stats = self.flights.get(flight_number)
+            destination = info.get("destination") or stats["destination"]
+            sold = stats["sold"] if stats else 0
+            remaining = info.get("seatsLeft", 0)
+            revenue = round(stats["revenue"], 2) if stats else 0.0
+            flights[flight_number] = {
+                "destination": destination,
+                "seatsSold": sold,
+                "seatsRemaining": remaining,
+                "loadFactor": _load_factor(sold, remaining),
+                "bookingsWithServices": stats["withServices"] if stats else 0,
+                "ancillaryRevenue": revenue,
+                "serviceMix": {category: dict(mix) for category, mix in stats["services"].items()} if stats
+                              else {category: {} for category in SERVICE_CATEGORIES}
+            }
+            totals = destinations.setdefault(destination, {"seatsSold": 0, "seatsRemaining": 0,
+                                                           "ancillaryRevenue": 0.0})
+            totals["seatsSold"] += sold
+            totals["seatsRemaining"] += remaining
+            totals["ancillaryRevenue"] += revenue
+        for totals in destinations.values():
+            totals["loadFactor"] = _load_factor(totals["seatsSold"], totals["seatsRemaining"])
+            totals["ancillaryRevenue"] = round(totals["ancillaryRevenue"], 2)
+
+        sold = sum(f["seatsSold"] for f in flights.values())
+        remaining = sum(f["seatsRemaining"] for f in flights.values())
+        return {
+            "flights": flights,
+            "destinations": destinations,
+            "totals": {
+                "seatsSold": sold,
+                "seatsRemaining": remaining,
+                "loadFactor": _load_factor(sold, remaining),
+                "ancillaryRevenue": round(sum(f["ancillaryRevenue"] for f in flights.values()), 2)
+            }
+        }
+
+def _load_factor(sold, remaining):
+    seats = sold + remaining
+    return round(sold / seats, 4) if seats else 0.0
+
+def print_report(report):
+    print(f"{'Flight':<8} {'Destination':<16} {'Sold':>5} {'Left':>5} {'Load':>7} {'Revenue':>10}")
+    for flight_number, f in report["flights"].items():
+        print(f"{flight_number:<8} {f['destination']:<16} {f['seatsSold']:>5} {f['seatsRemaining']:>5} "
+              f"{f['loadFactor']:>7.1%} {'$' + format(f['ancillaryRevenue'], '.2f'):>10}")
+    totals = report["totals"]
+    print("-" * 56)
+    print(f"{'Total':<25} {totals['seatsSold']:>5} {totals['seatsRemaining']:>5} "
+          f"{totals['loadFactor']:>7.1%} {'$' + format(totals['ancillaryRevenue'], '.2f'):>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Seats sold, load factor and ancillary revenue per flight")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args()
+
+    report = reservations.booking_stats()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
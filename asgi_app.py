@@ -0,0 +1,420 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import metrics
+import replay
+import web_interface as web
+from events import get_bus
+from flight_manager import INFLIGHT_SERVICES
+from reservations import (
+    current_flights_json, current_availability, flights_version, bookings_version,
+    booking_stats, get_booking, seat_on_sale
+)
+
+# Async serving mode: the same API as web_interface.py as a plain ASGI app,
+# e.g. `uvicorn asgi_app:app`. The event loop only parses requests and writes
+# responses; every file or database touch runs on a thread pool, and seat
+# writes for a flight go through that flight's queue so one worker thread
+# handles them in order instead of a crowd of threads blocking on its lock.
+# Request handling itself is shared with web_interface (the *_payload
+# functions), so both modes answer the same way.
+ASGI_THREADS = int(os.environ.get("FLIGHT_ASGI_THREADS", "32"))
+
+_executor = ThreadPoolExecutor(ASGI_THREADS, thread_name_prefix="flight-io")
+
+async def run_blocking(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+class FlightWriteQueues:
+    # One asyncio queue and worker task per flight with writes in progress.
+    # submit() resolves once the job has run, after every job queued for that
+    # flight before it. A worker drops its queue as soon as it's drained, so
+    # flights that go quiet don't keep a queue and task each.
+    def __init__(self):
+        self.queues = {}
+
+    def _queue(self, flight_number):
+        queue = self.queues.get(flight_number)
+        if queue is None:
+            queue = self.queues[flight_number] = asyncio.Queue()
+            asyncio.get_running_loop().create_task(self._worker(flight_number, queue))
+        return queue
+
+    async def _worker(self, flight_number, queue):
+        while not queue.empty():
+            fn, args, future = queue.get_nowait()
+            try:
+                result = await run_blocking(fn, *args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+        # Nothing can be queued between the check above and this, both being
+        # on the event loop; the next submit() starts a fresh queue
+        del self.queues[flight_number]
+
+    async def submit(self, flight_number, fn, *args):
+        future = asyncio.get_running_loop().create_future()
+        self._queue(flight_number).put_nowait((fn, args, future))
+        return await future
+
+_write_queues = FlightWriteQueues()
+
+# --- seat event fan-out for /api/flights/stream ---
+
+_seat_events = None
+
+def _listen_for_seats(loop):
+    # The bus calls back from whichever thread published; hop onto the loop
+    # and wake every stream waiting there
+    global _seat_events
+    if _seat_events is not None:
+        return
+    _seat_events = asyncio.Event()
+
+    def wake():
+        global _seat_events
+        _seat_events.set()
+        _seat_events = asyncio.Event()
+
+    get_bus().add_listener(lambda: loop.call_soon_threadsafe(wake))
+
+async def _wait_for_seats(timeout):
+    try:
+        await asyncio.wait_for(_seat_events.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+# --- HTTP plumbing ---
+
+def _headers(scope):
+    return {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+def _etag_matches(headers, etag):
+    # Same rules as web_interface.etag_matches
+    tags = [tag.strip() for tag in headers.get("if-none-match", "").split(",") if tag.strip()]
+    for tag in tags:
+        if tag == "*":
+            return True
+        tag = tag[2:] if tag.startswith("W/") else tag
+        tag = tag.strip('"')
+        if tag == etag or tag.startswith(etag + "-"):
+            return True
+    return False
+
+async def _send(send, status, body=b"", content_type="application/json", headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]
+                   + [(name.encode(), value.encode()) for name, value in headers]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def _respond(send, request_headers, body, etag=None, cache_control="no-cache",
+                   content_type="application/json"):
+    headers = []
+    if etag:
+        headers.append(("cache-control", cache_control))
+    if web.HTTP_COMPRESS_MIN_SIZE and len(body) >= web.HTTP_COMPRESS_MIN_SIZE:
+        headers.append(("vary", "Accept-Encoding"))
+        accept = request_headers.get("accept-encoding", "")
+        encoding = "br" if web.brotli is not None and "br" in accept else "gzip" if "gzip" in accept else None
+        if encoding:
+            body = await run_blocking(web.compress_body, body, encoding, etag)
+            headers.append(("content-encoding", encoding))
+            if etag:
+                etag = f"{etag}-{encoding}"
+    if etag:
+        headers.append(("etag", f'"{etag}"'))
+    await _send(send, 200, body, content_type, headers)
+
+async def _conditional(send, request_headers, etag, build, cache_control="no-cache"):
+    # 304 without running build() when the client already has this version
+    if _etag_matches(request_headers, etag):
+        await _send(send, 304, headers=[("etag", f'"{etag}"'), ("cache-control", cache_control)])
+        return
+    payload = await run_blocking(build)
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+    await _respond(send, request_headers, body, etag, cache_control)
+
+# --- routes ---
+
+_index_html = web.INDEX_HTML.encode()
+
+async def index(scope, receive, send, headers):
+    if _etag_matches(headers, web.INDEX_ETAG):
+        await _send(send, 304, headers=[("etag", f'"{web.INDEX_ETAG}"'), ("cache-control", "no-cache")])
+        return
+    await _respond(send, headers, _index_html, web.INDEX_ETAG, content_type="text/html; charset=utf-8")
+
+def _query(scope):
+    return dict(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True))
+
+async def api_flights(scope, receive, send, headers):
+    day, error = web.requested_day(_query(scope))
+    if error:
+        await _send(send, 400, json.dumps({'success': False, 'error': error}).encode())
+        return
+    version = await run_blocking(flights_version, day)
+    await _conditional(send, headers, web.make_etag("flights", day, version),
+                       lambda: current_flights_json(day).encode())
+
+async def api_flights_availability(scope, receive, send, headers):
+    day, error = web.requested_day(_query(scope))
+    if error:
+        await _send(send, 400, json.dumps({'success': False, 'error': error}).encode())
+        return
+    version = await run_blocking(flights_version, day)
+    await _conditional(send, headers, web.make_etag("availability", day, version),
+                       lambda: current_availability(day))
+
+async def api_bookings(scope, receive, send, headers):
+    query = scope.get("query_string", b"")
+    args = dict(parse_qsl(query.decode("latin-1"), keep_blank_values=True))
+    version = await run_blocking(bookings_version)
+    await _conditional(send, headers, web.make_etag("bookings", version, query),
+                       lambda: web.bookings_payload(args))
+
+async def api_booking(scope, receive, send, headers, booking_id):
+    version = await run_blocking(bookings_version)
+    await _conditional(send, headers, web.make_etag("booking", version, booking_id),
+                       lambda: web.booking_payload(booking_id))
+
+async def api_search(scope, receive, send, headers):
+    args = _query(scope)
+    version = await run_blocking(web.search_version, args)
+    await _conditional(send, headers, web.make_etag("search", version, sorted(args.items())),
+                       lambda: web.search_payload(args))
+
+async def api_stats(scope, receive, send, headers):
+    versions = await run_blocking(lambda: (flights_version(), bookings_version()))
+    await _conditional(send, headers, web.make_etag("stats", *versions), booking_stats)
+
+async def api_services(scope, receive, send, headers):
+    await _conditional(send, headers, web.SERVICES_ETAG, lambda: INFLIGHT_SERVICES,
+                       f"public, max-age={web.SERVICES_MAX_AGE}")
+
+def _loads(data):
+    try:
+        return json.loads(data) if data else None
+    except ValueError:
+        return None
+
+async def _json_body(receive):
+    try:
+        return json.loads(await _read_body(receive))
+    except ValueError:
+        return None
+
+async def api_book(scope, receive, send, headers):
+    data = await _json_body(receive)
+    error = web.request_error(data, 'book')
+    if error:
+        await _send(send, 400, json.dumps({'success': False, 'error': error}).encode())
+        return
+    # Only bookings that can go through wait in a flight's queue; anything
+    # else (unknown flight, taken or malformed seat) is answered straight away
+    flight_number = web.dated_flight(data['flightNumber'], data.get('date'))
+    if await run_blocking(seat_on_sale, flight_number, data['seat']):
+        payload = await _write_queues.submit(flight_number, web.book_payload, data)
+    else:
+        payload = await run_blocking(web.book_payload, data)
+    await _respond(send, headers, json.dumps(payload).encode())
+
+async def api_book_batch(scope, receive, send, headers):
+    # Spans flights, so it goes straight to the backend's own locking
+    data = await _json_body(receive)
+    payload = await run_blocking(web.book_batch_payload, data if isinstance(data, dict) else None)
+    await _respond(send, headers, json.dumps(payload).encode())
+
+async def api_hold(scope, receive, send, headers):
+    data = await _json_body(receive)
+    payload = await run_blocking(web.hold_payload, data)
+    await _respond(send, headers, json.dumps(payload).encode())
+
+async def api_release_hold(scope, receive, send, headers):
+    data = await _json_body(receive)
+    payload = await run_blocking(web.release_hold_payload, data)
+    await _respond(send, headers, json.dumps(payload).encode())
+
+async def api_cancel_booking(scope, receive, send, headers):
+    data = await _json_body(receive)
+    booking = None
+    if isinstance(data, dict) and data.get('bookingId'):
+        booking = await run_blocking(get_booking, data['bookingId'])
+    if booking:
+        payload = await _write_queues.submit(booking['flight_number'], web.cancel_payload, data)
+    else:
+        payload = await run_blocking(web.cancel_payload, data if isinstance(data, dict) else None)
+    await _respond(send, headers, json.dumps(payload).encode())
+
+async def api_update_services(scope, receive, send, headers):
+    data = await _json_body(receive)
+    error = web.request_error(data, 'update-services')
+    if error:
+        await _send(send, 400, json.dumps({'success': False, 'error': error}).encode())
+        return
+    payload = await run_blocking(web.update_services_payload, data)
+    await _respond(send, headers, json.dumps(payload).encode())
+
+async def api_metrics(scope, receive, send, headers):
+    body = await run_blocking(metrics.render)
+    await _send(send, 200, body.encode(), metrics.CONTENT_TYPE)
+
+async def api_flights_stream(scope, receive, send, headers):
+    # Same events as the Flask route, without a thread per subscriber
+    _listen_for_seats(asyncio.get_running_loop())
+    bus = get_bus()
+    try:
+        last_seq = int(headers.get("last-event-id", ""))
+    except ValueError:
+        last_seq = bus.seq
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no")]
+    })
+
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+
+    watcher = asyncio.get_running_loop().create_task(watch_disconnect())
+    try:
+        chunk = "retry: 3000\n\n"
+        if last_seq > bus.seq:
+            last_seq = bus.seq
+            chunk += f"id: {last_seq}\nevent: resync\ndata: {{}}\n\n"
+        await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+        seen_version = await run_blocking(flights_version)
+        while not disconnected.is_set():
+            pending, missed = bus.since(last_seq)
+            if not pending and not missed:
+                await _wait_for_seats(web.SSE_KEEPALIVE)
+                pending, missed = bus.since(last_seq)
+            version = await run_blocking(flights_version)
+            if missed:
+                last_seq = bus.seq
+                chunk = f"id: {last_seq}\nevent: resync\ndata: {{}}\n\n"
+            elif pending:
+                last_seq = pending[-1][0]
+                chunk = "".join(f"id: {seq}\nevent: seats\ndata: {json.dumps(event)}\n\n" for seq, event in pending)
+            elif version != seen_version:
+                chunk = f"id: {last_seq}\nevent: resync\ndata: {{}}\n\n"
+            else:
+                chunk = ": keepalive\n\n"
+            seen_version = version
+            await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+    finally:
+        watcher.cancel()
+
+ROUTES = {
+    ("GET", "/"): index,
+    ("GET", "/api/flights"): api_flights,
+    ("GET", "/api/flights/availability"): api_flights_availability,
+    ("GET", "/api/flights/stream"): api_flights_stream,
+    ("GET", "/api/bookings"): api_bookings,
+    ("GET", "/api/search"): api_search,
+    ("GET", "/api/stats"): api_stats,
+    ("GET", "/api/services"): api_services,
+    ("GET", "/metrics"): api_metrics,
+    ("POST", "/api/book"): api_book,
+    ("POST", "/api/book/batch"): api_book_batch,
+    ("POST", "/api/hold"): api_hold,
+    ("POST", "/api/hold/release"): api_release_hold,
+    ("POST", "/api/cancel-booking"): api_cancel_booking,
+    ("POST", "/api/update-services"): api_update_services
+}
+
+class _HeadSent(Exception):
+    # Stops a handler once a HEAD request's headers have gone out
+    pass
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                _executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    headers = _headers(scope)
+    # HEAD runs the GET handler; send_and_note drops the body
+    head = scope["method"] == "HEAD"
+    method = "GET" if head else scope["method"]
+    path = scope["path"]
+    status = 500
+
+    # Traffic capture for replay.py keeps a copy of the request body, and of
+    # the response body for writes
+    recorder = replay.get_recorder()
+    recording = recorder.enabled and recorder.wants(path)
+    request_body, response_body = [], []
+
+    async def send_and_note(message):
+        # The status for the latency histogram
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif head:
+            # Headers only - and the response ends here, even for the stream
+            await send({"type": "http.response.body", "body": b""})
+            raise _HeadSent
+        elif recording and method == "POST":
+            response_body.append(message.get("body", b""))
+        await send(message)
+
+    if recording:
+        receive_request = receive
+
+        async def receive():
+            message = await receive_request()
+            request_body.append(message.get("body", b""))
+            return message
+
+    # Same route labels as the Flask app's metrics
+    start = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    handler = ROUTES.get((method, path))
+    route = path if handler is not None else "unmatched"
+    try:
+        if handler is not None:
+            await handler(scope, receive, send_and_note, headers)
+        elif method == "GET" and path.startswith("/api/bookings/"):
+            route = "/api/bookings/<booking_id>"
+            await api_booking(scope, receive, send_and_note, headers, path[len("/api/bookings/"):])
+        else:
+            await _send(send_and_note, 404, json.dumps({'success': False, 'error': 'Not found'}).encode())
+    except _HeadSent:
+        pass
+    finally:
+        metrics.REQUESTS_IN_FLIGHT.dec()
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - start, scope["method"], route, str(status))
+        if recording:
+            recorder.record(method, path, route, scope["query_string"].decode("latin-1"),
+                            _loads(b"".join(request_body)), status, time.perf_counter() - start,
+                            _loads(b"".join(response_body)))
@@ -0,0 +1,319 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# Reproducible benchmarks for the storage and request paths. A synthetic data
+# set (--flights flights, --bookings bookings, seeded) is written to a scratch
+# directory, and each benchmark is timed call by call there so latency
+# percentiles and throughput come out of the same run:
+#
+#   load_flights, save_flights, load_bookings_web  (--rounds calls each)
+#   POST /api/book, POST /api/cancel-booking, GET /api/bookings  (--requests calls each)
+#
+# The requests go through Flask's test client, so they measure the app and the
+# storage backend without the network. --http-requests adds a real HTTP run:
+# serve.py is started on the same data set and loadtest.py is pointed at it.
+#
+# --save writes the results to a JSON file; --compare checks a run against
+# one and exits non-zero when any benchmark's p50 got slower by more than
+# --threshold, so storage and caching changes can be measured against a
+# baseline.
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SIZES = {
+    "small": (1000, 10000),
+    "medium": (10000, 100000),
+    "large": (100000, 1000000)
+}
+
+DESTINATIONS = [
+    "New York", "London", "Paris", "Istanbul", "Hong Kong", "Tokyo", "Dubai", "Singapore",
+    "Sydney", "Toronto", "Madrid", "Rome", "Berlin", "Amsterdam", "Chicago", "Seoul"
+]
+AIRLINES = ["AA", "BA", "AF", "TK", "CX", "JL", "EK", "SQ", "QF", "AC", "IB", "AZ", "LH", "KL", "UA", "KE"]
+SEAT_LETTERS = "ABCD"
+
+# --- synthetic data ---
+
+def generate_dataset(directory, flight_count, booking_count, free_seats=20, services_ratio=0.3, seed=1):
+    # Writes Flights.txt and BookedFlights.txt into directory. Bookings are
+    # spread evenly over the flights; every flight keeps free_seats open.
+    import flight_manager
+
+    rng = random.Random(seed)
+    per_flight, extra = divmod(booking_count, flight_count)
+    codes = {category: list(items) for category, items in flight_manager.INFLIGHT_SERVICES.items()}
+
+    with open(os.path.join(directory, flight_manager.FLIGHTS_FILE), "w") as flights_file, \
+         open(os.path.join(directory, flight_manager.BOOKED_FILE), "w") as booked_file:
+        for i in range(flight_count):
+            flight_number = f"{AIRLINES[i % len(AIRLINES)]}{100 + i // len(AIRLINES)}"
+            destination = DESTINATIONS[rng.randrange(len(DESTINATIONS))]
+            booked = per_flight + (1 if i < extra else 0)
+            rows = math.ceil((booked + free_seats) / len(SEAT_LETTERS))
+            seats = [f"{row}{letter}" for row in range(1, rows + 1) for letter in SEAT_LETTERS]
+            rng.shuffle(seats)
+            available = sorted(seats[booked:], key=lambda seat: (int(seat[:-1]), seat[-1]))
+            flights_file.write(f"{flight_number} - {destination}: [{', '.join(available)}]\n")
+
+            lines = []
+            for seat in seats[:booked]:
+                services, cost = None, 0.0
+                if rng.random() < services_ratio:
+                    services = {category: rng.choice(items) for category, items in codes.items()}
+                    cost = flight_manager.services_total_cost(services)
+                booking_id = "%016x" % rng.getrandbits(64)
+                lines.append(flight_manager.format_booking_line(flight_number, destination, seat,
+                                                                services, cost, booking_id))
+            booked_file.writelines(lines)
+
+def prepare_backend(storage_mode, snapshot=False):
+    # Load the text files just written into the backend under test
+    if storage_mode != "text":
+        import migrate
+        migrate.migrate(storage_mode)
+    if snapshot:
+        import inventory_snapshot
+        inventory_snapshot.build()
+
+# --- timing ---
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    return {
+        "calls": len(latencies),
+        "seconds": round(elapsed, 4),
+        "opsPerSecond": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "meanMs": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50Ms": round(percentile(0.50), 3),
+        "p95Ms": round(percentile(0.95), 3),
+        "p99Ms": round(percentile(0.99), 3)
+    }
+
+def time_calls(fn, calls):
+    # fn(i) is called calls times; each call is timed on its own
+    latencies = []
+    start = time.perf_counter()
+    for i in range(calls):
+        t = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - start)
+
+def _check(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.request.path} returned {response.status_code}")
+    payload = response.get_json()
+    if isinstance(payload, dict) and payload.get("success") is False:
+        raise RuntimeError(f"{response.request.path} failed: {payload.get('error')}")
+    return payload
+
+def run_benchmarks(rounds, requests, seed=1):
+    # Runs in the data set's directory, with FLIGHT_STORAGE_MODE already set
+    import flight_manager
+    import web_interface
+
+    results = {}
+    flights = flight_manager.load_flights()
+    results["load_flights"] = time_calls(lambda i: flight_manager.load_flights(), rounds)
+    results["save_flights"] = time_calls(lambda i: flight_manager.save_flights(flights), rounds)
+    results["load_bookings_web"] = time_calls(lambda i: web_interface.load_bookings_web(), rounds)
+
+    client = web_interface.app.test_client()
+    open_seats = [(flight_number, seat) for flight_number, info in flights.items() for seat in info["seats"]]
+    random.Random(seed).shuffle(open_seats)
+    if len(open_seats) < requests:
+        raise RuntimeError(f"only {len(open_seats)} open seats for {requests} bookings")
+
+    booking_ids = []
+
+    def book(i):
+        flight_number, seat = open_seats[i]
+        payload = _check(client.post("/api/book", json={"flightNumber": flight_number, "seat": seat}))
+        booking_ids.append(payload["bookingId"])
+
+    results["POST /api/book"] = time_calls(book, requests)
+    # Cancel what was just booked, which also puts the data set back
+    results["POST /api/cancel-booking"] = time_calls(
+        lambda i: _check(client.post("/api/cancel-booking", json={"bookingId": booking_ids[i]})), requests)
+
+    # Walk the booking list a page at a time, starting over at the end
+    cursor = [None]
+
+    def page(i):
+        query = {"limit": 50} if cursor[0] is None else {"limit": 50, "cursor": cursor[0]}
+        cursor[0] = _check(client.get("/api/bookings", query_string=query)).get("nextCursor")
+
+    results["GET /api/bookings?limit=50"] = time_calls(page, requests)
+    flight_numbers = list(flights)
+    results["GET /api/bookings?flightNumber"] = time_calls(
+        lambda i: _check(client.get("/api/bookings", query_string={
+            "flightNumber": flight_numbers[i % len(flight_numbers)], "limit": 50})), requests)
+    results["GET /api/bookings (full list)"] = time_calls(lambda i: _check(client.get("/api/bookings")), rounds)
+    return results
+
+# --- HTTP load ---
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server did not start on port {port}")
+
+def run_http_load(directory, storage_mode, workers, concurrency, requests, book_ratio):
+    # serve.py on the data set in a child process, loadtest.py against it
+    import loadtest
+
+    port = _free_port()
+    env = dict(os.environ, FLIGHT_STORAGE_MODE=storage_mode)
+    server = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, "serve.py"), "--port", str(port),
+                               "--workers", str(workers)],
+                              cwd=directory, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_for_port(port)
+        result = asyncio.run(loadtest.run(f"http://127.0.0.1:{port}", concurrency, requests, book_ratio))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(30)
+    return {
+        "calls": result["requests"],
+        "seconds": result["seconds"],
+        "opsPerSecond": result["requestsPerSecond"],
+        "errors": result["errors"],
+        "p50Ms": result["p50Ms"],
+        "p95Ms": result["p95Ms"],
+        "p99Ms": result["p99Ms"]
+    }
+
+# --- baselines ---
+
+def compare(results, baseline, threshold):
+    # [(name, baseline p50, current p50, change)], and whether anything regressed
+    rows = []
+    regressed = False
+    for name, current in results["benchmarks"].items():
+        before = baseline["benchmarks"].get(name)
+        if not before or not before["p50Ms"]:
+            rows.append((name, None, current["p50Ms"], None))
+            continue
+        change = current["p50Ms"] / before["p50Ms"] - 1
+        regressed = regressed or change > threshold
+        rows.append((name, before["p50Ms"], current["p50Ms"], change))
+    return rows, regressed
+
+def print_results(results):
+    print(f"{results['dataset']['flights']} flights, {results['dataset']['bookings']} bookings, "
+          f"{results['storage']} storage" + (" with inventory snapshot" if results.get("snapshot") else ""))
+    print(f"{'Benchmark':<34} {'Calls':>6} {'Ops/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, r in results["benchmarks"].items():
+        print(f"{name:<34} {r['calls']:>6} {r['opsPerSecond']:>10.1f} {r['p50Ms']:>10.3f} "
+              f"{r['p95Ms']:>10.3f} {r['p99Ms']:>10.3f}")
+
+def print_comparison(rows, threshold):
+    print(f"{'Benchmark':<34} {'Base p50':>10} {'p50':>10} {'Change':>8}")
+    for name, before, after, change in rows:
+        if change is None:
+            print(f"{name:<34} {'-':>10} {after:>10.3f} {'new':>8}")
+            continue
+        flag = "  REGRESSION" if change > threshold else ""
+        print(f"{name:<34} {before:>10.3f} {after:>10.3f} {change:>+8.1%}{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the booking storage and API paths on synthetic data")
+    parser.add_argument("--size", choices=sorted(SIZES), default="small",
+                        help="preset data set: small 1k/10k, medium 10k/100k, large 100k/1M (flights/bookings)")
+    parser.add_argument("--flights", type=int, help="flights in the data set (overrides --size)")
+    parser.add_argument("--bookings", type=int, help="bookings in the data set (overrides --size)")
+    parser.add_argument("--storage", choices=["text", "journal", "sqlite"], default="text", help="backend to test")
+    parser.add_argument("--snapshot", action="store_true", help="build the binary inventory snapshot first")
+    parser.add_argument("--rounds", type=int, default=5, help="calls per whole-data-set benchmark")
+    parser.add_argument("--requests", type=int, default=200, help="calls per API benchmark")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the data set")
+    parser.add_argument("--http-requests", type=int, default=0, help="also run an HTTP load test of this many requests")
+    parser.add_argument("--workers", type=int, default=1, help="serve.py workers for the HTTP load test")
+    parser.add_argument("--concurrency", type=int, default=50, help="connections for the HTTP load test")
+    parser.add_argument("--book-ratio", type=float, default=0.1, help="share of HTTP load test requests that book")
+    parser.add_argument("--save", metavar="FILE", help="write the results to FILE as a baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="p50 slowdown that counts as a regression")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    flight_count, booking_count = SIZES[args.size]
+    flight_count = args.flights or flight_count
+    booking_count = args.bookings if args.bookings is not None else booking_count
+    save_path = os.path.abspath(args.save) if args.save else None
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    # The modules read FLIGHT_STORAGE_MODE at import and use paths relative to
+    # the working directory, so set both before importing them
+    os.environ["FLIGHT_STORAGE_MODE"] = args.storage
+    sys.path.insert(0, REPO_DIR)
+    with tempfile.TemporaryDirectory(prefix="flight-bench-") as directory:
+        os.chdir(directory)
+        started = time.perf_counter()
+        generate_dataset(directory, flight_count, booking_count, seed=args.seed)
+        prepare_backend(args.storage, args.snapshot)
+        setup_seconds = time.perf_counter() - started
+
+        benchmarks = run_benchmarks(args.rounds, args.requests, args.seed)
+        if args.http_requests:
+            benchmarks["HTTP load"] = run_http_load(directory, args.storage, args.workers, args.concurrency,
+                                                    args.http_requests, args.book_ratio)
+        os.chdir(REPO_DIR)
+
+    results = {
+        "dataset": {"flights": flight_count, "bookings": booking_count, "seed": args.seed},
+        "storage": args.storage,
+        "snapshot": args.snapshot,
+        "python": platform.python_version(),
+        "setupSeconds": round(setup_seconds, 2),
+        "benchmarks": benchmarks
+    }
+    if save_path:
+        with open(save_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    rows, regressed = compare(results, baseline, args.threshold) if baseline else ([], False)
+    if args.json:
+        if baseline:
+            results["comparison"] = {name: change for name, before, after, change in rows}
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+        if baseline:
+            if baseline.get("dataset") != results["dataset"] or baseline.get("storage") != results["storage"]:
+                print("Warning: the baseline was recorded with a different data set or storage mode")
+            print()
+            print_comparison(rows, args.threshold)
+    if regressed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import bisect
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Rebuild compactly once cancelled slots outnumber live bookings (plus this)
+COMPACT_SLACK = 1024
+
+# Read-side index over the current bookings for /api/bookings. Each filter has
+# a sorted posting list of booking slots, so a page is a bisect to the cursor
+# plus a walk of at most one page worth of matches on the most selective
+# filter.
+#
+# Bookings made, cancelled or changed by this process are folded in as they
+# happen (add/remove/replace); only changes from elsewhere need a rebuild.
+# A cancelled booking leaves an empty slot behind, and a Fenwick tree over
+# the slots turns a slot into the booking's position in the list (and back)
+# in O(log n), so positions stay those of the stored list without shifting
+# every later entry on each cancellation.
+#
+# Cursors name the next booking to return as "<position>:<booking_id>", so a
+# cancellation between two page fetches doesn't make the client skip or repeat
+# bookings; a bare position is accepted too.
+class _LiveCounts:
+    # Fenwick tree with one count per slot (1 live, 0 cancelled)
+    __slots__ = ("tree",)
+
+    def __init__(self, size):
+        # All live: tree[i] covers the lowbit(i) slots ending at i (1-based)
+        self.tree = [0] + [i & -i for i in range(1, size + 1)]
+
+    def append(self):
+        # A new live slot at the end
+        i = len(self.tree)
+        self.tree.append(1 + self.prefix(i - 1) - self.prefix(i - (i & -i)))
+
+    def clear(self, slot):
+        i = slot + 1
+        while i < len(self.tree):
+            self.tree[i] -= 1
+            i += i & -i
+
+    def prefix(self, count):
+        # Live slots among the first `count`
+        total = 0
+        while count > 0:
+            total += self.tree[count]
+            count -= count & -count
+        return total
+
+    def find(self, position):
+        # Slot of the live booking at `position` (0-based)
+        slot = 0
+        step = 1 << (len(self.tree).bit_length() - 1)
+        while step:
+            nxt = slot + step
+            if nxt < len(self.tree) and self.tree[nxt] <= position:
+                slot = nxt
+                position -= self.tree[nxt]
+            step >>= 1
+        return slot
+
+class BookingIndex:
+    def __init__(self, bookings, version=None):
+        self.version = version
+        # Writes of this process under way (see reservations._begin_update)
+        self.pending = 0
+        # Booking per slot, None once cancelled
+        self.slots = list(bookings)
+        self.live = len(self.slots)
+        self.counts = _LiveCounts(len(self.slots))
+        self.by_id = {}
+        self.by_flight = {}
+        self.by_destination = {}
+        self.with_services = []
+        self.without_services = []
+        for slot, booking in enumerate(self.slots):
+            self._post(slot, booking)
+
+    def _post(self, slot, booking):
+        self.by_id[booking["booking_id"]] = slot
+        self.by_flight.setdefault(booking["flight_number"], []).append(slot)
+        self.by_destination.setdefault(booking["destination"].lower(), []).append(slot)
+        if booking["services"]:
+            self.with_services.append(slot)
+        else:
+            self.without_services.append(slot)
+
+    def __len__(self):
+        return self.live
+
+    # --- changes made by this process ---
+
+    def add(self, booking):
+        slot = len(self.slots)
+        self.slots.append(booking)
+        self.counts.append()
+        self.live += 1
+        self._post(slot, booking)
+
+    def remove(self, booking_id):
+        slot = self.by_id.pop(booking_id, None)
+        if slot is None:
+            return
+        self.slots[slot] = None
+        self.counts.clear(slot)
+        self.live -= 1
+        if len(self.slots) - self.live > self.live + COMPACT_SLACK:
+            pending = self.pending
+            self.__init__([booking for booking in self.slots if booking is not None], self.version)
+            self.pending = pending
+
+    def replace(self, booking):
+        # Same booking, new services: it keeps its place in the list
+        slot = self.by_id.get(booking["booking_id"])
+        if slot is None:
+            return
+        self.slots[slot] = booking
+        # The list it leaves keeps a stale entry, which _matches skips
+        postings = self.with_services if booking["services"] else self.without_services
+        i = bisect.bisect_left(postings, slot)
+        if i == len(postings) or postings[i] != slot:
+            postings.insert(i, slot)
+
+    # --- reads ---
+
+    def position_of(self, booking_id):
+        slot = self.by_id.get(booking_id)
+        return None if slot is None else self.counts.prefix(slot)
+
+    def booking_at(self, position):
+        if not 0 <= position < self.live:
+            return None
+        return self.slots[self.counts.find(position)]
+
+    def make_cursor(self, slot):
+        if slot is None:
+            return None
+        return f"{self.counts.prefix(slot)}:{self.slots[slot]['booking_id']}"
+
+    def resolve_cursor(self, cursor):
+        # Slot to resume from; raises ValueError for a malformed cursor
+        if not cursor:
+            return 0
+        position, _, booking_id = str(cursor).partition(":")
+        if booking_id and booking_id in self.by_id:
+            return self.by_id[booking_id]
+        position = max(int(position), 0)
+        return self.counts.find(position) if position < self.live else len(self.slots)
+
+    def _matches(self, booking, flight_number, destination, has_services):
+        if booking is None:
+            return False
+        if flight_number and booking["flight_number"] != flight_number:
+            return False
+        if destination and booking["destination"].lower() != destination.lower():
+            return False
+        if has_services is not None and bool(booking["services"]) != has_services:
+            return False
+        return True
+
+    def _postings(self, flight_number, destination, has_services):
+        # Walk the shortest posting list and check the other filters per booking
+        lists = []
+        if flight_number:
+            lists.append(self.by_flight.get(flight_number, []))
+        if destination:
+            lists.append(self.by_destination.get(destination.lower(), []))
+        if has_services is not None:
+            lists.append(self.with_services if has_services else self.without_services)
+        if not lists:
+            return None
+        return min(lists, key=len)
+
+    def page(self, cursor=None, limit=DEFAULT_PAGE_SIZE, flight_number=None, destination=None, has_services=None):
+        # Returns ([(position, booking), ...], next_cursor or None)
+        slot = self.resolve_cursor(cursor)
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        postings = self._postings(flight_number, destination, has_services)
+        results = []
+        if postings is None:
+            position = self.counts.prefix(slot)
+            while slot < len(self.slots) and len(results) < limit:
+                booking = self.slots[slot]
+                if booking is not None:
+                    results.append((position, booking))
+                    position += 1
+                slot += 1
+            while slot < len(self.slots) and self.slots[slot] is None:
+                slot += 1
+            return results, self.make_cursor(slot if slot < len(self.slots) else None)
+
+        i = bisect.bisect_left(postings, slot)
+        while i < len(postings) and len(results) < limit:
+            booking = self.slots[postings[i]]
+            if self._matches(booking, flight_number, destination, has_services):
+                results.append((self.counts.prefix(postings[i]), booking))
+            i += 1
+        # The next cursor names a booking that is still there
+        while i < len(postings) and self.slots[postings[i]] is None:
+            i += 1
+        return results, self.make_cursor(postings[i] if i < len(postings) else None)
@@ -0,0 +1,486 @@
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+from contextlib import ExitStack
+from itertools import islice
+
+try:
+    import numpy as np
+except ImportError:
+    # No NumPy - the npz columnar format is unavailable
+    np = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    # No pyarrow - the parquet format is unavailable
+    pyarrow = pq = None
+
+import dated_inventory
+import flight_manager
+from locks import file_lock
+from seatmap import SEAT_PATTERN
+from storage import get_backend
+
+# Bulk import and export of flights and bookings, instead of hand-editing
+# Flights.txt or reading BookedFlights.txt:
+#
+#   python bulk.py export bookings manifest.csv --flight AA234
+#   python bulk.py export bookings manifests/ --by-flight --format jsonl
+#   python bulk.py import bookings bookings.jsonl
+#   python bulk.py import flights schedule.csv [--replace]
+#
+# Formats, picked by --format or the file extension: csv, jsonl, npz (one
+# NumPy array per column; needs numpy) and parquet (needs pyarrow). Columns
+# are BOOKING_COLUMNS and FLIGHT_COLUMNS; seats are space-separated ("1A 1B")
+# except in JSONL, where a list works too.
+#
+# Imports stream the input in batches of --batch-size rows. Each batch is
+# checked against hash sets of the booking IDs and booked seats already
+# stored and priced in one vectorized call, and nothing is written until the
+# whole file has been checked; the valid rows are then stored with one
+# inventory save and one append (one transaction with sqlite). With the text
+# backend the data files stay locked for the whole import, so the app can keep
+# running; with the others, run imports while it is idle.
+BOOKING_COLUMNS = ("booking_id", "flight_number", "destination", "seat", "food", "drinks", "comfort", "total_cost")
+FLIGHT_COLUMNS = ("flight_number", "destination", "seats")
+FORMATS = ("csv", "jsonl", "npz", "parquet")
+BATCH_SIZE = 10000
+# Errors listed before the rest are only counted
+MAX_REPORTED_ERRORS = 20
+# Characters that would break the Flights.txt / BookedFlights.txt line formats
+RESERVED = re.compile(r":|\||\n| - ")
+
+def detect_format(path, fmt=None):
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; use --format with one of: {', '.join(FORMATS)}")
+    if fmt == "npz" and np is None:
+        raise ValueError("The npz format needs numpy (pip install numpy)")
+    if fmt == "parquet" and pyarrow is None:
+        raise ValueError("The parquet format needs pyarrow (pip install pyarrow)")
+    return fmt
+
+# --- reading ---
+
+def read_rows(path, fmt, batch_size=BATCH_SIZE):
+    # Rows as dicts, one batch (list) at a time
+    if fmt == "csv":
+        with open(path, newline="") as f:
+            reader = csv.DictReader(f)
+            while True:
+                batch = list(islice(reader, batch_size))
+                if not batch:
+                    return
+                yield batch
+    elif fmt == "jsonl":
+        with open(path) as f:
+            lines = (line for line in f if line.strip())
+            while True:
+                batch = [json.loads(line) for line in islice(lines, batch_size)]
+                if not batch:
+                    return
+                yield batch
+    elif fmt == "npz":
+        with np.load(path, allow_pickle=False) as data:
+            columns = {name: data[name].tolist() for name in data.files}
+        names = list(columns)
+        count = len(columns[names[0]]) if names else 0
+        for start in range(0, count, batch_size):
+            yield [dict(zip(names, values)) for values in
+                   zip(*(columns[name][start:start + batch_size] for name in names))]
+    else:
+        for record_batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield record_batch.to_pylist()
+
+# --- writing ---
+
+class RowWriter:
+    # Streams rows with fixed columns to one file in any of FORMATS. The
+    # columnar formats collect each column and write it on close().
+    def __init__(self, path, fmt, columns):
+        self.path = path
+        self.fmt = fmt
+        self.columns = columns
+        self.count = 0
+        self.file = None
+        if fmt in ("csv", "jsonl"):
+            self.file = open(path, "w", newline="")
+            if fmt == "csv":
+                self.csv = csv.writer(self.file)
+                self.csv.writerow(columns)
+        else:
+            self.values = {column: [] for column in columns}
+
+    def write(self, row):
+        self.count += 1
+        if self.fmt == "csv":
+            self.csv.writerow(["" if row[column] is None else row[column] for column in self.columns])
+        elif self.fmt == "jsonl":
+            self.file.write(json.dumps({column: row[column] for column in self.columns}) + "\n")
+        else:
+            for column in self.columns:
+                self.values[column].append(row[column])
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            return
+        if self.fmt == "npz":
+            arrays = {}
+            for column, values in self.values.items():
+                if column == "total_cost":
+                    arrays[column] = np.array(values, dtype=np.float64)
+                else:
+                    arrays[column] = np.array(["" if value is None else value for value in values], dtype=str)
+            with open(self.path, "wb") as f:
+                np.savez_compressed(f, **arrays)
+        else:
+            pq.write_table(pyarrow.table(self.values), self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def booking_row(booking):
+    services = booking["services"] or {}
+    return {
+        "booking_id": booking["booking_id"],
+        "flight_number": booking["flight_number"],
+        "destination": booking["destination"],
+        "seat": booking["seat"],
+        "food": services.get("food"),
+        "drinks": services.get("drinks"),
+        "comfort": services.get("comfort"),
+        "total_cost": round(float(booking["total_cost"] or 0.0), 2)
+    }
+
+def flight_row(flight_number, info, fmt):
+    seats = list(info["seats"])
+    return {"flight_number": flight_number, "destination": info["destination"],
+            "seats": seats if fmt == "jsonl" else " ".join(seats)}
+
+def _flight_matches(flight_number, wanted):
+    # A dated booking (AA234@2026-10-18) belongs to its flight's manifest too
+    return flight_number in wanted or flight_number.partition(dated_inventory.DATE_SEPARATOR)[0] in wanted
+
+def export_bookings(path, fmt, flights=None, by_flight=False):
+    # Returns the number of bookings written. With by_flight, path is a
+    # directory that gets one manifest per flight.
+    wanted = set(flights or ())
+    bookings = (booking for booking in get_backend().iter_bookings()
+                if not wanted or _flight_matches(booking["flight_number"], wanted))
+    if not by_flight:
+        with RowWriter(path, fmt, BOOKING_COLUMNS) as writer:
+            for booking in bookings:
+                writer.write(booking_row(booking))
+            return writer.count
+    manifests = {}
+    for booking in bookings:
+        manifests.setdefault(booking["flight_number"], []).append(booking_row(booking))
+    os.makedirs(path, exist_ok=True)
+    for flight_number, rows in manifests.items():
+        with RowWriter(os.path.join(path, f"{flight_number}.{fmt}"), fmt, BOOKING_COLUMNS) as writer:
+            for row in rows:
+                writer.write(row)
+    return sum(len(rows) for rows in manifests.values())
+
+def export_flights(path, fmt, flights=None):
+    wanted = set(flights or ())
+    with RowWriter(path, fmt, FLIGHT_COLUMNS) as writer:
+        for flight_number, info in get_backend().load_flights().items():
+            if not wanted or flight_number in wanted:
+                writer.write(flight_row(flight_number, info, fmt))
+        return writer.count
+
+# --- validation ---
+
+def _text(value):
+    # A cell as a stripped string; missing cells are ""
+    if value.__class__ is str:
+        return value.strip()
+    return "" if value is None else str(value).strip()
+
+def _check_text(value, what):
+    if not value:
+        return f"missing {what}"
+    if RESERVED.search(value):
+        return f"{what} {value!r} contains one of : | ' - '"
+    return None
+
+class BookingImport:
+    # Validates booking rows batch by batch against the stored data and the
+    # rows accepted before them
+    def __init__(self, backend, flights):
+        self.backend = backend
+        self.flights = flights
+        self.booking_ids = set()
+        # (flight_number, seat) of every stored and accepted booking
+        self.booked = set()
+        # flight_number -> (seat letters, rows) its seats on sale and stored
+        # bookings reach, for telling a sold seat from one that doesn't exist
+        self.layouts = {}
+        for flight_number, info in flights.items():
+            for seat in info["seats"]:
+                self._widen(flight_number, seat)
+        for booking in backend.iter_bookings():
+            self.booking_ids.add(booking["booking_id"])
+            self.booked.add((booking["flight_number"], booking["seat"]))
+            self._widen(booking["flight_number"], booking["seat"])
+        self.accepted = []
+        # Seats still on sale that the accepted bookings take
+        self.claimed = []
+        self.errors = []
+        self.rows = 0
+
+    def error(self, row_number, reason):
+        self.errors.append((row_number, reason))
+
+    def check_batch(self, rows):
+        candidates = []
+        for row in rows:
+            self.rows += 1
+            booking, reason = self._check_row(row)
+            if reason:
+                self.error(self.rows, reason)
+            else:
+                candidates.append((self.rows, booking))
+        # Price the batch in one call for the rows that didn't bring a cost
+        unpriced = [booking for _, booking in candidates if booking["total_cost"] is None]
+        costs = flight_manager.services_total_costs([booking["services"] for booking in unpriced])
+        for booking, cost in zip(unpriced, costs):
+            booking["total_cost"] = round(float(cost), 2)
+        for row_number, booking in candidates:
+            key = (booking["flight_number"], booking["seat"])
+            if booking["booking_id"] in self.booking_ids:
+                self.error(row_number, f"duplicate booking ID {booking['booking_id']}")
+            elif key in self.booked:
+                self.error(row_number, f"seat {booking['seat']} on {booking['flight_number']} is already booked")
+            else:
+                self.booking_ids.add(booking["booking_id"])
+                self.booked.add(key)
+                if self._on_sale(*key):
+                    self.claimed.append(key)
+                self.accepted.append(booking)
+
+    def _check_row(self, row):
+        # (booking dict, None) or (None, reason)
+        if not isinstance(row, dict):
+            return None, "not an object"
+        flight_number, seat = _text(row.get("flight_number")), _text(row.get("seat")).upper()
+        # Stored flight numbers are known to be well-formed, so only a lookup
+        # miss needs a closer look
+        info = self.flights.get(flight_number)
+        if info is not None:
+            destination = info["destination"]
+        else:
+            reason = _check_text(flight_number, "flight number")
+            if reason:
+                return None, reason
+            destination = self._destination(flight_number)
+            if destination is None:
+                return None, f"unknown flight {flight_number}"
+            if isinstance(destination, tuple):
+                return None, destination[0]
+        if not SEAT_PATTERN.fullmatch(seat):
+            return None, f"invalid seat {seat!r}"
+        if not self._in_layout(flight_number, seat):
+            return None, f"no seat {seat} on {flight_number}"
+        booking_id = _text(row.get("booking_id"))
+        if booking_id:
+            reason = _check_text(booking_id, "booking ID")
+            if reason:
+                return None, reason
+        else:
+            booking_id = flight_manager.new_booking_id()
+        # Validated and defaulted the same way as a booking made through the API
+        services, reason = flight_manager.check_services(
+            {category: _text(row.get(category)) for category in ("food", "drinks", "comfort")
+             if _text(row.get(category))})
+        if reason:
+            return None, reason
+        total_cost = row.get("total_cost")
+        if total_cost is not None and total_cost != "":
+            try:
+                total_cost = round(float(str(total_cost).strip().lstrip("$")), 2)
+            except ValueError:
+                return None, f"total_cost {row['total_cost']!r} is not a number"
+        else:
+            total_cost = None if services else 0.0
+        return {"booking_id": booking_id, "flight_number": flight_number, "destination": destination,
+                "seat": seat, "services": services, "total_cost": total_cost}, None
+
+    def _destination(self, flight_number):
+        # A dated flight's destination, None if it doesn't exist, or (reason,)
+        # if it can't take bookings here
+        if not dated_inventory.is_dated(flight_number):
+            return None
+        if not self.backend.dated:
+            return (f"dated flights need FLIGHT_STORAGE_MODE=text, not {self.backend.name}",)
+        reason = dated_inventory.check_key(flight_number)
+        if reason:
+            return (reason,)
+        base, day = dated_inventory.split_flight_key(flight_number)
+        info = dated_inventory.day_flights(day).get(base)
+        return info["destination"] if info else None
+
+    def _widen(self, flight_number, seat):
+        match = SEAT_PATTERN.fullmatch(seat)
+        if not match:
+            return
+        letters, rows = self.layouts.get(flight_number, ("", 0))
+        if match.group(2) not in letters:
+            letters += match.group(2)
+        self.layouts[flight_number] = (letters, max(rows, int(match.group(1))))
+
+    def _in_layout(self, flight_number, seat):
+        # Seats of the cabin a dated flight opens with, plus any row or letter
+        # the flight's seats on sale or stored bookings go beyond it
+        letters, rows = self.layouts.get(flight_number, ("", 0))
+        match = SEAT_PATTERN.fullmatch(seat)
+        row, letter = int(match.group(1)), match.group(2)
+        return (letter in letters or letter in dated_inventory.CABIN_LETTERS) and \
+            row <= max(rows, dated_inventory.CABIN_ROWS)
+
+    def _on_sale(self, flight_number, seat):
+        # A seat of the flight's layout that isn't on sale, and that no stored
+        # or accepted booking has (check_batch looks first), is taken to be
+        # sold already - e.g. the bookings of an exported manifest, imported
+        # next to its flights
+        if dated_inventory.is_dated(flight_number):
+            return dated_inventory.seat_available(flight_number, seat)
+        return seat in self.flights[flight_number]["seats"]
+
+def _lock_store(stack, backend):
+    # With the text backend, hold both data files for the whole import so app
+    # writes wait instead of racing it. Same order as every other write (see
+    # locks.py), and no flight locks are taken while they are held.
+    if backend.name == "text":
+        stack.enter_context(file_lock(flight_manager.FLIGHTS_FILE))
+        stack.enter_context(file_lock(flight_manager.BOOKED_FILE))
+
+def import_bookings(path, fmt, batch_size=BATCH_SIZE, skip_invalid=False, dry_run=False):
+    # Returns the BookingImport; its accepted rows were stored unless there
+    # were errors (and not skip_invalid) or dry_run
+    backend = get_backend()
+    with ExitStack() as stack:
+        _lock_store(stack, backend)
+        job = BookingImport(backend, backend.load_flights())
+        for rows in read_rows(path, fmt, batch_size):
+            job.check_batch(rows)
+        if dry_run or (job.errors and not skip_invalid) or not job.accepted:
+            return job
+        error = backend.import_bookings(job.accepted, job.claimed)
+        if error:
+            raise RuntimeError(error)
+    return job
+
+def check_flight_rows(rows, seen, booked, errors, first_row):
+    # Flight rows -> {flight_number: {"destination", "seats"}}, noting
+    # problems in errors. Seats that are already booked are left off sale.
+    flights = {}
+    for row_number, row in enumerate(rows, first_row):
+        if not isinstance(row, dict):
+            errors.append((row_number, "not an object"))
+            continue
+        flight_number, destination = _text(row.get("flight_number")), _text(row.get("destination"))
+        reason = _check_text(flight_number, "flight number") or _check_text(destination, "destination")
+        if reason:
+            errors.append((row_number, reason))
+            continue
+        if flight_number in seen:
+            errors.append((row_number, f"flight {flight_number} is listed twice"))
+            continue
+        seats = row.get("seats") or []
+        if isinstance(seats, str):
+            seats = seats.replace(",", " ").split()
+        seats = [_text(seat).upper() for seat in seats]
+        bad = [seat for seat in seats if not SEAT_PATTERN.fullmatch(seat)]
+        if bad:
+            errors.append((row_number, f"invalid seats {', '.join(bad[:5])}"))
+            continue
+        seen.add(flight_number)
+        flights[flight_number] = {
+            "destination": destination,
+            "seats": flight_manager.SeatMap(seat for seat in seats if (flight_number, seat) not in booked)
+        }
+    return flights
+
+def import_flights(path, fmt, batch_size=BATCH_SIZE, replace=False, skip_invalid=False, dry_run=False):
+    # Adds or updates the listed flights (or, with replace, makes them the
+    # whole inventory). Returns (flights imported, errors).
+    backend = get_backend()
+    with ExitStack() as stack:
+        _lock_store(stack, backend)
+        booked = {(booking["flight_number"], booking["seat"]) for booking in backend.iter_bookings()}
+        imported, seen, errors = {}, set(), []
+        row_number = 1
+        for rows in read_rows(path, fmt, batch_size):
+            imported.update(check_flight_rows(rows, seen, booked, errors, row_number))
+            row_number += len(rows)
+        if dry_run or (errors and not skip_invalid) or not imported:
+            return len(imported), errors
+        flights = {} if replace else backend.load_flights()
+        flights.update(imported)
+        backend.import_flights(flights)
+    return len(imported), errors
+
+def _report(errors):
+    errors = sorted(errors)
+    for row_number, reason in errors[:MAX_REPORTED_ERRORS]:
+        print(f"  row {row_number}: {reason}", file=sys.stderr)
+    if len(errors) > MAX_REPORTED_ERRORS:
+        print(f"  ... and {len(errors) - MAX_REPORTED_ERRORS} more", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import and export of flights and bookings")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("kind", choices=["flights", "bookings"])
+    parser.add_argument("path", help="file to read or write (a directory with --by-flight)")
+    parser.add_argument("--format", choices=FORMATS, help="file format (default: from the extension)")
+    parser.add_argument("--flight", action="append", help="export only this flight (repeatable)")
+    parser.add_argument("--by-flight", action="store_true", help="export one booking manifest per flight")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows validated at a time")
+    parser.add_argument("--skip-invalid", action="store_true", help="import the valid rows even if some are not")
+    parser.add_argument("--replace", action="store_true", help="imported flights replace the whole inventory")
+    parser.add_argument("--dry-run", action="store_true", help="validate only")
+    args = parser.parse_args()
+
+    try:
+        if args.by_flight and not args.format:
+            raise ValueError("--by-flight needs --format")
+        fmt = detect_format(args.path, args.format)
+        if args.action == "export":
+            if args.kind == "bookings":
+                count = export_bookings(args.path, fmt, args.flight, args.by_flight)
+            else:
+                count = export_flights(args.path, fmt, args.flight)
+            print(f"Exported {count} {args.kind} to {args.path}")
+            return
+        if args.kind == "bookings":
+            job = import_bookings(args.path, fmt, args.batch_size, args.skip_invalid, args.dry_run)
+            count, errors = len(job.accepted), job.errors
+        else:
+            count, errors = import_flights(args.path, fmt, args.batch_size, args.replace, args.skip_invalid,
+                                           args.dry_run)
+    except (OSError, ValueError, RuntimeError) as e:
+        sys.exit(f"Error: {e}")
+
+    if errors:
+        print(f"{len(errors)} invalid row(s):", file=sys.stderr)
+        _report(errors)
+    if args.dry_run:
+        print(f"{count} {args.kind} would be imported")
+    elif errors and not args.skip_invalid:
+        sys.exit("Nothing imported; fix the rows above or use --skip-invalid")
+    else:
+        print(f"Imported {count} {args.kind}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import dated_inventory
+import flight_manager
+import storage
+from locks import file_lock
+from seatmap import DEFAULT_LETTERS, SeatMap
+
+# Cross-check of the seats on sale (Flights.txt and the dated partitions)
+# against the seats sold (BookedFlights.txt). A booking claims its seat and
+# appends its line in two writes, and a cancel removes the line before putting
+# the seat back, so a crash in between leaves the files disagreeing:
+#
+#   double-booked  a seat with more than one booking
+#   on sale        a booked seat that is still listed as available
+#   orphaned       a booking for a flight the inventory doesn't have, whose
+#                  cancel would have nowhere to put the seat back
+#   lost           a dated seat that is neither on sale nor booked
+#
+# Flights.txt only lists the seats still on sale, so for undated flights a
+# seat claimed by a booking that was never written can't be told from one
+# sold before bookings were recorded; lost seats are only found for dated
+# flights, whose cabins are known (see dated_inventory.py).
+#
+# check() is one pass over the bookings: each flight's booked seats are a
+# bitmask in the SeatMap layout, so a repeat is one bit test and comparing a
+# flight with its seats on sale is one AND per flight. repair() fixes what
+# check() finds: later duplicates move to QUARANTINE_FILE, booked seats come
+# off sale, orphaned flights are added back with no seats on sale and lost
+# seats go back on sale. serve.py runs the check (or the repair, with
+# FLIGHT_STARTUP_CHECK=repair) before it starts serving.
+STARTUP_CHECK = os.environ.get("FLIGHT_STARTUP_CHECK", "check")
+STARTUP_CHECK_MODES = ("check", "repair", "off")
+# Bookings dropped as duplicates by repair(), in BookedFlights.txt format
+QUARANTINE_FILE = "BookedFlights.rejected"
+# Problems of each kind listed by describe()
+MAX_REPORTED = 20
+
+_LAYOUT = SeatMap()
+# seat -> bit in the default seat layout (None if it has none); seat strings
+# repeat across flights, so each is only parsed once
+_seat_bits = {}
+_seat_bits_lock = threading.Lock()
+
+def _seat_bit(seat):
+    bit = _seat_bits.get(seat, -1)
+    if bit == -1:
+        bit = _LAYOUT.seat_index(seat)
+        with _seat_bits_lock:
+            if len(_seat_bits) < 100000:
+                _seat_bits[seat] = bit
+    return bit
+
+class Report:
+    def __init__(self):
+        self.flights = 0
+        self.bookings = 0
+        self.seconds = 0.0
+        # (line number, line, reason) of the lines the store skips as well
+        self.malformed = []
+        # (flight key, seat, line number of the later booking)
+        self.double_booked = []
+        # (flight key, seat)
+        self.on_sale = []
+        # flight key -> (destination, [seats])
+        self.orphaned = {}
+        # (flight key, seat)
+        self.lost = []
+        self.repaired = False
+
+    @property
+    def ok(self):
+        return not (self.double_booked or self.on_sale or self.orphaned or self.lost)
+
+    def to_dict(self):
+        return {
+            "ok": self.ok,
+            "flights": self.flights,
+            "bookings": self.bookings,
+            "seconds": round(self.seconds, 3),
+            "malformed": len(self.malformed),
+            "doubleBooked": [{"flightNumber": key, "seat": seat, "line": line}
+                             for key, seat, line in self.double_booked],
+            "onSale": [{"flightNumber": key, "seat": seat} for key, seat in self.on_sale],
+            "orphaned": [{"flightNumber": key, "destination": destination, "seats": seats}
+                         for key, (destination, seats) in self.orphaned.items()],
+            "lost": [{"flightNumber": key, "seat": seat} for key, seat in self.lost],
+            "repaired": self.repaired
+        }
+
+    def summary(self):
+        orphaned_seats = sum(len(seats) for _, seats in self.orphaned.values())
+        return (f"{self.bookings} bookings, {self.flights} flights: "
+                f"{len(self.double_booked)} double-booked, {len(self.on_sale)} booked but on sale, "
+                f"{orphaned_seats} on {len(self.orphaned)} missing flight(s), {len(self.lost)} lost")
+
+    def describe(self):
+        # One line per problem, at most MAX_REPORTED of each kind
+        lines = [f"double-booked: {key} {seat} (again on line {line})"
+                 for key, seat, line in self.double_booked[:MAX_REPORTED]]
+        lines += [f"booked but on sale: {key} {seat}" for key, seat in self.on_sale[:MAX_REPORTED]]
+        lines += [f"orphaned: {key} - {destination}: {', '.join(seats)} (not in the inventory)"
+                  for key, (destination, seats) in list(self.orphaned.items())[:MAX_REPORTED]]
+        lines += [f"lost: {key} {seat}" for key, seat in self.lost[:MAX_REPORTED]]
+        return lines
+
+def _scan(booked_file, report):
+    # One pass over the bookings, read with the same parser as the store
+    # (flight_manager.scan_booking_lines), so a line the app skips as
+    # malformed is skipped here too. Returns ({key: booked bitmask}, {key:
+    # {seats without a bit}}, {key: destination of its first booking}).
+    booked = {}
+    odd = {}
+    destinations = {}
+    try:
+        f = open(booked_file, "r")
+    except FileNotFoundError:
+        return booked, odd, destinations
+    seat_bits = _seat_bits
+    count = 0
+    with f:
+        for _, record in flight_manager.scan_booking_lines(f, report.malformed):
+            if record is None:
+                continue
+            count += 1
+            flight_number, seat = record.flight_number, record.seat
+            bit = seat_bits.get(seat, -1)
+            if bit == -1:
+                bit = _seat_bit(seat)
+            bits = booked.get(flight_number, 0)
+            if not bits and flight_number not in destinations:
+                destinations[flight_number] = record.destination
+            if bit is None:
+                seats = odd.setdefault(flight_number, set())
+                if seat in seats:
+                    report.double_booked.append((flight_number, seat, record.line_number))
+                seats.add(seat)
+                continue
+            mask = 1 << bit
+            if bits & mask:
+                report.double_booked.append((flight_number, seat, record.line_number))
+            booked[flight_number] = bits | mask
+    report.bookings = count
+    return booked, odd, destinations
+
+def _seats(bits):
+    return list(SeatMap.from_bits(bits))
+
+def _on_sale(available, bits, odd_seats):
+    # Booked seats that are also in `available` (a SeatMap)
+    if available.letters == DEFAULT_LETTERS:
+        overlap = available.bits & bits
+        seats = _seats(overlap) if overlap else []
+    else:
+        seats = [seat for seat in _seats(bits) if seat in available]
+    return seats + sorted(seat for seat in odd_seats if seat in available)
+
+def _compare(report, key, available, bits, odd_seats, destination):
+    if available is None:
+        report.orphaned[key] = (destination, _seats(bits) + sorted(odd_seats))
+        return
+    if available.bits & bits or odd_seats or available.letters != DEFAULT_LETTERS:
+        report.on_sale.extend((key, seat) for seat in _on_sale(available, bits, odd_seats))
+
+def check(flights=None, booked_file=None):
+    # Returns a Report. flights defaults to Flights.txt as it is now.
+    start = time.perf_counter()
+    report = Report()
+    if flights is None:
+        # The same reader as the app: the mapped snapshot when it is current,
+        # else Flights.txt through parse_flights
+        flights = flight_manager.load_flights()
+    booked, odd, destinations = _scan(booked_file or flight_manager.BOOKED_FILE, report)
+    report.flights = len(flights)
+
+    dated = []
+    for key in booked.keys() | odd.keys():
+        if dated_inventory.is_dated(key):
+            dated.append(key)
+            continue
+        info = flights.get(key)
+        _compare(report, key, info["seats"] if info else None, booked.get(key, 0), odd.get(key, ()),
+                 destinations[key])
+
+    # Dated bookings are checked against their day's partition (or the
+    # template, for a day with none yet). Days that have passed and been
+    # archived are history and left alone.
+    today = dated_inventory.today()
+    open_days = set(dated_inventory.open_days())
+    day_keys = {}
+    for key in dated:
+        try:
+            flight_number, day = dated_inventory.split_flight_key(key)
+        except ValueError:
+            report.orphaned[key] = (destinations[key], _seats(booked.get(key, 0)) + sorted(odd.get(key, ())))
+            continue
+        if day < today and day not in open_days:
+            continue
+        day_keys.setdefault(day, []).append((flight_number, key))
+    days = {}
+    for day in open_days | day_keys.keys():
+        days[day] = dated_inventory.day_flights(day)
+    for day, keys in day_keys.items():
+        for flight_number, key in keys:
+            info = days[day].get(flight_number)
+            _compare(report, key, info["seats"] if info else None, booked.get(key, 0), odd.get(key, ()),
+                     destinations[key])
+    template = dated_inventory.new_day() if open_days else {}
+    for day in sorted(open_days):
+        for flight_number, info in days[day].items():
+            cabin = template.get(flight_number)
+            if cabin is None or cabin["seats"].letters != info["seats"].letters:
+                continue
+            key = dated_inventory.flight_key(flight_number, day)
+            lost = cabin["seats"].bits & ~info["seats"].bits & ~booked.get(key, 0)
+            report.lost.extend((key, seat) for seat in _seats(lost))
+
+    report.double_booked.sort(key=lambda problem: problem[2])
+    report.on_sale.sort()
+    report.lost.sort()
+    report.seconds = time.perf_counter() - start
+    return report
+
+def _drop_lines(line_numbers):
+    # Move the given lines of BookedFlights.txt to QUARANTINE_FILE
+    tmp_file = f"{flight_manager.BOOKED_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(flight_manager.BOOKED_FILE, "r") as src, open(tmp_file, "w") as dst, \
+                open(QUARANTINE_FILE, "a") as quarantine:
+            for line_number, line in enumerate(src, 1):
+                (quarantine if line_number in line_numbers else dst).write(line)
+        os.replace(tmp_file, flight_manager.BOOKED_FILE)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+def repair():
+    # check() and fix what it found, with the inventory and the bookings
+    # locked so running servers wait. Returns the Report of what was found.
+    with file_lock(flight_manager.FLIGHTS_FILE), file_lock(flight_manager.BOOKED_FILE):
+        flights = flight_manager.load_flights()
+        report = check(flights)
+        if report.ok:
+            return report
+        if report.double_booked:
+            # The first booking of a seat keeps it
+            _drop_lines({line for _, _, line in report.double_booked})
+
+        changed_days = {}
+        changed = False
+        for key, seat in report.on_sale:
+            flight_number, day = dated_inventory.split_flight_key(key)
+            if day is None:
+                flights[flight_number]["seats"].discard(seat)
+                changed = True
+            else:
+                changed_days.setdefault(day, []).append((flight_number, seat, False))
+        for key, seat in report.lost:
+            flight_number, day = dated_inventory.split_flight_key(key)
+            changed_days.setdefault(day, []).append((flight_number, seat, True))
+        for key, (destination, _) in report.orphaned.items():
+            if not dated_inventory.is_dated(key):
+                flights[key] = {"destination": destination, "seats": SeatMap()}
+                changed = True
+        if changed:
+            flight_manager.save_flights(flights)
+
+        for day, seats in sorted(changed_days.items()):
+            path = dated_inventory.partition_path(day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with file_lock(path):
+                day_flights = flight_manager.load_flights(path) if os.path.exists(path) else dated_inventory.new_day()
+                for flight_number, seat, release in seats:
+                    if flight_number in day_flights:
+                        if release:
+                            day_flights[flight_number]["seats"].add(seat)
+                        else:
+                            day_flights[flight_number]["seats"].discard(seat)
+                flight_manager.save_flights(day_flights, path)
+        report.repaired = True
+        return report
+
+def run(fix=False):
+    # check() or repair() for the configured storage mode. The journal is
+    # folded into the text files first; SQLite keeps seats and bookings in one
+    # transaction and has nothing to check, so it returns None.
+    backend = storage.get_backend()
+    if backend.name == "sqlite":
+        return None
+    if backend.name != "journal":
+        return repair() if fix else check()
+    with file_lock(backend.journal.journal_file):
+        backend.compact()
+        report = repair() if fix else check()
+        if report.repaired:
+            # Reload the journal's state from the repaired files
+            backend.journal.reset()
+        return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Check Flights.txt against BookedFlights.txt")
+    parser.add_argument("--repair", action="store_true", help="fix what the check finds")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        report = run(args.repair)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Error: {e}")
+    if report is None:
+        print(f"Nothing to check with FLIGHT_STORAGE_MODE={storage.STORAGE_MODE}")
+        return
+    if args.json:
+        print(json.dumps(report.to_dict()))
+    else:
+        print(f"Checked {report.summary()} in {report.seconds:.2f}s")
+        for line in report.describe():
+            print(f"  {line}")
+        if report.malformed:
+            print(f"  {len(report.malformed)} malformed line(s) skipped, first on line {report.malformed[0][0]}")
+        if report.repaired:
+            print("Repaired" + (f"; duplicate bookings moved to {QUARANTINE_FILE}" if report.double_booked else ""))
+    if not report.ok and not report.repaired:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+import argparse
+import gzip
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack
+from datetime import date, datetime, timedelta, timezone
+
+import flight_manager
+import routes
+from locks import file_lock, flight_locks
+from seatmap import SeatMap, json_default
+
+# Inventory per flight number and departure date. Flights.txt has one seat
+# list per flight number and no dates; a dated flight is addressed as
+# "<flight number>@<YYYY-MM-DD>" (e.g. "AA234@2026-10-18") and its seats live
+# in that day's partition:
+#
+#   inventory/2026-10/2026-10-18.txt    same line format as Flights.txt
+#
+# A day's partition holds every flight in Schedule.txt that departs that day.
+# It is only parsed when that day is asked for, and only written on the
+# day's first claim - until then the day is served from a full-cabin template
+# built from the schedule. Parsed days are cached by file signature, a few
+# at a time, so serving today's flights reads today's file and nothing else.
+# archive() moves days that have passed to inventory/archive/ as gzip.
+INVENTORY_DIR = os.environ.get("FLIGHT_INVENTORY_DIR", "inventory")
+ARCHIVE_DIR = os.path.join(INVENTORY_DIR, "archive")
+# Rows of CABIN_LETTERS seats on a newly opened flight date
+CABIN_ROWS = int(os.environ.get("FLIGHT_CABIN_ROWS", "45"))
+CABIN_LETTERS = "ABCD"
+# How far ahead dated flights can be booked
+BOOKING_HORIZON_DAYS = int(os.environ.get("FLIGHT_BOOKING_HORIZON_DAYS", "365"))
+# Parsed days kept in memory
+PARTITION_CACHE_SIZE = 32
+DATE_SEPARATOR = "@"
+
+def today():
+    # Departure dates are UTC, like the schedule's times
+    return datetime.now(timezone.utc).date()
+
+def parse_date(text):
+    # "YYYY-MM-DD" -> date, or ValueError
+    if not isinstance(text, str) or len(text) != 10:
+        raise ValueError(f"invalid date: {text!r}")
+    return date.fromisoformat(text)
+
+def flight_key(flight_number, day):
+    return f"{flight_number}{DATE_SEPARATOR}{day.isoformat()}"
+
+def split_flight_key(key):
+    # "AA234@2026-10-18" -> ("AA234", date(2026, 10, 18)); undated -> ("AA234", None).
+    # ValueError if the date part is malformed.
+    flight_number, separator, day = key.partition(DATE_SEPARATOR)
+    if not separator:
+        return key, None
+    return flight_number, parse_date(day)
+
+def is_dated(key):
+    return DATE_SEPARATOR in key
+
+def check_key(key):
+    # An error message if key names a date that can't be booked, else None
+    try:
+        _, day = split_flight_key(key)
+    except ValueError:
+        return f"Invalid date in {key}"
+    if day is None:
+        return None
+    return check_date(day)
+
+def check_date(day):
+    first = today()
+    if day < first:
+        return f"{day.isoformat()} has already departed"
+    if day > first + timedelta(days=BOOKING_HORIZON_DAYS):
+        return f"Bookings open {BOOKING_HORIZON_DAYS} days ahead"
+    return None
+
+def partition_path(day):
+    return os.path.join(INVENTORY_DIR, f"{day:%Y-%m}", f"{day.isoformat()}.txt")
+
+def archive_path(day):
+    return os.path.join(ARCHIVE_DIR, f"{day:%Y-%m}", f"{day.isoformat()}.txt.gz")
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+# --- unopened days ---
+
+_template = {"version": None, "flights": None, "json": None}
+_template_lock = threading.Lock()
+
+def _template_flights():
+    # Full cabins for every scheduled flight, as (flights, json), for days
+    # with no partition yet. Rebuilt when Schedule.txt changes.
+    graph = routes.get_route_graph()
+    with _template_lock:
+        if _template["flights"] is None or _template["version"] != graph.version:
+            seats = [f"{row}{letter}" for row in range(1, CABIN_ROWS + 1) for letter in CABIN_LETTERS]
+            flights = {flight_number: {"destination": leg.destination, "seats": SeatMap(seats, CABIN_LETTERS)}
+                       for flight_number, leg in sorted(graph.legs.items())}
+            _template["version"] = graph.version
+            _template["flights"] = flights
+            _template["json"] = json.dumps(flights, sort_keys=True, default=json_default)
+        return _template["flights"], _template["json"]
+
+def new_day():
+    # A fresh, modifiable copy of the template for a day's first write
+    flights, _ = _template_flights()
+    return {flight_number: {"destination": info["destination"], "seats": info["seats"].copy()}
+            for flight_number, info in flights.items()}
+
+# --- opened days ---
+
+# path -> (signature, flights, json), least recently used first
+_partitions = OrderedDict()
+_partitions_lock = threading.Lock()
+
+def _cached_day(day):
+    # (flights, json) for a day, shared and read-only
+    path = partition_path(day)
+    signature = _signature(path)
+    if signature is None:
+        return _template_flights()
+    with _partitions_lock:
+        cached = _partitions.get(path)
+        if cached is not None and cached[0] == signature:
+            _partitions.move_to_end(path)
+            return cached[1], cached[2]
+    flights = flight_manager.load_flights(path)
+    flights_json = json.dumps(flights, sort_keys=True, default=json_default)
+    with _partitions_lock:
+        _partitions[path] = (signature, flights, flights_json)
+        _partitions.move_to_end(path)
+        while len(_partitions) > PARTITION_CACHE_SIZE:
+            _partitions.popitem(last=False)
+    return flights, flights_json
+
+def day_flights(day):
+    return _cached_day(day)[0]
+
+def day_json(day):
+    return _cached_day(day)[1]
+
+def day_version(day):
+    # Changes whenever the day's inventory does, without reading it
+    signature = _signature(partition_path(day))
+    if signature is None:
+        return ("template", routes.schedule_version())
+    return signature
+
+def days_version(first, count):
+    # Version over `count` consecutive days, for results that span them
+    return tuple(day_version(first + timedelta(days=offset)) for offset in range(count))
+
+def day_availability(day):
+    return {flight_number: {"destination": info["destination"], "seatsLeft": len(info["seats"])}
+            for flight_number, info in day_flights(day).items()}
+
+def seat_available(key, seat):
+    flight_number, day = split_flight_key(key)
+    flight = day_flights(day).get(flight_number)
+    return flight is not None and seat in flight["seats"]
+
+def _by_day(seats):
+    # [(key, seat), ...] -> {day: [(flight_number, seat, key), ...]}
+    days = {}
+    for key, seat in seats:
+        flight_number, day = split_flight_key(key)
+        days.setdefault(day, []).append((flight_number, seat, key))
+    return days
+
+def claim_seats(seats, lock_flights=True, check=None):
+    # Claim (key, seat) pairs across any number of days, all or none, with
+    # one read and one write per day. A day's partition is created from the
+    # template on its first claim. Returns ({key: destination}, None) or (None, error).
+    # lock_flights=False skips the flight locks, for callers that already hold
+    # later locks (see locks.py); the day files' locks still exclude other claims.
+    # check() -> error or None runs under all of them before anything is saved.
+    days = _by_day(seats)
+    with ExitStack() as stack:
+        if lock_flights:
+            stack.enter_context(flight_locks(key for key, _ in seats))
+        for day in sorted(days):
+            os.makedirs(os.path.dirname(partition_path(day)), exist_ok=True)
+            stack.enter_context(file_lock(partition_path(day)))
+        loaded = {}
+        destinations = {}
+        for day, day_seats in days.items():
+            path = partition_path(day)
+            flights = loaded[day] = flight_manager.load_flights(path) if os.path.exists(path) else new_day()
+            for flight_number, seat, key in day_seats:
+                if flight_number not in flights or not flights[flight_number]["seats"].discard(seat):
+                    return None, f"Invalid flight or seat: {key} {seat}"
+                destinations[key] = flights[flight_number]["destination"]
+        error = check() if check is not None else None
+        if error:
+            return None, error
+        for day, flights in loaded.items():
+            flight_manager.save_flights(flights, partition_path(day))
+        return destinations, None
+
+def hold_seat(key, seat, hold):
+    # hold() -> error or None, run under the locks a claim of the seat takes
+    # if it is on sale (see StorageBackend.hold_seat)
+    flight_number, day = split_flight_key(key)
+    path = partition_path(day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with flight_locks([key]), file_lock(path):
+        flights = flight_manager.load_flights(path) if os.path.exists(path) else new_day()
+        if flight_number not in flights or seat not in flights[flight_number]["seats"]:
+            return "Invalid flight or seat"
+        return hold()
+
+def release_seats(seats, lock_flights=True):
+    # Put (key, seat) pairs back on sale. Days that were never opened or
+    # have been archived are left alone; returns False if there were any.
+    # lock_flights=False when the caller already holds the flights' locks.
+    days = _by_day(seats)
+    complete = True
+    with ExitStack() as stack:
+        if lock_flights:
+            stack.enter_context(flight_locks(key for key, _ in seats))
+        for day in sorted(days):
+            if os.path.isdir(os.path.dirname(partition_path(day))):
+                stack.enter_context(file_lock(partition_path(day)))
+        for day, day_seats in days.items():
+            path = partition_path(day)
+            if not os.path.exists(path):
+                complete = False
+                continue
+            flights = flight_manager.load_flights(path)
+            changed = False
+            for flight_number, seat, _ in day_seats:
+                if flight_number in flights:
+                    changed = flights[flight_number]["seats"].add(seat) or changed
+                else:
+                    complete = False
+            if changed:
+                flight_manager.save_flights(flights, path)
+    return complete
+
+def open_days():
+    # Dates that have a partition, in order
+    days = []
+    try:
+        months = os.listdir(INVENTORY_DIR)
+    except FileNotFoundError:
+        return days
+    for month in months:
+        month_dir = os.path.join(INVENTORY_DIR, month)
+        if month_dir == ARCHIVE_DIR or not os.path.isdir(month_dir):
+            continue
+        for name in os.listdir(month_dir):
+            if name.endswith(".txt"):
+                try:
+                    days.append(parse_date(name[:-4]))
+                except ValueError:
+                    pass
+    return sorted(days)
+
+def archive(before=None):
+    # Move every partition for a day before `before` (today by default) to
+    # ARCHIVE_DIR, gzipped. Returns the days archived.
+    before = before or today()
+    archived = []
+    for day in open_days():
+        if day >= before:
+            break
+        path, target = partition_path(day), archive_path(day)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with file_lock(path):
+            tmp_file = f"{target}.{os.getpid()}.tmp"
+            with open(path, "rb") as src, gzip.open(tmp_file, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp_file, target)
+            os.remove(path)
+        # Nothing books a day that has passed, so its lock file can go too
+        try:
+            os.remove(path + ".lock")
+        except OSError:
+            pass
+        with _partitions_lock:
+            _partitions.pop(path, None)
+        archived.append(day)
+    for month in {day.strftime("%Y-%m") for day in archived}:
+        try:
+            os.rmdir(os.path.join(INVENTORY_DIR, month))
+        except OSError:
+            pass
+    return archived
+
+def load_archived(day):
+    # An archived day's inventory, for reports
+    with gzip.open(archive_path(day), "rt") as f:
+        return flight_manager.parse_flights(f)
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the per-date flight inventory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="show the open days and their seats left")
+    archive_parser = commands.add_parser("archive", help="archive the days before a date")
+    archive_parser.add_argument("--before", type=parse_date, help="YYYY-MM-DD (default: today, UTC)")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for day in open_days():
+            flights = day_flights(day)
+            print(f"{day.isoformat()}  {len(flights)} flights, "
+                  f"{sum(len(info['seats']) for info in flights.values())} seats left")
+    else:
+        archived = archive(args.before)
+        print(f"Archived {len(archived)} day(s)" +
+              (f": {archived[0].isoformat()} .. {archived[-1].isoformat()}" if archived else ""))
+
+if __name__ == "__main__":
+    main()
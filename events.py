@@ -0,0 +1,59 @@
+import threading
+from collections import deque
+
+# In-process pub/sub for seat changes. Every claim and release made through
+# reservations is published here as a numbered event; /api/flights/stream
+# subscribers wait on the bus and push what they missed. A short history is
+# kept so a reconnecting client (Last-Event-ID) can catch up, and one that
+# fell further behind is told to resync instead.
+EVENT_HISTORY = 1024
+
+class EventBus:
+    def __init__(self, history=EVENT_HISTORY):
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.events = deque(maxlen=history)
+        # Callbacks run after every publish, for subscribers that can't block
+        # a thread in wait() (the ASGI app's event loop)
+        self.listeners = []
+
+    def add_listener(self, callback):
+        with self.cond:
+            self.listeners.append(callback)
+
+    def publish(self, event):
+        with self.cond:
+            self.seq += 1
+            seq = self.seq
+            self.events.append((seq, event))
+            self.cond.notify_all()
+            listeners = list(self.listeners)
+        for callback in listeners:
+            callback()
+        return seq
+
+    def since(self, last_seq):
+        # ([(seq, event), ...], missed) for everything after last_seq; missed
+        # means some of those events have already dropped out of the history
+        with self.cond:
+            return self._since(last_seq)
+
+    def _since(self, last_seq):
+        if last_seq >= self.seq:
+            return [], False
+        missed = not self.events or self.events[0][0] > last_seq + 1
+        return [(seq, event) for seq, event in self.events if seq > last_seq], missed
+
+    def wait(self, last_seq, timeout=None):
+        # Block until there is something after last_seq or the timeout passes
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > last_seq, timeout)
+            return self._since(last_seq)
+
+_bus = EventBus()
+
+def get_bus():
+    return _bus
+
+def publish_seats(flight_number, claimed=(), released=()):
+    return _bus.publish({"flight": flight_number, "claimed": list(claimed), "released": list(released)})
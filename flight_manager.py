@@ -1,8 +1,23 @@
 import sys
+import os
+import json
+import threading
+import uuid
 from datetime import datetime
 
+import inventory_snapshot
+import metrics
+from pricing import PriceTable
+from seatmap import SeatMap, json_default
+
+# The menu functions below go through reservations (and so the storage
+# backends), which import this module; they import it when they run so that
+# either side can be imported first.
+
 FLIGHTS_FILE = "Flights.txt"
 BOOKED_FILE = "BookedFlights.txt"
+# Binary copy of Flights.txt (see inventory_snapshot.py), used while it exists
+SNAPSHOT_FILE = "Flights.bin"
 
 # In-flight services menu with codes and prices
 INFLIGHT_SERVICES = {
@@ -33,31 +48,151 @@ INFLIGHT_SERVICES = {
     }
 }
 
-def load_flights():
-    flights = {}
+# The same catalog compiled into dense code -> price tables (see pricing.py)
+SERVICE_PRICES = PriceTable(INFLIGHT_SERVICES)
+
+# What a category left out of a services selection defaults to
+NO_SERVICE = {"food": "F0", "drinks": "D0", "comfort": "C0"}
+
+def check_services(services):
+    # A services selection from a client -> ({"food", "drinks", "comfort"} or
+    # None, None), or (None, error) for codes not in the catalog. Categories
+    # left out (or empty) get their "no ..." code.
+    if not services:
+        return None, None
+    if not isinstance(services, dict):
+        return None, "Invalid services"
+    checked = {}
+    for category, default in NO_SERVICE.items():
+        code = services.get(category) or default
+        if not isinstance(code, str) or code not in INFLIGHT_SERVICES[category]:
+            return None, f"Invalid {category} code: {code}"
+        checked[category] = code
+    return checked, None
+
+@metrics.FILE_IO.timed("load_flights")
+def load_flights(path=None):
+    # Flights.txt by default - decoded from its binary snapshot when that is
+    # current; dated_inventory keeps its per-day partitions in the same format
+    if path is None:
+        snapshot = inventory_snapshot.current()
+        if snapshot is not None:
+            return snapshot.load_flights()
     try:
-        with open(FLIGHTS_FILE, "r") as f:
-            for line in f:
-                if ":" in line:
-                    flight_info, seats = line.strip().split(":")
-                    flight_number, destination = flight_info.split(" - ")
-                    seat_list = [seat.strip() for seat in seats.strip(" []").split(",") if seat.strip()]
-                    flights[flight_number] = {
-                        "destination": destination.strip(),
-                        "seats": seat_list
-                    }
+        with open(path or FLIGHTS_FILE, "r") as f:
+            return parse_flights(f)
     except FileNotFoundError:
+        metrics.STORAGE_ERRORS.inc("load_flights")
         print("Error: Flights file not found.")
+    return {}
+
+def parse_flights(lines):
+    flights = {}
+    for line in lines:
+        if ":" in line:
+            flight_info, seats = line.strip().split(":")
+            flight_number, destination = flight_info.split(" - ")
+            seat_list = SeatMap(seat.strip() for seat in seats.strip(" []").split(",") if seat.strip())
+            flights[flight_number] = {
+                "destination": destination.strip(),
+                "seats": seat_list
+            }
     return flights
 
-def save_flights(flights):
+def format_flight_line(flight_number, info):
+    seats_str = ", ".join(info["seats"])
+    return f"{flight_number} - {info['destination']}: [{seats_str}]\n"
+
+@metrics.FILE_IO.timed("save_flights")
+def save_flights(flights, path=None):
+    path = path or FLIGHTS_FILE
     try:
-        with open(FLIGHTS_FILE, "w") as f:
+        # Write to a temp file and swap it in so readers never see a half-written file
+        tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, "w") as f:
             for flight, info in flights.items():
-                seats_str = ", ".join(info["seats"])
-                f.write(f"{flight} - {info['destination']}: [{seats_str}]\n")
+                f.write(format_flight_line(flight, info))
+        os.replace(tmp_file, path)
+        if path == FLIGHTS_FILE and os.path.exists(SNAPSHOT_FILE):
+            save_snapshot(flights)
     except Exception as e:
+        metrics.STORAGE_ERRORS.inc("save_flights")
         print(f"Error saving flights: {e}")
+    finally:
+        if path == FLIGHTS_FILE:
+            invalidate_flights_cache()
+
+def save_snapshot(flights):
+    # Rewrite Flights.bin to match the Flights.txt just written. If it can't
+    # be, drop it so nobody reads a stale copy.
+    try:
+        inventory_snapshot.write_snapshot(flights, SNAPSHOT_FILE, inventory_snapshot.file_signature(FLIGHTS_FILE))
+    except (OSError, ValueError) as e:
+        metrics.STORAGE_ERRORS.inc("save_snapshot")
+        print(f"Error saving inventory snapshot, removing it: {e}")
+        try:
+            os.remove(SNAPSHOT_FILE)
+        except OSError:
+            pass
+
+# Process-wide cache of the parsed flights and the matching /api/flights JSON.
+# It is keyed on the file's (inode, mtime, size) so edits made by other processes are
+# picked up, and save_flights drops it explicitly for writes made in-process.
+_flights_cache = {
+    "signature": None,
+    "flights": None,
+    "json": None,
+    "hits": 0,
+    "misses": 0
+}
+_flights_cache_lock = threading.Lock()
+
+def _flights_file_signature():
+    try:
+        st = os.stat(FLIGHTS_FILE)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def _refresh_flights_cache():
+    # Returns (flights, json) read under the lock; handing back the cache dict
+    # itself would let a concurrent invalidate_flights_cache() empty it first
+    signature = _flights_file_signature()
+    with _flights_cache_lock:
+        if _flights_cache["flights"] is not None and _flights_cache["signature"] == signature:
+            _flights_cache["hits"] += 1
+            return _flights_cache["flights"], _flights_cache["json"]
+        flights = load_flights()
+        _flights_cache["signature"] = signature
+        _flights_cache["flights"] = flights
+        _flights_cache["json"] = json.dumps(flights, sort_keys=True, default=json_default)
+        _flights_cache["misses"] += 1
+        return flights, _flights_cache["json"]
+
+def get_cached_flights():
+    # Shared parsed copy - treat as read-only, use load_flights() to modify
+    return _refresh_flights_cache()[0]
+
+def get_flights_json():
+    return _refresh_flights_cache()[1]
+
+def invalidate_flights_cache():
+    with _flights_cache_lock:
+        _flights_cache["signature"] = None
+        _flights_cache["flights"] = None
+        _flights_cache["json"] = None
+
+def flights_version():
+    # Changes whenever Flights.txt does, without reading it
+    return _flights_file_signature()
+
+def flights_cache_stats():
+    with _flights_cache_lock:
+        return {
+            "hits": _flights_cache["hits"],
+            "misses": _flights_cache["misses"],
+            "cached": _flights_cache["flights"] is not None
+        }
 
 def display_service_menu(service_type):
     services = INFLIGHT_SERVICES[service_type]
@@ -88,25 +223,25 @@ def select_inflight_services(flight_number, seat):
     print("\n1. Food Selection:")
     food_choice = get_service_choice("food")
     services_selected["food"] = food_choice
-    total_cost += INFLIGHT_SERVICES["food"][food_choice]["price"]
+    total_cost += SERVICE_PRICES.price("food", food_choice)
     
     # Drink selection
     print("\n2. Drink Selection:")
     drink_choice = get_service_choice("drinks")
     services_selected["drinks"] = drink_choice
-    total_cost += INFLIGHT_SERVICES["drinks"][drink_choice]["price"]
+    total_cost += SERVICE_PRICES.price("drinks", drink_choice)
     
     # Comfort selection
     print("\n3. Comfort Selection:")
     comfort_choice = get_service_choice("comfort")
     services_selected["comfort"] = comfort_choice
-    total_cost += INFLIGHT_SERVICES["comfort"][comfort_choice]["price"]
+    total_cost += SERVICE_PRICES.price("comfort", comfort_choice)
     
     # Display summary
     print(f"\n--- Services Summary ---")
-    print(f"Food: {INFLIGHT_SERVICES['food'][food_choice]['name']}")
-    print(f"Drink: {INFLIGHT_SERVICES['drinks'][drink_choice]['name']}")
-    print(f"Comfort: {INFLIGHT_SERVICES['comfort'][comfort_choice]['name']}")
+    print(f"Food: {SERVICE_PRICES.name('food', food_choice)}")
+    print(f"Drink: {SERVICE_PRICES.name('drinks', drink_choice)}")
+    print(f"Comfort: {SERVICE_PRICES.name('comfort', comfort_choice)}")
     print(f"Total Additional Cost: ${total_cost:.2f}")
     
     confirm = input("\nConfirm these services? (y/n): ").lower().strip()
@@ -116,142 +251,282 @@ def select_inflight_services(flight_number, seat):
         print("Services selection cancelled.")
         return None, 0.0
 
-def save_booking_with_services(flight_number, destination, seat, services=None, total_cost=0.0):
+def services_total_cost(services):
+    return SERVICE_PRICES.total(services)
+
+def services_total_costs(selections):
+    # Price many services dicts (or None) in one vectorized call
+    return SERVICE_PRICES.total_many(selections)
+
+def new_booking_id():
+    return uuid.uuid4().hex[:16]
+
+def legacy_booking_id(flight_number, seat):
+    # Bookings written before IDs existed are identified by their flight and seat
+    return f"{flight_number}-{seat}"
+
+def format_booking_line(flight_number, destination, seat, services=None, total_cost=0.0, booking_id=None):
+    line = f"{flight_number} - {destination}: {seat}"
+    if services:
+        services_code = f"{services['food']},{services['drinks']},{services['comfort']}"
+        line += f" | SERVICES:{services_code} | COST:${total_cost:.2f}"
+    if booking_id:
+        line += f" | ID:{booking_id}"
+    return line + "\n"
+
+class BookingRecord:
+    # One booking as read from BookedFlights.txt. Attribute access is the
+    # cheap path; item access and keys() let it stand in for the booking dicts
+    # used elsewhere (dict(record) gives a plain copy).
+    __slots__ = ("booking_id", "flight_number", "destination", "seat", "services", "total_cost", "line_number")
+    FIELDS = ("booking_id", "flight_number", "destination", "seat", "services", "total_cost")
+
+    def __init__(self, booking_id, flight_number, destination, seat, services=None, total_cost=0.0,
+                 line_number=None):
+        self.booking_id = booking_id
+        self.flight_number = flight_number
+        self.destination = destination
+        self.seat = seat
+        self.services = services
+        self.total_cost = total_cost
+        self.line_number = line_number
+
+    def keys(self):
+        return self.FIELDS
+
+    def __getitem__(self, field):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __setitem__(self, field, value):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        setattr(self, field, value)
+
+    def get(self, field, default=None):
+        return getattr(self, field) if field in self.FIELDS else default
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return f"BookingRecord({self.to_dict()!r})"
+
+def parse_booking_record(line, line_number=None):
+    # The one parser for BookedFlights.txt lines. Returns a BookingRecord,
+    # None for a blank line, or raises ValueError saying what is wrong.
+    parts = line.strip().split("|")
+    if not parts[0]:
+        return None
+    if ":" not in parts[0]:
+        raise ValueError("missing ':' before the seat")
+    flight_info, seat = parts[0].split(":", 1)
+    if " - " not in flight_info:
+        raise ValueError("missing ' - ' between flight number and destination")
+    flight_number, destination = flight_info.split(" - ", 1)
+    record = BookingRecord(None, flight_number.strip(), destination.strip(), seat.strip(),
+                           line_number=line_number)
+    if not record.flight_number or not record.seat:
+        raise ValueError("empty flight number or seat")
+    for part in parts[1:]:
+        part = part.strip()
+        if part.startswith("SERVICES:"):
+            codes = part.replace("SERVICES:", "").strip().split(",")
+            if len(codes) != 3:
+                raise ValueError("SERVICES needs food, drink and comfort codes")
+            record.services = {"food": codes[0], "drinks": codes[1], "comfort": codes[2]}
+        elif part.startswith("COST:"):
+            try:
+                record.total_cost = float(part.replace("COST:", "").strip().lstrip("$"))
+            except ValueError:
+                raise ValueError("COST is not a number")
+        elif part.startswith("ID:"):
+            record.booking_id = part.replace("ID:", "").strip()
+    if not record.booking_id:
+        record.booking_id = legacy_booking_id(record.flight_number, record.seat)
+    return record
+
+def _report_malformed(malformed, line_number, line, reason):
+    if malformed is not None:
+        malformed.append((line_number, line.rstrip("\n"), reason))
+    else:
+        print(f"Warning: skipping malformed booking on line {line_number}: {reason}", file=sys.stderr)
+
+def scan_booking_lines(lines, malformed=None):
+    # Yield (line, record) for every line, record being None for blank and
+    # malformed lines. Malformed lines are appended to `malformed` as
+    # (line_number, line, reason), or reported on stderr when it is None.
+    # Duplicate IDs get a numeric suffix, the same on every scan.
+    seen_ids = set()
+    for line_number, line in enumerate(lines, 1):
+        try:
+            record = parse_booking_record(line, line_number)
+        except ValueError as e:
+            _report_malformed(malformed, line_number, line, str(e))
+            record = None
+        if record is not None:
+            unique_booking_id(record, seen_ids)
+        yield line, record
+
+def iter_bookings(path=None, malformed=None):
+    # Stream the bookings in a booking file one BookingRecord at a time, so
+    # even a very large history is read in constant memory
+    try:
+        f = open(path or BOOKED_FILE, "r")
+    except FileNotFoundError:
+        return
+    with f:
+        for _, record in scan_booking_lines(f, malformed):
+            if record is not None:
+                yield record
+
+@metrics.FILE_IO.timed("rewrite_booking")
+def rewrite_booking(booking_id, new_line=None):
+    # Stream BookedFlights.txt into a temp file with one booking replaced by
+    # new_line (or dropped) and swap it in. Returns False if the ID isn't there.
+    tmp_file = f"{BOOKED_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    found = False
+    try:
+        with open(BOOKED_FILE, "r") as src, open(tmp_file, "w") as dst:
+            for line, record in scan_booking_lines(src, malformed=[]):
+                if record is not None and record.booking_id == booking_id:
+                    found = True
+                    if new_line:
+                        dst.write(new_line)
+                else:
+                    dst.write(line)
+        if found:
+            os.replace(tmp_file, BOOKED_FILE)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return found
+
+def unique_booking_id(booking, seen_ids):
+    # Guard against two lines sharing an ID (e.g. a double-booked legacy seat)
+    booking_id = booking["booking_id"]
+    suffix = 2
+    while booking_id in seen_ids:
+        booking_id = f"{booking['booking_id']}-{suffix}"
+        suffix += 1
+    booking["booking_id"] = booking_id
+    seen_ids.add(booking_id)
+    return booking
+
+@metrics.FILE_IO.timed("save_booking")
+def save_booking_with_services(flight_number, destination, seat, services=None, total_cost=0.0, booking_id=None):
     try:
         with open(BOOKED_FILE, "a") as bf:
-            if services:
-                services_code = f"{services['food']},{services['drinks']},{services['comfort']}"
-                bf.write(f"{flight_number} - {destination}: {seat} | SERVICES:{services_code} | COST:${total_cost:.2f}\n")
-            else:
-                bf.write(f"{flight_number} - {destination}: {seat}\n")
+            bf.write(format_booking_line(flight_number, destination, seat, services, total_cost, booking_id))
         return True
     except Exception as e:
+        metrics.STORAGE_ERRORS.inc("save_booking")
         print(f"Error saving booking: {e}")
         return False
 
+@metrics.FILE_IO.timed("save_booking")
+def save_bookings_with_services(bookings):
+    # Append several bookings (dicts with the BookingRecord fields) in one write
+    try:
+        with open(BOOKED_FILE, "a") as bf:
+            bf.write("".join(format_booking_line(b["flight_number"], b["destination"], b["seat"], b["services"],
+                                                 b["total_cost"], b["booking_id"]) for b in bookings))
+        return True
+    except Exception as e:
+        metrics.STORAGE_ERRORS.inc("save_booking")
+        print(f"Error saving bookings: {e}")
+        return False
+
 def inflight_services():
+    import reservations
     print("\n--- In-flight Services ---")
     
+    # Show existing bookings, keeping just what we need to pick one
+    choices = []
+    for i, record in enumerate(reservations.iter_bookings(), 1):
+        if i == 1:
+            print("\nYour Bookings:")
+        choices.append((record.booking_id, record.flight_number, record.seat, bool(record.services)))
+        print(f"{i}. {record.flight_number} - {record.destination}: {record.seat}")
+    
     # Check if user has a booking
-    try:
-        with open(BOOKED_FILE, "r") as f:
-            bookings = f.readlines()
-            if not bookings:
-                print("No bookings found. Please book a flight first.")
-                return
-    except FileNotFoundError:
+    if not choices:
         print("No bookings found. Please book a flight first.")
         return
     
-    # Show existing bookings
-    print("\nYour Bookings:")
-    simple_bookings = []
-    for i, booking in enumerate(bookings, 1):
-        # Extract basic booking info (before any |)
-        basic_booking = booking.split('|')[0].strip()
-        simple_bookings.append(basic_booking)
-        print(f"{i}. {basic_booking}")
-    
     # Select booking to add services
     try:
         booking_choice = int(input("\nSelect booking to add services (number): ")) - 1
-        if 0 <= booking_choice < len(simple_bookings):
-            selected_booking = simple_bookings[booking_choice]  # Fixed the variable name
+        if 0 <= booking_choice < len(choices):
+            booking_id, flight_number, seat, has_services = choices[booking_choice]
             
-            # Parse flight number, destination, and seat
-            if ":" in selected_booking:
-                flight_info, seat = selected_booking.split(":")
-                flight_number, destination = flight_info.split(" - ")
-                flight_number = flight_number.strip()
-                destination = destination.strip()
-                seat = seat.strip()
-                
-                # Check if services already exist for this booking
-                original_booking_line = bookings[booking_choice].strip()
-                if "SERVICES:" in original_booking_line:
-                    print("Services already exist for this booking. Would you like to update them?")
-                    confirm = input("This will replace existing services. Continue? (y/n): ").lower()
-                    if confirm != 'y':
-                        return
-                
-                # Select services
-                services, total_cost = select_inflight_services(flight_number, seat)
-                
-                if services:
-                    # Remove the old booking and add new one with services
-                    update_booking_with_services(bookings, booking_choice, flight_number, destination, seat, services, total_cost)
-                    print("Services added to your booking successfully!")
+            # Check if services already exist for this booking
+            if has_services:
+                print("Services already exist for this booking. Would you like to update them?")
+                confirm = input("This will replace existing services. Continue? (y/n): ").lower()
+                if confirm != 'y':
+                    return
+            
+            # Select services
+            services, total_cost = select_inflight_services(flight_number, seat)
+            
+            if services:
+                # Replace the services on the booking
+                error = reservations.update_booking_services(booking_id, services)
+                if error:
+                    print(f"Error updating booking with services: {error}")
                 else:
-                    print("No services were added.")
+                    print("Services added to your booking successfully!")
             else:
-                print("Invalid booking format.")
+                print("No services were added.")
         else:
             print("Invalid booking selection.")
     except (ValueError, IndexError):
         print("Invalid input. Please enter a valid booking number.")
 
-def update_booking_with_services(all_bookings, booking_index, flight_number, destination, seat, services, total_cost):
+def update_booking_with_services(booking_id, flight_number, destination, seat, services, total_cost):
     try:
         # Create new booking line with services
-        services_code = f"{services['food']},{services['drinks']},{services['comfort']}"
-        new_booking_line = f"{flight_number} - {destination}: {seat} | SERVICES:{services_code} | COST:${total_cost:.2f}\n"
+        new_booking_line = format_booking_line(flight_number, destination, seat, services, total_cost, booking_id)
         
         # Replace the old booking
-        all_bookings[booking_index] = new_booking_line
-        
-        # Write back all bookings
-        with open(BOOKED_FILE, "w") as f:
-            f.writelines(all_bookings)
+        return rewrite_booking(booking_id, new_booking_line)
             
     except Exception as e:
         print(f"Error updating booking with services: {e}")
+        return False
 
 def show_booked_flights():
-    try:
-        with open(BOOKED_FILE, "r") as bf:
-            bookings = bf.readlines()
-            if not bookings:
-                print("No booked flights yet.")
-                return
-            
+    import reservations
+    shown = 0
+    malformed = []
+    for i, record in enumerate(reservations.iter_bookings(malformed=malformed), 1):
+        if i == 1:
             print("\n--- Booked Flights ---")
-            for i, line in enumerate(bookings, 1):
-                line = line.strip()
-                if "|" in line:
-                    parts = line.split("|")
-                    flight_info = parts[0].strip()
-                    
-                    # Parse services if they exist
-                    services_info = ""
-                    cost_info = ""
-                    
-                    for part in parts[1:]:
-                        part = part.strip()
-                        if part.startswith("SERVICES:"):
-                            services_codes = part.replace("SERVICES:", "").strip()
-                            services_info = parse_services_codes(services_codes)
-                        elif part.startswith("COST:"):
-                            cost_info = part.replace("COST:", "").strip()
-                    
-                    print(f"{i}. Flight: {flight_info}")
-                    if services_info:
-                        print(f"   Services: {services_info}")
-                    if cost_info:
-                        print(f"   Additional Cost: {cost_info}")
-                else:
-                    print(f"{i}. Flight: {line} (No services added)")
-                print("-" * 50)
-                    
-    except FileNotFoundError:
-        print("No bookings found.")
+        flight_info = f"{record.flight_number} - {record.destination}: {record.seat}"
+        if record.services:
+            services_codes = f"{record.services['food']},{record.services['drinks']},{record.services['comfort']}"
+            print(f"{i}. Flight: {flight_info}")
+            print(f"   Services: {parse_services_codes(services_codes)}")
+            print(f"   Additional Cost: ${record.total_cost:.2f}")
+        else:
+            print(f"{i}. Flight: {flight_info} (No services added)")
+        print("-" * 50)
+        shown = i
+    
+    if not shown:
+        print("No booked flights yet.")
+    for line_number, line, reason in malformed:
+        print(f"Skipped malformed booking on line {line_number}: {reason}")
 
 def parse_services_codes(services_codes):
     try:
         food_code, drink_code, comfort_code = services_codes.split(",")
         
-        food_name = INFLIGHT_SERVICES["food"][food_code]["name"]
-        drink_name = INFLIGHT_SERVICES["drinks"][drink_code]["name"]
-        comfort_name = INFLIGHT_SERVICES["comfort"][comfort_code]["name"]
+        food_name = SERVICE_PRICES.name("food", food_code)
+        drink_name = SERVICE_PRICES.name("drinks", drink_code)
+        comfort_name = SERVICE_PRICES.name("comfort", comfort_code)
         
         return f"Food: {food_name}, Drink: {drink_name}, Comfort: {comfort_name}"
     except Exception as e:
@@ -267,6 +542,7 @@ def flight_options(flights):
         print(f"{flight} - {info['destination']} ({len(info['seats'])} seats left)")
 
 def seat_selection(flights, flight_number):
+    import reservations
     if flight_number not in flights:
         print("Invalid flight number.")
         return None
@@ -283,10 +559,6 @@ def seat_selection(flights, flight_number):
         print("Seat not available.")
         return None
 
-    # Remove seat from available seats
-    flights[flight_number]["seats"].remove(seat)
-    save_flights(flights)
-
     # Ask if user wants to add in-flight services
     add_services = input("Would you like to add in-flight services now? (y/n): ").lower().strip()
     services = None
@@ -295,19 +567,19 @@ def seat_selection(flights, flight_number):
     if add_services == 'y':
         services, total_cost = select_inflight_services(flight_number, seat)
     
-    # Save booking to BookedFlights.txt
-    if save_booking_with_services(flight_number, flights[flight_number]["destination"], seat, services, total_cost):
-        print(f"Seat {seat} booked on {flight_number}.")
-        if services:
-            print(f"In-flight services added. Additional cost: ${total_cost:.2f}")
-        return seat
-    else:
-        # If saving failed, add the seat back
-        flights[flight_number]["seats"].append(seat)
-        save_flights(flights)
-        print("Booking failed. Please try again.")
+    # Claim the seat and save the booking in one step
+    booking_id, error = reservations.book_seat(flight_number, seat, services)
+    if error:
+        print(f"Booking failed: {error}. Please try again.")
         return None
 
+    # Keep the menu's copy of the inventory in step
+    flights[flight_number]["seats"].remove(seat)
+    print(f"Seat {seat} booked on {flight_number}. Booking ID: {booking_id}")
+    if services:
+        print(f"In-flight services added. Additional cost: ${total_cost:.2f}")
+    return seat
+
 def manage_reservations(flights):
     while True:
         print("\n" + "-------------------------")
@@ -349,8 +621,9 @@ def book_flight(flights):
             print("Invalid option. Try again.")
 
 def main():
+    import reservations
     # Load flights or initialize sample data
-    flights = load_flights()
+    flights = reservations.current_flights()
     if not flights:
         print("No flight data found.")
         return
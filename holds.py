@@ -0,0 +1,303 @@
+import heapq
+import os
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+
+from locks import file_lock
+
+# Temporary seat holds. A hold keeps a seat out of everyone else's reach for
+# a few minutes while its customer picks services, and is turned into a
+# booking by passing its holdId to /api/book. Holds are indexed by ID and by
+# seat, and their expiry times sit in a min-heap that one reaper thread sleeps
+# on, so expiring any number of holds costs a heap pop each and nothing runs
+# while none are due.
+#
+# With a path, the holds are shared with the other worker processes through
+# that file, an append-only log of "+ id flight seat expires" and "- id"
+# records. Changes are appended under its file lock on top of the latest
+# contents; lookups cost one stat() and only read records appended since the
+# last one, so a hold made by one worker can be confirmed or released through
+# any other. Once the log is mostly dead records it is rewritten with just the
+# live holds. Expiry times are wall-clock for the same reason.
+HOLD_TTL = float(os.environ.get("FLIGHT_HOLD_TTL", "300"))
+MAX_HOLD_TTL = 900
+HOLDS_FILE = "Holds.txt"
+# Rewrite the log once it holds this many records more than twice the live holds
+HOLDS_LOG_SLACK = 256
+
+class Hold:
+    __slots__ = ("hold_id", "flight_number", "seat", "expires")
+
+    def __init__(self, hold_id, flight_number, seat, expires):
+        self.hold_id = hold_id
+        self.flight_number = flight_number
+        self.seat = seat
+        # time.time() deadline
+        self.expires = expires
+
+    def to_dict(self):
+        return {
+            "holdId": self.hold_id,
+            "flightNumber": self.flight_number,
+            "seat": self.seat,
+            "expiresIn": max(0.0, round(self.expires - time.time(), 1))
+        }
+
+class SeatHolds:
+    def __init__(self, on_expire=None, path=None):
+        self.cond = threading.Condition()
+        self.holds = {}
+        # (flight_number, seat) -> Hold
+        self.by_seat = {}
+        # (expires, hold_id); entries for holds that are already gone are
+        # skipped when they reach the top
+        self.heap = []
+        # Bumped on every change, for ETags over the held-seat view
+        self.version = 0
+        # on_expire(flight_number, [seat, ...]) runs on the reaper thread
+        self.on_expire = on_expire
+        self.reaper = None
+        self.path = path
+        # The log as this process has read it: an open handle (which also
+        # keeps its inode from being reused), how far in, and how many records
+        self.log = None
+        self.log_inode = None
+        self.offset = 0
+        self.records = 0
+        # Holds another worker took out of the file after their time was up,
+        # still to be reported by expire()
+        self.expired_elsewhere = {}
+
+    def _sync(self):
+        # Caller holds self.cond. Apply the records other workers (or this
+        # one) appended since the last call; a rewritten log is read afresh.
+        if self.path is None:
+            return
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        if st is None and self.log is None:
+            return
+        if st is None or st.st_ino != self.log_inode:
+            if self.log is not None:
+                self.log.close()
+            self.log = open(self.path, "rb") if st is not None else None
+            self.log_inode = st.st_ino if st is not None else None
+            self.offset = self.records = 0
+            self._reload()
+            return
+        if st.st_size <= self.offset:
+            return
+        self._read_records(set(self.holds))
+
+    def _reload(self):
+        # Start over from the whole log, keeping track of what went away
+        old = self.holds
+        self.holds = {}
+        self.by_seat = {}
+        if self.log is not None:
+            self._read_records(set(old))
+        now = time.time()
+        for hold_id, hold in old.items():
+            if hold_id not in self.holds and hold.expires <= now:
+                self.expired_elsewhere[hold_id] = hold
+        self.version += 1
+
+    def _read_records(self, known):
+        # Apply every complete record past self.offset. known: hold IDs that
+        # already have a heap entry.
+        self.log.seek(self.offset)
+        data = self.log.read()
+        # A record still being appended is picked up next time
+        data = data[:data.rfind(b"\n") + 1]
+        if not data:
+            return
+        self.offset += len(data)
+        # Only holds this process was already tracking count as expired here
+        tracked = set(known)
+        now = time.time()
+        learned = False
+        for line in data.decode().splitlines():
+            self.records += 1
+            fields = line.split()
+            if fields[0] == "+":
+                hold = Hold(fields[1], fields[2], fields[3], float(fields[4]))
+                self.holds[hold.hold_id] = hold
+                self.by_seat[(hold.flight_number, hold.seat)] = hold
+                if hold.hold_id not in known:
+                    known.add(hold.hold_id)
+                    heapq.heappush(self.heap, (hold.expires, hold.hold_id))
+                    learned = True
+            else:
+                hold = self.holds.get(fields[1])
+                if hold is not None:
+                    self._drop(hold)
+                    if hold.expires <= now and hold.hold_id in tracked:
+                        self.expired_elsewhere[hold.hold_id] = hold
+        self.version += 1
+        self.cond.notify()
+        if learned:
+            # Their seats go back on sale here too when they run out
+            self._start_reaper()
+
+    def _log(self, *records):
+        # Caller holds self.cond and the file lock, has synced, and has made
+        # the change in memory already - reading it back is then a no-op
+        if self.path is None:
+            return
+        if self.records + len(records) > 2 * len(self.holds) + HOLDS_LOG_SLACK:
+            text = "".join(f"+ {hold.hold_id} {hold.flight_number} {hold.seat} {hold.expires!r}\n"
+                           for hold in self.holds.values())
+            tmp_file = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_file, "w") as f:
+                    f.write(text)
+                os.replace(tmp_file, self.path)
+            finally:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+        else:
+            with open(self.path, "a") as f:
+                f.write("".join(f"{record}\n" for record in records))
+        self._sync()
+
+    def _added(self, hold):
+        return f"+ {hold.hold_id} {hold.flight_number} {hold.seat} {hold.expires!r}"
+
+    def _writing(self):
+        # Serializes changes with the other workers; the in-memory state is
+        # still guarded by self.cond
+        return file_lock(self.path) if self.path is not None else nullcontext()
+
+    def hold(self, flight_number, seat, ttl=None):
+        # Returns (Hold, None) or (None, error)
+        ttl = HOLD_TTL if ttl is None else min(float(ttl), MAX_HOLD_TTL)
+        if ttl <= 0:
+            return None, "Hold time must be positive"
+        now = time.time()
+        with self._writing(), self.cond:
+            self._sync()
+            existing = self.by_seat.get((flight_number, seat))
+            if existing is not None and existing.expires > now:
+                return None, "Seat is already held"
+            hold = Hold(uuid.uuid4().hex[:16], flight_number, seat, now + ttl)
+            records = []
+            if existing is not None:
+                self._drop(existing)
+                records.append(f"- {existing.hold_id}")
+            self.holds[hold.hold_id] = hold
+            self.by_seat[(flight_number, seat)] = hold
+            self._log(*records, self._added(hold))
+            heapq.heappush(self.heap, (hold.expires, hold.hold_id))
+            self.version += 1
+            # Wake the reaper in case this is now the earliest deadline
+            self.cond.notify()
+        self._start_reaper()
+        return hold, None
+
+    def get(self, hold_id):
+        # The live hold with this ID, or None if it's unknown or expired
+        with self.cond:
+            self._sync()
+            hold = self.holds.get(hold_id)
+            return hold if hold is not None and hold.expires > time.time() else None
+
+    def release(self, hold_id):
+        # Drop a hold early; returns it, or None if it was already gone
+        with self._writing(), self.cond:
+            self._sync()
+            hold = self.holds.get(hold_id)
+            if hold is None:
+                return None
+            self._drop(hold)
+            self._log(f"- {hold_id}")
+            self.version += 1
+            return hold
+
+    def consume(self, hold_id):
+        # Drop a hold whose seat has just been booked (or turned out to be
+        # gone). The seat stays out of the held view, so the version stays put.
+        with self._writing(), self.cond:
+            self._sync()
+            hold = self.holds.get(hold_id)
+            if hold is not None:
+                self._drop(hold)
+                self._log(f"- {hold_id}")
+            return hold
+
+    def held_by_other(self, flight_number, seat, hold_id=None):
+        with self.cond:
+            self._sync()
+            hold = self.by_seat.get((flight_number, seat))
+            return hold is not None and hold.hold_id != hold_id and hold.expires > time.time()
+
+    def held_seats(self):
+        # {flight_number: {seat, ...}} for every live hold
+        now = time.time()
+        held = {}
+        with self.cond:
+            self._sync()
+            for hold in self.holds.values():
+                if hold.expires > now:
+                    held.setdefault(hold.flight_number, set()).add(hold.seat)
+        return held
+
+    def _drop(self, hold):
+        # Caller holds self.cond; the heap entry is left for the reaper to skip
+        del self.holds[hold.hold_id]
+        if self.by_seat.get((hold.flight_number, hold.seat)) is hold:
+            del self.by_seat[(hold.flight_number, hold.seat)]
+
+    def expire(self, now=None):
+        # Remove every hold whose time is up; returns {flight_number: [seat, ...]}
+        now = time.time() if now is None else now
+        expired = {}
+        with self._writing(), self.cond:
+            self._sync()
+            dropped = []
+            while self.heap and self.heap[0][0] <= now:
+                _, hold_id = heapq.heappop(self.heap)
+                hold = self.holds.get(hold_id)
+                if hold is not None:
+                    self._drop(hold)
+                    dropped.append(f"- {hold_id}")
+                else:
+                    hold = self.expired_elsewhere.pop(hold_id, None)
+                    # Gone, or its seat already held again
+                    if hold is None or self.by_seat.get((hold.flight_number, hold.seat)) is not None:
+                        continue
+                expired.setdefault(hold.flight_number, []).append(hold.seat)
+            if dropped:
+                self._log(*dropped)
+            if expired:
+                self.version += 1
+        return expired
+
+    def _start_reaper(self):
+        with self.cond:
+            if self.reaper is not None:
+                return
+            self.reaper = threading.Thread(target=self._reap, name="flight-hold-reaper", daemon=True)
+        self.reaper.start()
+
+    def _reap(self):
+        while True:
+            with self.cond:
+                # Drop heap entries of released holds so they don't wake us up
+                while (self.heap and self.heap[0][1] not in self.holds and
+                       self.heap[0][1] not in self.expired_elsewhere):
+                    heapq.heappop(self.heap)
+                if not self.heap:
+                    self.cond.wait()
+                    continue
+                delay = self.heap[0][0] - time.time()
+                if delay > 0:
+                    self.cond.wait(delay)
+                    continue
+            expired = self.expire()
+            if self.on_expire is not None:
+                for flight_number, seats in expired.items():
+                    self.on_expire(flight_number, seats)
@@ -0,0 +1,266 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import threading
+
+import flight_manager
+from seatmap import SeatMap
+
+# Binary snapshot of Flights.txt that can be mmap'ed and queried in place.
+# Parsing the text costs a split per line and a regex per seat; the snapshot
+# is fixed-width records, each carrying its seat map as the same bitmap
+# SeatMap keeps in memory, so:
+#
+#   - finding a flight is a binary search over the mapped index,
+#   - seats left and "is this seat free" read a counter or test one bit in place,
+#   - loading the whole inventory is one int.from_bytes per flight.
+#
+# Layout (little-endian):
+#
+#   header   magic "FLTSNAP1", format version, flight count, record size,
+#            bitmap bytes per record, then the (inode, mtime_ns, size) of the
+#            Flights.txt it was built from
+#   records  flight number (16 bytes), destination (48), seat letters (8),
+#            seats left (uint32), seat bitmap; text fields are UTF-8, NUL-padded.
+#            Kept in Flights.txt order so a round trip doesn't reorder the file.
+#   index    one uint32 record number per flight, in flight number order
+#
+# The snapshot is only used while its recorded signature matches Flights.txt,
+# so a hand edit of the text file (or a write by an older process) just makes
+# readers fall back to parsing it. Once the snapshot exists save_flights keeps
+# it current; build it with `python inventory_snapshot.py build`.
+MAGIC = b"FLTSNAP1"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIIIQqQ")
+FLIGHT_NUMBER_WIDTH = 16
+DESTINATION_WIDTH = 48
+LETTERS_WIDTH = 8
+RECORD_HEAD = struct.Struct(f"<{FLIGHT_NUMBER_WIDTH}s{DESTINATION_WIDTH}s{LETTERS_WIDTH}sI")
+INDEX_ENTRY = struct.Struct("<I")
+
+def _pad(text, width, what):
+    data = text.encode()
+    if len(data) > width or b"\0" in data:
+        raise ValueError(f"{what} {text!r} does not fit the snapshot format")
+    return data.ljust(width, b"\0")
+
+def _text(data):
+    return data.rstrip(b"\0").decode()
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def encode(flights, source=None):
+    # flights dict -> snapshot bytes. source is the (inode, mtime_ns, size)
+    # of the text file the flights came from. ValueError if a flight can't be
+    # represented (a field too long, or seats outside the row/letter layout).
+    records = []
+    bitmap_bytes = 8
+    for flight_number, info in flights.items():
+        seats = info["seats"]
+        if not isinstance(seats, SeatMap):
+            seats = SeatMap(seats)
+        if seats.extra:
+            raise ValueError(f"{flight_number} has seats without a row and letter: {', '.join(seats.extra)}")
+        number, destination = flight_number.encode(), info["destination"].encode()
+        # struct pads the fields with NULs, but would silently cut long ones
+        if (len(number) > FLIGHT_NUMBER_WIDTH or len(destination) > DESTINATION_WIDTH
+                or len(seats.letters) > LETTERS_WIDTH):
+            raise ValueError(f"{flight_number} - {info['destination']} does not fit the snapshot format")
+        head = RECORD_HEAD.pack(number, destination, seats.letters.encode(), seats.count)
+        records.append((head[:FLIGHT_NUMBER_WIDTH], head, seats.bits))
+        bitmap_bytes = max(bitmap_bytes, -(-seats.bits.bit_length() // 64) * 8)
+    order = sorted(range(len(records)), key=lambda index: records[index][0])
+    for index, next_index in zip(order, order[1:]):
+        if records[index][0] == records[next_index][0]:
+            raise ValueError(f"Duplicate flight number {_text(records[index][0])}")
+    record_size = RECORD_HEAD.size + bitmap_bytes
+    ino, mtime_ns, size = source or (0, 0, 0)
+    parts = [HEADER.pack(MAGIC, FORMAT_VERSION, len(records), record_size, bitmap_bytes, ino, mtime_ns, size)]
+    for _, head, bits in records:
+        parts.append(head)
+        parts.append(bits.to_bytes(bitmap_bytes, "little"))
+    parts.append(struct.pack(f"<{len(order)}I", *order))
+    return b"".join(parts)
+
+def write_snapshot(flights, path, source=None):
+    # Atomic, like save_flights: readers keep their mapping of the old file
+    data = encode(flights, source)
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_file, "wb") as f:
+            f.write(data)
+        os.replace(tmp_file, path)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+class InventorySnapshot:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.signature = file_signature(path)
+        if len(self.map) < HEADER.size:
+            raise ValueError(f"{path} is not an inventory snapshot")
+        magic, version, self.count, self.record_size, self.bitmap_bytes, ino, mtime_ns, size = \
+            HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not an inventory snapshot (version {FORMAT_VERSION})")
+        self.index_offset = HEADER.size + self.count * self.record_size
+        if len(self.map) != self.index_offset + self.count * INDEX_ENTRY.size:
+            raise ValueError(f"{path} is truncated")
+        self.source = (ino, mtime_ns, size)
+        self.view = memoryview(self.map)
+
+    def __len__(self):
+        return self.count
+
+    def _offset(self, index):
+        return HEADER.size + index * self.record_size
+
+    def find(self, flight_number):
+        # Record number of a flight, by binary search over the mapped index
+        try:
+            key = _pad(flight_number, FLIGHT_NUMBER_WIDTH, "Flight number")
+        except ValueError:
+            return None
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            index = INDEX_ENTRY.unpack_from(self.map, self.index_offset + middle * INDEX_ENTRY.size)[0]
+            offset = self._offset(index)
+            probe = self.map[offset:offset + FLIGHT_NUMBER_WIDTH]
+            if probe == key:
+                return index
+            if probe < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def record(self, index):
+        # (flight_number, destination, letters, seats_left) of one record
+        flight_number, destination, letters, seats_left = RECORD_HEAD.unpack_from(self.map, self._offset(index))
+        return _text(flight_number), _text(destination), _text(letters), seats_left
+
+    def seats_left(self, flight_number):
+        index = self.find(flight_number)
+        return None if index is None else self.record(index)[3]
+
+    def seat_available(self, flight_number, seat):
+        # One bit test in the mapped bitmap
+        index = self.find(flight_number)
+        if index is None:
+            return False
+        letters = self.record(index)[2]
+        bit = SeatMap(letters=letters).seat_index(seat)
+        if bit is None or bit >= self.bitmap_bytes * 8:
+            return False
+        return bool(self.map[self._offset(index) + RECORD_HEAD.size + bit // 8] >> (bit % 8) & 1)
+
+    def availability(self):
+        # {flight_number: {"destination", "seatsLeft"}} without touching the bitmaps
+        availability = {}
+        for index in range(self.count):
+            flight_number, destination, _, seats_left = self.record(index)
+            availability[flight_number] = {"destination": destination, "seatsLeft": seats_left}
+        return availability
+
+    def seats(self, index):
+        offset = self._offset(index) + RECORD_HEAD.size
+        bits = int.from_bytes(self.view[offset:offset + self.bitmap_bytes], "little")
+        _, _, letters, seats_left = self.record(index)
+        return SeatMap.from_bits(bits, letters, seats_left)
+
+    def load_flights(self):
+        # The whole inventory as a fresh flights dict, in Flights.txt order
+        flights = {}
+        for index in range(self.count):
+            flight_number, destination, _, _ = self.record(index)
+            flights[flight_number] = {"destination": destination, "seats": self.seats(index)}
+        return flights
+
+# The mapped snapshot as of its last file signature. A replaced snapshot is
+# not closed explicitly: threads still reading it keep the mapping alive.
+_current = None
+_current_lock = threading.Lock()
+
+def current(path=None, source_path=None):
+    # The snapshot for Flights.txt if there is one and it matches the text
+    # file as it is now, else None
+    global _current
+    path = path or flight_manager.SNAPSHOT_FILE
+    signature = file_signature(path)
+    if signature is None:
+        return None
+    with _current_lock:
+        snapshot = _current
+        if snapshot is None or snapshot.signature != signature:
+            try:
+                snapshot = InventorySnapshot(path)
+            except (OSError, ValueError) as e:
+                print(f"Warning: ignoring inventory snapshot: {e}", file=sys.stderr)
+                return None
+            _current = snapshot
+    if snapshot.source != file_signature(source_path or flight_manager.FLIGHTS_FILE):
+        return None
+    return snapshot
+
+def build(flights_file=None, snapshot_file=None):
+    # Flights.txt -> snapshot. Returns the number of flights written.
+    flights_file = flights_file or flight_manager.FLIGHTS_FILE
+    snapshot_file = snapshot_file or flight_manager.SNAPSHOT_FILE
+    source = file_signature(flights_file)
+    flights = flight_manager.load_flights(flights_file)
+    write_snapshot(flights, snapshot_file, source)
+    return len(flights)
+
+def dump(snapshot_file=None, flights_file=None):
+    # Snapshot -> Flights.txt format. Returns the number of flights written.
+    flights = InventorySnapshot(snapshot_file or flight_manager.SNAPSHOT_FILE).load_flights()
+    if flights_file:
+        flight_manager.save_flights(flights, flights_file)
+    else:
+        for flight_number, info in flights.items():
+            sys.stdout.write(flight_manager.format_flight_line(flight_number, info))
+    return len(flights)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between Flights.txt and its binary snapshot")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="write the snapshot from Flights.txt")
+    build_parser.add_argument("--input", help="text inventory (default: Flights.txt)")
+    build_parser.add_argument("--output", help="snapshot file (default: Flights.bin)")
+    dump_parser = commands.add_parser("dump", help="write a snapshot back out as Flights.txt lines")
+    dump_parser.add_argument("--input", help="snapshot file (default: Flights.bin)")
+    dump_parser.add_argument("--output", help="text file (default: standard output)")
+    info_parser = commands.add_parser("info", help="describe a snapshot")
+    info_parser.add_argument("--input", help="snapshot file (default: Flights.bin)")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "build":
+            count = build(args.input, args.output)
+            print(f"Wrote {count} flights to {args.output or flight_manager.SNAPSHOT_FILE}")
+        elif args.command == "dump":
+            count = dump(args.input, args.output)
+            if args.output:
+                print(f"Wrote {count} flights to {args.output}")
+        else:
+            path = args.input or flight_manager.SNAPSHOT_FILE
+            snapshot = InventorySnapshot(path)
+            fresh = snapshot.source == file_signature(flight_manager.FLIGHTS_FILE)
+            print(f"{path}: {len(snapshot)} flights, {snapshot.record_size}-byte records, "
+                  f"{sum(info['seatsLeft'] for info in snapshot.availability().values())} seats left, "
+                  f"{'matches' if fresh else 'does not match'} {flight_manager.FLIGHTS_FILE}")
+    except (OSError, ValueError) as e:
+        sys.exit(f"Error: {e}")
+
+if __name__ == "__main__":
+    main()
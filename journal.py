@@ -0,0 +1,367 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+import flight_manager
+from locks import file_lock
+from seatmap import json_default
+
+# Append-only booking journal. Flights.txt and BookedFlights.txt act as the
+# snapshot; every seat claim, cancellation and service update since then is a
+# JSON line in the journal. Records set state rather than change it (a claim
+# means "this seat is booked with these services"), so replaying the whole
+# journal over a snapshot that already contains some of it is harmless - that
+# is what makes a crash part-way through compaction recoverable.
+JOURNAL_FILE = os.environ.get("FLIGHT_JOURNAL_FILE", "Bookings.journal")
+
+# fsync at most once per batch of records or per interval, whichever comes
+# first. A flusher thread syncs whatever a burst left behind once the interval
+# is up, so no acknowledged record stays unsynced for longer than that.
+JOURNAL_FSYNC_BATCH = int(os.environ.get("FLIGHT_JOURNAL_FSYNC_BATCH", "32"))
+JOURNAL_FSYNC_INTERVAL = float(os.environ.get("FLIGHT_JOURNAL_FSYNC_INTERVAL", "0.05"))
+
+# Fold the journal into a new snapshot once it holds this many records (0 = never)
+JOURNAL_COMPACT_RECORDS = int(os.environ.get("FLIGHT_JOURNAL_COMPACT_RECORDS", "10000"))
+
+def _write_atomic(path, lines):
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, "w") as f:
+        f.writelines(lines)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+
+class BookingJournal:
+    def __init__(self, journal_file=None):
+        self.journal_file = journal_file or JOURNAL_FILE
+        self.lock = threading.RLock()
+        self.flights = {}
+        # booking_id -> booking dict, in booking order
+        self.bookings = {}
+        self.version = 0
+        self.records = 0
+        self._offset = 0
+        self._inode = None
+        self._loaded = False
+        self._fd = None
+        self._fd_inode = None
+        self._pending_sync = 0
+        self._last_sync = time.monotonic()
+        self._synced = threading.Condition(self.lock)
+        self._flusher = None
+        self._json = None
+        self._json_version = None
+
+    # --- replay ---
+
+    def _load_snapshot(self):
+        self.flights = flight_manager.load_flights()
+        self.bookings = {record.booking_id: record.to_dict() for record in flight_manager.iter_bookings()}
+
+    def _apply(self, record):
+        # Records from before booking IDs existed fall back to the legacy ID
+        key = record.get("id") or flight_manager.legacy_booking_id(record["flight"], record["seat"])
+        op = record["op"]
+        if op == "claim":
+            flight = self.flights.get(record["flight"])
+            if flight and record["seat"] in flight["seats"]:
+                flight["seats"].remove(record["seat"])
+            if key not in self.bookings:
+                self.bookings[key] = {
+                    "booking_id": key,
+                    "flight_number": record["flight"],
+                    "destination": record["destination"],
+                    "seat": record["seat"],
+                    "services": record.get("services"),
+                    "total_cost": record.get("cost", 0.0)
+                }
+        elif op == "cancel":
+            self.bookings.pop(key, None)
+            flight = self.flights.get(record["flight"])
+            if flight and record["seat"] not in flight["seats"]:
+                flight["seats"].add(record["seat"])
+        elif op == "services":
+            booking = self.bookings.get(key)
+            if booking:
+                booking["services"] = record.get("services")
+                booking["total_cost"] = record.get("cost", 0.0)
+        self.version += 1
+
+    def _read_from(self, f, offset):
+        # Apply every complete record after offset; a torn last line is left alone
+        f.seek(offset)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                break
+            self._apply(record)
+            self.records += 1
+            offset += len(raw)
+        return offset
+
+    def _reload(self):
+        with file_lock(self.journal_file):
+            self._load_snapshot()
+            self.records = 0
+            self.version += 1
+            try:
+                with open(self.journal_file, "rb") as f:
+                    self._inode = os.fstat(f.fileno()).st_ino
+                    self._offset = self._read_from(f, 0)
+            except FileNotFoundError:
+                self._inode = None
+                self._offset = 0
+            self._loaded = True
+
+    def refresh(self):
+        # Pick up records appended by other processes since the last look
+        with self.lock:
+            if not self._loaded:
+                self._reload()
+                return
+            try:
+                with open(self.journal_file, "rb") as f:
+                    st = os.fstat(f.fileno())
+                    if st.st_ino != self._inode or st.st_size < self._offset:
+                        # The journal was compacted into a new snapshot
+                        self._reload()
+                    elif st.st_size > self._offset:
+                        self._offset = self._read_from(f, self._offset)
+            except FileNotFoundError:
+                if self._inode is not None:
+                    self._reload()
+
+    # --- appends ---
+
+    def _journal_fd(self):
+        if self._fd is not None:
+            try:
+                if os.stat(self.journal_file).st_ino == self._fd_inode:
+                    return self._fd
+            except FileNotFoundError:
+                pass
+            os.close(self._fd)
+        self._fd = os.open(self.journal_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._fd_inode = os.fstat(self._fd).st_ino
+        return self._fd
+
+    def _append(self, *records):
+        # Caller holds self.lock and the journal file lock. Several records go
+        # out in a single write so a batch lands (or tears) as one unit.
+        fd = self._journal_fd()
+        if os.fstat(fd).st_size > self._offset:
+            # Drop a torn record left behind by a crashed writer
+            os.truncate(self.journal_file, self._offset)
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records).encode()
+        os.write(fd, data)
+        self._offset += len(data)
+        self._inode = self._fd_inode
+        for record in records:
+            self._apply(record)
+        self.records += len(records)
+        self._pending_sync += 1
+        now = time.monotonic()
+        if self._pending_sync >= JOURNAL_FSYNC_BATCH or now - self._last_sync >= JOURNAL_FSYNC_INTERVAL:
+            self._sync(now)
+        elif self._pending_sync == 1:
+            self._start_flusher()
+            self._synced.notify()
+
+    def _sync(self, now=None):
+        if self._fd is not None and self._pending_sync:
+            os.fsync(self._fd)
+        self._pending_sync = 0
+        self._last_sync = now or time.monotonic()
+
+    def sync(self):
+        with self.lock:
+            self._sync()
+
+    def _start_flusher(self):
+        # Caller holds self.lock
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush, name="flight-journal-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush(self):
+        with self.lock:
+            while True:
+                if not self._pending_sync:
+                    self._synced.wait()
+                    continue
+                delay = self._last_sync + JOURNAL_FSYNC_INTERVAL - time.monotonic()
+                if delay > 0:
+                    self._synced.wait(delay)
+                    continue
+                self._sync()
+
+    def _write(self, check, *records):
+        # Validate against current state and append, all under the journal lock
+        with self.lock, file_lock(self.journal_file):
+            self.refresh()
+            error = check()
+            if error:
+                return error
+            self._append(*records)
+        if JOURNAL_COMPACT_RECORDS and self.records >= JOURNAL_COMPACT_RECORDS:
+            self.compact()
+        return None
+
+    def claim(self, flight_number, seat, services=None, total_cost=0.0, booking_id=None, also=None):
+        # Returns (destination, None) or (None, error). also() -> error or None
+        # runs under the journal lock once the seat is known to be free.
+        record = {"op": "claim", "id": booking_id, "flight": flight_number, "seat": seat,
+                  "services": services, "cost": total_cost}
+
+        def check():
+            flight = self.flights.get(flight_number)
+            if flight is None or seat not in flight["seats"]:
+                return "Invalid flight or seat"
+            record["destination"] = flight["destination"]
+            return also() if also is not None else None
+
+        error = self._write(check, record)
+        if error:
+            return None, error
+        return record["destination"], None
+
+    def claim_many(self, bookings, also=None):
+        # All-or-nothing claim of several seats. bookings are dicts with
+        # flight_number, seat, services, total_cost and booking_id.
+        # Returns ([destination, ...], None) or (None, error).
+        records = [{"op": "claim", "id": b["booking_id"], "flight": b["flight_number"], "seat": b["seat"],
+                    "services": b["services"], "cost": b["total_cost"]} for b in bookings]
+
+        def check():
+            taken = set()
+            for record in records:
+                flight = self.flights.get(record["flight"])
+                key = (record["flight"], record["seat"])
+                if flight is None or record["seat"] not in flight["seats"] or key in taken:
+                    return f"Invalid flight or seat: {record['flight']} {record['seat']}"
+                taken.add(key)
+                record["destination"] = flight["destination"]
+            return also() if also is not None else None
+
+        error = self._write(check, *records)
+        if error:
+            return None, error
+        return [record["destination"] for record in records], None
+
+    def while_on_sale(self, flight_number, seat, fn):
+        # fn() -> error or None, run under the journal lock if the seat is
+        # free, so no claim can take it meanwhile
+        with self.lock, file_lock(self.journal_file):
+            self.refresh()
+            flight = self.flights.get(flight_number)
+            if flight is None or seat not in flight["seats"]:
+                return "Invalid flight or seat"
+            return fn()
+
+    def _booking_record(self, op, booking_id, **fields):
+        # Cancel/services records need the flight and seat, filled in under the lock
+        record = dict(op=op, id=booking_id, **fields)
+
+        def check():
+            booking = self.bookings.get(booking_id)
+            if booking is None:
+                return "Invalid booking"
+            record["flight"] = booking["flight_number"]
+            record["seat"] = booking["seat"]
+            return None
+
+        return check, record
+
+    def cancel(self, booking_id):
+        return self._write(*self._booking_record("cancel", booking_id))
+
+    def update_services(self, booking_id, services, total_cost):
+        return self._write(*self._booking_record("services", booking_id, services=services, cost=total_cost))
+
+    # --- reads ---
+
+    def get_booking(self, booking_id):
+        self.refresh()
+        with self.lock:
+            booking = self.bookings.get(booking_id)
+            if booking is None:
+                return None
+            return dict(booking, services=dict(booking["services"]) if booking["services"] else None)
+
+    def bookings_copy(self):
+        self.refresh()
+        with self.lock:
+            return [dict(b, services=dict(b["services"]) if b["services"] else None)
+                    for b in self.bookings.values()]
+
+    def flights_json(self):
+        self.refresh()
+        with self.lock:
+            if self._json_version != self.version:
+                self._json = json.dumps(self.flights, sort_keys=True, default=json_default)
+                self._json_version = self.version
+            return self._json
+
+    def availability(self):
+        self.refresh()
+        with self.lock:
+            return {flight: {"destination": info["destination"], "seatsLeft": len(info["seats"])}
+                    for flight, info in self.flights.items()}
+
+    def seat_available(self, flight_number, seat):
+        self.refresh()
+        with self.lock:
+            flight = self.flights.get(flight_number)
+            return flight is not None and seat in flight["seats"]
+
+    def flights_copy(self):
+        self.refresh()
+        with self.lock:
+            return {flight: {"destination": info["destination"], "seats": info["seats"].copy()}
+                    for flight, info in self.flights.items()}
+
+    # --- compaction ---
+
+    def compact(self):
+        # Write the current state out as a new snapshot and start an empty
+        # journal. The snapshot files are replaced under their own locks, so a
+        # text-mode writer or the consistency checker never sees them half done.
+        with self.lock, file_lock(self.journal_file), \
+                file_lock(flight_manager.FLIGHTS_FILE), file_lock(flight_manager.BOOKED_FILE):
+            self.refresh()
+            self._sync()
+            _write_atomic(flight_manager.FLIGHTS_FILE,
+                          [flight_manager.format_flight_line(flight, info) for flight, info in self.flights.items()])
+            flight_manager.invalidate_flights_cache()
+            _write_atomic(flight_manager.BOOKED_FILE,
+                          [flight_manager.format_booking_line(b["flight_number"], b["destination"], b["seat"],
+                                                              b["services"], b["total_cost"], b["booking_id"])
+                           for b in self.bookings.values()])
+            # Only now is it safe to drop the old records
+            _write_atomic(self.journal_file, [])
+            self._inode = os.stat(self.journal_file).st_ino
+            self._offset = 0
+            self.records = 0
+
+    def reset(self):
+        # Forget the journal after the snapshot files were replaced wholesale
+        with self.lock, file_lock(self.journal_file):
+            self._sync()
+            _write_atomic(self.journal_file, [])
+            self._loaded = False
+
+_journal = None
+_journal_guard = threading.Lock()
+
+def get_journal():
+    global _journal
+    with _journal_guard:
+        if _journal is None:
+            _journal = BookingJournal()
+            atexit.register(_journal.sync)
+        return _journal
@@ -0,0 +1,147 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+# Local load test for the booking API. Opens --concurrency connections and
+# has each one loop over GET /api/flights/availability, with a --book-ratio
+# share of POST /api/book for a random seat, until --requests have been made.
+# Run it against the sync server (python web_interface.py) and the ASGI one
+# (uvicorn asgi_app:app) to compare them. Only the standard library is used.
+
+class Connection:
+    # Minimal HTTP/1.1 client over one keep-alive socket; reconnects when the
+    # server closes it (the Flask dev server does after every response)
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        data = json.dumps(body).encode() if body is not None else b""
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(data)}\r\n"
+        if body is not None:
+            head += "Content-Type: application/json\r\n"
+        self.writer.write(head.encode() + b"\r\n" + data)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("server closed the connection")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            payload = b""
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                payload += await self.reader.readexactly(size)
+                await self.reader.readline()
+        elif "content-length" in headers:
+            payload = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            payload = await self.reader.read()
+            headers["connection"] = "close"
+
+        if status_line.startswith(b"HTTP/1.0") or headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, payload
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+async def run(url, concurrency, total, book_ratio):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+
+    # Seats to try booking, so book requests do real claims
+    status, payload = await Connection(host, port).request("GET", "/api/flights")
+    flights = json.loads(payload)
+    seats = [(flight_number, seat) for flight_number, info in flights.items() for seat in info["seats"]]
+    random.shuffle(seats)
+
+    latencies = []
+    errors = 0
+    booked = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors, booked
+        conn = Connection(host, port)
+        while remaining > 0:
+            remaining -= 1
+            if seats and random.random() < book_ratio:
+                flight_number, seat = seats.pop()
+                method, path, body = "POST", "/api/book", {"flightNumber": flight_number, "seat": seat}
+            else:
+                method, path, body = "GET", "/api/flights/availability", None
+            start = time.perf_counter()
+            try:
+                status, payload = await conn.request(method, path, body)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+                errors += 1
+                conn.close()
+                continue
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors += 1
+            elif method == "POST" and json.loads(payload).get("success"):
+                booked += 1
+        conn.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "booked": booked,
+        "seconds": round(elapsed, 3),
+        "requestsPerSecond": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50Ms": round(percentile(0.50), 2),
+        "p95Ms": round(percentile(0.95), 2),
+        "p99Ms": round(percentile(0.99), 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the booking API")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="server to test")
+    parser.add_argument("--concurrency", type=int, default=100, help="simultaneous connections")
+    parser.add_argument("--requests", type=int, default=5000, help="total requests")
+    parser.add_argument("--book-ratio", type=float, default=0.1, help="share of requests that book a seat")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.concurrency, args.requests, args.book_ratio))
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"{result['requests']} requests in {result['seconds']}s with {args.concurrency} connections "
+          f"({result['errors']} errors, {result['booked']} seats booked)")
+    print(f"{result['requestsPerSecond']} requests/s, latency p50 {result['p50Ms']}ms, "
+          f"p95 {result['p95Ms']}ms, p99 {result['p99Ms']}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on this platform - fall back to in-process locking only
+    fcntl = None
+
+# One lock per flight number so claims on different flights never wait on
+# each other in-process. The inventory file lock is only held for the short
+# read-modify-write of Flights.txt and also serializes other worker processes.
+#
+# Every write that needs more than one of these takes them in this order, so
+# no two of them can wait on each other (in-process or across workers):
+#
+#   flight locks -> journal -> Flights.txt -> BookedFlights.txt -> day partitions
+#
+# A write that only needs the later locks may skip the earlier ones, but never
+# takes an earlier one while holding a later one. Holds.txt (see holds.py)
+# comes after all of them: a hold is recorded under the seat's claim locks.
+_flight_locks = {}
+_file_locks = {}
+_locks_guard = threading.Lock()
+
+class TimedLock:
+    # threading.Lock that reports how long each acquire() waited to metrics
+    __slots__ = ("lock", "name")
+
+    def __init__(self, name):
+        self.lock = threading.Lock()
+        self.name = name
+
+    def acquire(self):
+        start = time.perf_counter()
+        self.lock.acquire()
+        metrics.LOCK_WAIT.observe(time.perf_counter() - start, self.name)
+        return True
+
+    def release(self):
+        self.lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+def flight_lock(flight_number):
+    with _locks_guard:
+        lock = _flight_locks.get(flight_number)
+        if lock is None:
+            lock = _flight_locks[flight_number] = TimedLock("flight")
+        return lock
+
+@contextmanager
+def flight_locks(flight_numbers):
+    # Hold several flights' locks at once, always taken in sorted order so two
+    # batches over overlapping flights can't deadlock
+    locks = [flight_lock(flight_number) for flight_number in sorted(set(flight_numbers))]
+    acquired = []
+    try:
+        for lock in locks:
+            lock.acquire()
+            acquired.append(lock)
+        yield
+    finally:
+        for lock in reversed(acquired):
+            lock.release()
+
+def _file_lock_state(path):
+    path = os.path.abspath(path)
+    with _locks_guard:
+        state = _file_locks.get(path)
+        if state is None:
+            state = _file_locks[path] = {"lock": threading.RLock(), "depth": 0, "handle": None}
+        return state
+
+@contextmanager
+def file_lock(path):
+    # Exclusive lock on "<path>.lock", shared by threads and worker processes.
+    # Re-entrant within a thread: only the outermost holder takes the flock.
+    state = _file_lock_state(path)
+    start = time.perf_counter()
+    with state["lock"]:
+        if state["depth"] == 0 and fcntl is not None:
+            state["handle"] = open(path + ".lock", "a")
+            fcntl.flock(state["handle"].fileno(), fcntl.LOCK_EX)
+        if state["depth"] == 0:
+            # Threads of this process and, through the flock, other workers
+            metrics.LOCK_WAIT.observe(time.perf_counter() - start, "file")
+        state["depth"] += 1
+        try:
+            yield
+        finally:
+            state["depth"] -= 1
+            if state["depth"] == 0 and state["handle"] is not None:
+                fcntl.flock(state["handle"].fileno(), fcntl.LOCK_UN)
+                state["handle"].close()
+                state["handle"] = None
@@ -0,0 +1,153 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Process-local metrics in the Prometheus text exposition format, served at
+# /metrics. Each metric keeps one small record per label combination behind
+# its own lock, so recording a sample is a dict lookup and a couple of
+# additions; the text is only built when /metrics is scraped. Label values
+# are passed positionally in the order the metric declares its labels.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds. Covers cached reads (well under a millisecond) up to a full rewrite
+# of a large Flights.txt.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            values = {key: self._copy(value) for key, value in self.values.items()}
+        for key, value in sorted(values.items()):
+            lines.extend(self._lines(key, value))
+        return lines
+
+    def _copy(self, value):
+        return value
+
+    def _lines(self, key, value):
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self.lock:
+            self.values[labels] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        # Per-bucket counts (the last slot is +Inf) followed by the sum; they
+        # are made cumulative when rendered
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def timed(self, *labels):
+        # Decorator form of time()
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, *labels)
+            return wrapper
+        return decorate
+
+    def _copy(self, value):
+        return list(value)
+
+    def _lines(self, key, counts):
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            total += count
+            le = 'le="%s"' % _number(bound)
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {total}")
+        labels = _labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {_number(counts[-1])}")
+        lines.append(f"{self.name}_count{labels} {total}")
+        return lines
+
+def render():
+    # Every registered metric as one /metrics response body
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# --- the application's metrics ---
+
+REQUEST_LATENCY = Histogram("flight_http_request_duration_seconds",
+                            "Time to handle an HTTP request, by route and status.",
+                            ("method", "route", "status"))
+REQUESTS_IN_FLIGHT = Gauge("flight_http_requests_in_flight", "HTTP requests being handled right now.")
+FILE_IO = Histogram("flight_file_io_seconds", "Time spent reading or writing the data files.", ("operation",))
+STORAGE_ERRORS = Counter("flight_storage_errors_total", "Reads and writes of the data files that failed.",
+                         ("operation",))
+BOOKINGS = Counter("flight_bookings_total", "Seats booked, by outcome.", ("result",))
+CANCELLATIONS = Counter("flight_cancellations_total", "Booking cancellations, by outcome.", ("result",))
+LOCK_WAIT = Histogram("flight_lock_wait_seconds", "Time spent waiting to acquire a lock.", ("lock",),
+                      buckets=(0.00001, 0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
@@ -0,0 +1,33 @@
+import argparse
+
+import flight_manager
+import storage
+
+# Copies the current Flights.txt / BookedFlights.txt into another storage
+# backend, e.g. before switching FLIGHT_STORAGE_MODE to sqlite.
+
+def read_text_store():
+    flights = flight_manager.load_flights()
+    bookings = storage.TextBackend().load_bookings()
+    return flights, bookings
+
+def migrate(target="sqlite", db_path=None):
+    flights, bookings = read_text_store()
+    if target == "sqlite":
+        backend = storage.SQLiteBackend(db_path)
+    else:
+        backend = storage.BACKENDS[target]()
+    backend.import_data(flights, bookings)
+    return len(flights), len(bookings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Import Flights.txt and BookedFlights.txt into a storage backend")
+    parser.add_argument("--to", choices=["sqlite", "journal"], default="sqlite", help="target backend")
+    parser.add_argument("--db", default=storage.SQLITE_DB, help="SQLite database path")
+    args = parser.parse_args()
+
+    flight_count, booking_count = migrate(args.to, args.db)
+    print(f"Imported {flight_count} flights and {booking_count} bookings into {args.to}.")
+
+if __name__ == "__main__":
+    main()
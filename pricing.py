@@ -0,0 +1,91 @@
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    # No NumPy - batch pricing falls back to array('d') and a plain loop
+    np = None
+
+SERVICE_CATEGORIES = ("food", "drinks", "comfort")
+
+# The in-flight services catalog compiled into dense tables. Every code gets a
+# small integer index per category, and each category's prices sit in one
+# contiguous vector, so pricing a booking is three list indexes and pricing
+# thousands of bookings is three gathers and two vector adds.
+class PriceTable:
+    def __init__(self, catalog):
+        self.codes = {}
+        self.index = {}
+        self.names = {}
+        self.prices = {}
+        self.vectors = {}
+        for category in SERVICE_CATEGORIES:
+            items = catalog[category]
+            self.codes[category] = tuple(items)
+            self.index[category] = {code: i for i, code in enumerate(items)}
+            self.names[category] = tuple(info["name"] for info in items.values())
+            self.prices[category] = tuple(info["price"] for info in items.values())
+            if np is not None:
+                self.vectors[category] = np.array(self.prices[category], dtype=np.float64)
+            else:
+                self.vectors[category] = array("d", self.prices[category])
+
+    def price(self, category, code):
+        # KeyError for an unknown code, like the catalog dict it replaces
+        return self.prices[category][self.index[category][code]]
+
+    def name(self, category, code):
+        return self.names[category][self.index[category][code]]
+
+    def total(self, services):
+        # Cost of one {"food", "drinks", "comfort"} selection; no services is free
+        if not services:
+            return 0.0
+        return (self.prices["food"][self.index["food"][services["food"]]] +
+                self.prices["drinks"][self.index["drinks"][services["drinks"]]] +
+                self.prices["comfort"][self.index["comfort"][services["comfort"]]])
+
+    def encode(self, selections):
+        # Turn services dicts (or None) into three index vectors plus a mask of
+        # which selections had services at all
+        food, drinks, comfort, present = [], [], [], []
+        food_index, drinks_index, comfort_index = self.index["food"], self.index["drinks"], self.index["comfort"]
+        for services in selections:
+            if services:
+                food.append(food_index[services["food"]])
+                drinks.append(drinks_index[services["drinks"]])
+                comfort.append(comfort_index[services["comfort"]])
+                present.append(1)
+            else:
+                food.append(0)
+                drinks.append(0)
+                comfort.append(0)
+                present.append(0)
+        return food, drinks, comfort, present
+
+    def total_indexed(self, food, drinks, comfort, present=None):
+        # Vectorized cost of already-encoded selections
+        if np is not None:
+            totals = (self.vectors["food"][np.asarray(food, dtype=np.intp)] +
+                      self.vectors["drinks"][np.asarray(drinks, dtype=np.intp)] +
+                      self.vectors["comfort"][np.asarray(comfort, dtype=np.intp)])
+            if present is not None:
+                totals *= np.asarray(present, dtype=np.float64)
+            return totals
+        food_prices, drinks_prices, comfort_prices = self.prices["food"], self.prices["drinks"], self.prices["comfort"]
+        totals = array("d", (food_prices[f] + drinks_prices[d] + comfort_prices[c]
+                             for f, d, c in zip(food, drinks, comfort)))
+        if present is not None:
+            for i, flag in enumerate(present):
+                if not flag:
+                    totals[i] = 0.0
+        return totals
+
+    def total_many(self, selections):
+        # Cost of every services dict (or None) in one call. Returns a NumPy
+        # float64 array when NumPy is installed, otherwise an array('d').
+        return self.total_indexed(*self.encode(selections))
+
+    def sum_many(self, selections):
+        totals = self.total_many(selections)
+        return float(totals.sum()) if np is not None else sum(totals)
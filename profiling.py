@@ -0,0 +1,248 @@
+import argparse
+import atexit
+import cProfile
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+# Opt-in request profiling. With FLIGHT_PROFILE_RATE above 0 (or after an
+# admin POST to /admin/profile) that fraction of requests is profiled and the
+# results are aggregated per route:
+#
+#   cprofile  cProfile on the request's thread, one profiled request at a time;
+#             written as <route>.<pid>.prof (pstats/snakeviz) plus a .txt summary
+#   sample    a background thread snapshots the stacks of profiled requests
+#             every FLIGHT_PROFILE_INTERVAL seconds; written as collapsed
+#             stacks, <route>.<pid>.collapsed, ready for flamegraph.pl/speedscope
+#
+# Results go to FLIGHT_PROFILE_DIR every PROFILE_DUMP_EVERY profiled requests,
+# at exit and on POST /admin/profile/dump. Requests that aren't picked pay for
+# one random() call.
+PROFILE_RATE = float(os.environ.get("FLIGHT_PROFILE_RATE", "0"))
+PROFILE_MODE = os.environ.get("FLIGHT_PROFILE_MODE", "cprofile")
+PROFILE_DIR = os.environ.get("FLIGHT_PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.environ.get("FLIGHT_PROFILE_INTERVAL", "0.005"))
+# Comma-separated route patterns to profile, e.g. "/api/book,/api/bookings"; empty means all
+PROFILE_ROUTES = [route.strip() for route in os.environ.get("FLIGHT_PROFILE_ROUTES", "").split(",") if route.strip()]
+PROFILE_DUMP_EVERY = 50
+PROFILE_MODES = ("cprofile", "sample")
+
+# Long-lived responses that would hold the profiler for their whole life
+UNPROFILED_ROUTES = {"/api/flights/stream"}
+
+def _slug(route):
+    return route.strip("/").replace("/", "_").replace("<", "").replace(">", "") or "index"
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class Profiler:
+    def __init__(self, rate=PROFILE_RATE, mode=PROFILE_MODE, directory=PROFILE_DIR, routes=PROFILE_ROUTES,
+                 interval=PROFILE_INTERVAL):
+        self.lock = threading.Lock()
+        # cProfile can only follow one request at a time (and on 3.12+ only
+        # one profiler may be active per process)
+        self.cprofile_slot = threading.Lock()
+        self.stats = {}
+        self.stacks = {}
+        self.profiled = Counter()
+        # thread ident -> route, for the sampler
+        self.watched = {}
+        self.sampler = None
+        self.rate = 0.0
+        self.mode = "cprofile"
+        self.directory = directory
+        self.routes = set()
+        self.interval = interval
+        self.configure(rate=rate, mode=mode, routes=routes, interval=interval)
+
+    def configure(self, rate=None, mode=None, routes=None, directory=None, interval=None):
+        # Raises ValueError for bad settings, leaving the old ones in place
+        if rate is not None and not 0 <= float(rate) <= 1:
+            raise ValueError("rate must be between 0 and 1")
+        if mode is not None and mode not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of: {', '.join(PROFILE_MODES)}")
+        if interval is not None and float(interval) <= 0:
+            raise ValueError("interval must be positive")
+        if routes is not None and (isinstance(routes, str) or not all(isinstance(r, str) for r in routes)):
+            raise ValueError("routes must be a list of route patterns")
+        with self.lock:
+            if rate is not None:
+                self.rate = float(rate)
+            if mode is not None:
+                self.mode = mode
+            if routes is not None:
+                self.routes = set(routes)
+            if directory is not None:
+                self.directory = directory
+            if interval is not None:
+                self.interval = float(interval)
+
+    def settings(self):
+        with self.lock:
+            return {
+                "rate": self.rate,
+                "mode": self.mode,
+                "routes": sorted(self.routes),
+                "directory": self.directory,
+                "interval": self.interval,
+                "profiled": dict(self.profiled)
+            }
+
+    def start(self, route):
+        # A token for stop(), or None when this request isn't profiled
+        if not self.rate or random.random() >= self.rate:
+            return None
+        if route in UNPROFILED_ROUTES or (self.routes and route not in self.routes):
+            return None
+        if self.mode == "cprofile":
+            if not self.cprofile_slot.acquire(blocking=False):
+                return None
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Some other profiler or debugger is active
+                self.cprofile_slot.release()
+                return None
+            return route, profile
+        self._start_sampler()
+        with self.lock:
+            self.watched[threading.get_ident()] = route
+        return route, None
+
+    def stop(self, token):
+        route, profile = token
+        if profile is not None:
+            profile.disable()
+            self.cprofile_slot.release()
+        with self.lock:
+            if profile is not None:
+                if route in self.stats:
+                    self.stats[route].add(profile)
+                else:
+                    self.stats[route] = pstats.Stats(profile)
+            else:
+                self.watched.pop(threading.get_ident(), None)
+            self.profiled[route] += 1
+            due = sum(self.profiled.values()) % PROFILE_DUMP_EVERY == 0
+        if due:
+            self.dump()
+
+    def _start_sampler(self):
+        with self.lock:
+            if self.sampler is not None:
+                return
+            self.sampler = threading.Thread(target=self._sample, name="flight-profile-sampler", daemon=True)
+        self.sampler.start()
+
+    def _sample(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                watched = dict(self.watched)
+            if not watched:
+                continue
+            frames = sys._current_frames()
+            for ident, route in watched.items():
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    key = ";".join(reversed(stack))
+                    with self.lock:
+                        self.stacks.setdefault(route, Counter())[key] += 1
+
+    def dump(self):
+        # Write everything collected so far; returns the paths written
+        with self.lock:
+            stats = dict(self.stats)
+            stacks = {route: Counter(counts) for route, counts in self.stacks.items()}
+            directory = self.directory
+        if not stats and not stacks:
+            return []
+        os.makedirs(directory, exist_ok=True)
+        pid = os.getpid()
+        paths = []
+        for route, route_stats in stats.items():
+            base = os.path.join(directory, f"{_slug(route)}.{pid}")
+            with self.lock:
+                route_stats.dump_stats(base + ".prof")
+                with open(base + ".txt", "w") as f:
+                    route_stats.stream = f
+                    route_stats.sort_stats("cumulative").print_stats(40)
+            paths += [base + ".prof", base + ".txt"]
+        for route, counts in stacks.items():
+            path = os.path.join(directory, f"{_slug(route)}.{pid}.collapsed")
+            with open(path, "w") as f:
+                for stack, count in counts.most_common():
+                    f.write(f"{stack} {count}\n")
+            paths.append(path)
+        return paths
+
+_profiler = Profiler()
+
+def get_profiler():
+    return _profiler
+
+@atexit.register
+def _dump_at_exit():
+    _profiler.dump()
+
+# --- reading the dumps ---
+
+def merge_stats(paths):
+    # One pstats.Stats over .prof files, e.g. from every worker process
+    stats = pstats.Stats(paths[0])
+    for path in paths[1:]:
+        stats.add(path)
+    return stats
+
+def merge_collapsed(paths):
+    counts = Counter()
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack:
+                    counts[stack] += int(count)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Combine and summarize profiles written by the web app")
+    parser.add_argument("paths", nargs="+", help=".prof or .collapsed files (e.g. profiles/api_book.*)")
+    parser.add_argument("--sort", default="cumulative", help="pstats sort key for .prof files")
+    parser.add_argument("--limit", type=int, default=30, help="rows to show")
+    parser.add_argument("--output", help="write the merged collapsed stacks or pstats data here")
+    args = parser.parse_args()
+
+    prof = [path for path in args.paths if path.endswith(".prof")]
+    collapsed = [path for path in args.paths if path.endswith(".collapsed")]
+    if prof:
+        stats = merge_stats(prof)
+        if args.output and not collapsed:
+            stats.dump_stats(args.output)
+        stats.sort_stats(args.sort).print_stats(args.limit)
+    if collapsed:
+        counts = merge_collapsed(collapsed)
+        if args.output:
+            with open(args.output, "w") as f:
+                for stack, count in counts.most_common():
+                    f.write(f"{stack} {count}\n")
+        total = sum(counts.values())
+        print(f"{total} samples")
+        # Self time per frame: the leaf of each stack
+        leaves = Counter()
+        for stack, count in counts.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        for frame, count in leaves.most_common(args.limit):
+            print(f"{count / total:>7.1%}  {frame}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+import argparse
+import http.client
+import json
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+# Capture and replay of API traffic. With FLIGHT_TRAFFIC_LOG set, the Flask
+# and ASGI apps append one JSON line per /api request to that file:
+#
+#   {"ts": 1760781600.123, "method": "POST", "path": "/api/book", "route": "/api/book",
+#    "query": "", "body": {"flightNumber": "AA234", "seat": "1C"}, "status": 200,
+#    "ms": 4.2, "response": {"success": true, "bookingId": "..."}}
+#
+# ts is the wall-clock start, ms the time the app took. Only writes (POST)
+# keep their response, so a replay can map the IDs they handed out. Each line
+# is a single O_APPEND write, so several serve.py workers can share one log.
+#
+# `python replay.py traffic.jsonl` sends the log again, to the Flask test
+# client or (--url) a running server, at the recorded pace, --speed times
+# faster (0 = no waiting) and over --concurrency threads. Booking and hold IDs
+# in the log are swapped for the ones the replay got back; a request that
+# needs an ID a still-running request will return waits for it. Afterwards
+# the inventory is checked through the API - no seat both on sale and booked,
+# no seat booked twice - and throughput and latency are reported per route.
+TRAFFIC_LOG = os.environ.get("FLIGHT_TRAFFIC_LOG", "")
+
+# Long-lived responses have nothing to replay
+UNRECORDED_ROUTES = {"/api/flights/stream"}
+
+# Seconds a request waits for an ID an earlier request has yet to return
+ID_WAIT_TIMEOUT = 30
+# Bookings fetched per page by the consistency check
+CHECK_PAGE_SIZE = 1000
+# Problems of each kind listed in the report
+MAX_REPORTED = 20
+
+# --- capture ---
+
+class TrafficRecorder:
+    def __init__(self, path=TRAFFIC_LOG):
+        self.path = path
+        self.fd = None
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def wants(self, path):
+        return path.startswith("/api/") and path not in UNRECORDED_ROUTES
+
+    def record(self, method, path, route, query, body, status, seconds, response=None, ts=None):
+        entry = {
+            "ts": round(ts if ts is not None else time.time() - seconds, 6),
+            "method": method,
+            "path": path,
+            "route": route,
+            "query": query,
+            "body": body,
+            "status": status,
+            "ms": round(seconds * 1000, 3)
+        }
+        if method == "POST":
+            entry["response"] = response
+        line = (json.dumps(entry, separators=(",", ":")) + "\n").encode()
+        with self.lock:
+            if self.fd is None:
+                self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            os.write(self.fd, line)
+
+_recorder = TrafficRecorder()
+
+def get_recorder():
+    return _recorder
+
+# --- replay ---
+
+def read_log(path, limit=None):
+    # The log's entries, one at a time
+    with open(path, encoding="utf-8") as f:
+        count = 0
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                entry["method"], entry["path"]
+            except (ValueError, TypeError, KeyError):
+                raise ValueError(f"{path}:{line_number}: not a traffic log entry")
+            yield entry
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+def route_of(entry):
+    return entry.get("route") or entry["path"]
+
+class ClientTarget:
+    # The Flask app in this process, through its test client (one per thread)
+    def __init__(self):
+        import web_interface
+        self.app = web_interface.app
+        self.local = threading.local()
+
+    def request(self, method, path, body=None):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        if body is None:
+            response = client.open(path, method=method)
+        else:
+            response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+    def close(self):
+        pass
+
+class HttpTarget:
+    # A running server, over one keep-alive connection per thread
+    def __init__(self, url, timeout=60):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self.local = threading.local()
+        self.connections = []
+
+    def request(self, method, path, body=None):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self.connections.append(conn)
+        data, headers = None, {}
+        if body is not None:
+            data, headers = json.dumps(body).encode(), {"Content-Type": "application/json"}
+        try:
+            conn.request(method, path, data, headers)
+            response = conn.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            raise
+        try:
+            return response.status, json.loads(payload)
+        except ValueError:
+            return response.status, None
+
+    def close(self):
+        for conn in self.connections:
+            conn.close()
+
+def _issued_ids(payload):
+    # IDs a write handed out, in a fixed order so recorded and replayed ones line up
+    if not isinstance(payload, dict) or not payload.get("success"):
+        return []
+    ids = []
+    if payload.get("bookingId"):
+        ids.append(payload["bookingId"])
+    ids.extend(payload.get("bookingIds") or [])
+    if payload.get("holdId"):
+        ids.append(payload["holdId"])
+    return ids
+
+class IdMap:
+    # Recorded booking/hold ID -> the one the replay got for it
+    def __init__(self, timeout=ID_WAIT_TIMEOUT):
+        self.timeout = timeout
+        self.ids = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def expect(self, entry):
+        # Called in log order, before the entry is sent
+        with self.lock:
+            for old in _issued_ids(entry.get("response")):
+                self.pending[old] = threading.Event()
+
+    def resolve(self, entry, payload):
+        new_ids = _issued_ids(payload)
+        with self.lock:
+            for position, old in enumerate(_issued_ids(entry.get("response"))):
+                # A write that failed this time keeps the recorded ID, so what
+                # depended on it fails too and shows up as diverged
+                self.ids[old] = new_ids[position] if position < len(new_ids) else old
+                event = self.pending.pop(old, None)
+                if event is not None:
+                    event.set()
+
+    def get(self, old):
+        # IDs the log never issued (bookings made before capture) pass through
+        with self.lock:
+            if old in self.ids:
+                return self.ids[old]
+            event = self.pending.get(old)
+        if event is None:
+            return old
+        event.wait(self.timeout)
+        with self.lock:
+            return self.ids.get(old, old)
+
+    def rewrite(self, entry):
+        # (path, body) of an entry with its recorded IDs swapped
+        path, body = entry["path"], entry.get("body")
+        if path.startswith("/api/bookings/"):
+            path = "/api/bookings/" + self.get(path[len("/api/bookings/"):])
+        if isinstance(body, dict):
+            body = dict(body)
+            for key in ("bookingId", "holdId"):
+                if isinstance(body.get(key), str):
+                    body[key] = self.get(body[key])
+            if isinstance(body.get("bookings"), list):
+                body["bookings"] = [dict(item, holdId=self.get(item["holdId"]))
+                                    if isinstance(item, dict) and isinstance(item.get("holdId"), str) else item
+                                    for item in body["bookings"]]
+        if entry.get("query"):
+            path += "?" + entry["query"]
+        return path, body
+
+class RouteStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.diverged = 0
+
+def replay(entries, target, speed=1.0, concurrency=1, id_timeout=ID_WAIT_TIMEOUT):
+    # Sends the entries to target; returns {"seconds", "routes": {route: RouteStats}}
+    ids = IdMap(id_timeout)
+    stats = {}
+    stats_lock = threading.Lock()
+    work = queue.Queue(maxsize=concurrency * 4)
+
+    def send(entry):
+        path, body = ids.rewrite(entry)
+        start = time.perf_counter()
+        try:
+            status, payload = target.request(entry["method"], path, body)
+        except (OSError, http.client.HTTPException):
+            status, payload = None, None
+        latency = time.perf_counter() - start
+        ids.resolve(entry, payload)
+        recorded = entry.get("response")
+        diverged = status != entry.get("status") or (
+            isinstance(recorded, dict) and isinstance(payload, dict)
+            and bool(recorded.get("success")) != bool(payload.get("success")))
+        with stats_lock:
+            route = stats.setdefault(route_of(entry), RouteStats())
+            if status is None or status >= 500:
+                route.errors += 1
+            else:
+                route.latencies.append(latency)
+            if diverged:
+                route.diverged += 1
+
+    def worker():
+        while True:
+            entry = work.get()
+            if entry is None:
+                return
+            send(entry)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    first_ts = None
+    try:
+        for entry in entries:
+            if speed > 0 and entry.get("ts") is not None:
+                if first_ts is None:
+                    first_ts = entry["ts"]
+                delay = start + (entry["ts"] - first_ts) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            ids.expect(entry)
+            work.put(entry)
+    finally:
+        for _ in threads:
+            work.put(None)
+        for thread in threads:
+            thread.join()
+    return {"seconds": time.perf_counter() - start, "routes": stats}
+
+def check_inventory(target):
+    # Reads the flights and every booking through the API. A booked seat must
+    # be off sale (in the dated inventory for dated bookings) and booked once.
+    def get(path, **query):
+        status, payload = target.request("GET", f"{path}?{urlencode(query)}" if query else path)
+        if status != 200 or not isinstance(payload, dict) or payload.get("success") is False:
+            raise RuntimeError(f"GET {path} failed ({status}): {payload}")
+        return payload
+
+    flights = {None: get("/api/flights")}
+    open_seats = {}
+    booked = set()
+    double_booked, on_sale = [], []
+    count = 0
+    cursor = None
+    while True:
+        query = {"limit": CHECK_PAGE_SIZE, "fields": "bookingId,flightNumber,seat"}
+        if cursor:
+            query["cursor"] = cursor
+        page = get("/api/bookings", **query)
+        for booking in page["bookings"]:
+            count += 1
+            key = (booking["flightNumber"], booking["seat"])
+            if key in booked:
+                double_booked.append(f"{key[0]} {key[1]}")
+            booked.add(key)
+            flight_number, _, day = key[0].partition("@")
+            if day and day not in flights:
+                flights[day] = get("/api/flights", date=day)
+            seats = open_seats.get((flight_number, day))
+            if seats is None:
+                info = flights[day or None].get(flight_number)
+                seats = open_seats[(flight_number, day)] = set(info["seats"]) if info else set()
+            if key[1] in seats:
+                on_sale.append(f"{key[0]} {key[1]} ({booking['bookingId']})")
+        cursor = page.get("nextCursor")
+        if not cursor:
+            break
+    return {"bookings": count, "doubleBooked": double_booked, "availableAndBooked": on_sale}
+
+def report(result, check=None):
+    # The JSON-friendly summary of a replay (and its check)
+    from bench import summarize
+
+    routes = result["routes"]
+    latencies = [latency for stats in routes.values() for latency in stats.latencies]
+    summary = summarize(latencies, result["seconds"])
+    summary["errors"] = sum(stats.errors for stats in routes.values())
+    summary["diverged"] = sum(stats.diverged for stats in routes.values())
+    summary["routes"] = {}
+    for route, stats in sorted(routes.items()):
+        route_summary = summarize(stats.latencies, result["seconds"])
+        route_summary.update(errors=stats.errors, diverged=stats.diverged)
+        summary["routes"][route] = route_summary
+    if check is not None:
+        summary["check"] = check
+    return summary
+
+def prepare_data(directory):
+    # A scratch copy of a data directory to replay against, so the original is untouched
+    scratch = tempfile.mkdtemp(prefix="flight-replay-")
+    shutil.copytree(directory, scratch, dirs_exist_ok=True, ignore=shutil.ignore_patterns("*.lock", "*.tmp"))
+    return scratch
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured API traffic (see FLIGHT_TRAFFIC_LOG)")
+    parser.add_argument("log", help="traffic log, one JSON request per line")
+    parser.add_argument("--url", help="server to replay against (default: the Flask test client)")
+    parser.add_argument("--data", help="with the test client, replay against a scratch copy of this "
+                                       "data directory instead of the current one")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="1 = recorded pace, 10 = ten times faster, 0 = no waiting")
+    parser.add_argument("--concurrency", type=int, default=1, help="requests in flight at once")
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--no-check", action="store_true", help="skip the inventory check")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args()
+    if args.concurrency < 1 or args.speed < 0:
+        parser.error("--concurrency must be at least 1 and --speed at least 0")
+    if args.url and args.data:
+        parser.error("--data only applies to the test client")
+
+    log = os.path.abspath(args.log)
+    # Don't capture the replay into a log, least of all the one being read
+    get_recorder().path = ""
+    cwd = os.getcwd()
+    if args.data:
+        scratch = prepare_data(args.data)
+        os.chdir(scratch)
+    target = HttpTarget(args.url) if args.url else ClientTarget()
+    try:
+        result = replay(read_log(log, args.limit), target, args.speed, args.concurrency)
+        check = None if args.no_check else check_inventory(target)
+    except (OSError, ValueError, RuntimeError) as e:
+        sys.exit(f"Error: {e}")
+    finally:
+        target.close()
+        if args.data:
+            os.chdir(cwd)
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    summary = report(result, check)
+    consistent = check is None or not (check["doubleBooked"] or check["availableAndBooked"])
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        print(f"{summary['calls'] + summary['errors']} requests in {summary['seconds']}s "
+              f"({summary['opsPerSecond']}/s), {summary['errors']} errors, "
+              f"{summary['diverged']} answered differently than recorded")
+        print(f"latency p50 {summary['p50Ms']}ms, p95 {summary['p95Ms']}ms, p99 {summary['p99Ms']}ms")
+        for route, stats in summary["routes"].items():
+            print(f"  {route:<32} {stats['calls']:>8} {stats['p50Ms']:>9.2f}ms {stats['p95Ms']:>9.2f}ms "
+                  f"{stats['p99Ms']:>9.2f}ms  {stats['errors']} errors, {stats['diverged']} diverged")
+        if check is not None:
+            print(f"Inventory: {check['bookings']} bookings, {len(check['doubleBooked'])} seats booked twice, "
+                  f"{len(check['availableAndBooked'])} booked seats still on sale")
+            for problem in (check["doubleBooked"] + check["availableAndBooked"])[:MAX_REPORTED]:
+                print(f"  {problem}")
+    if not consistent:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+import json
+import threading
+from datetime import timedelta
+
+import analytics
+import dated_inventory
+import events
+import flight_manager
+import holds
+import metrics
+import routes
+from storage import get_backend
+from booking_index import BookingIndex, DEFAULT_PAGE_SIZE
+
+# The reservation engine. Every booking change made by the CLI and the web
+# app goes through here; the configured storage backend (see storage.py)
+# does the locking and persistence.
+
+# Largest group a single /api/book/batch call may book
+MAX_BATCH_SIZE = 100
+
+def current_flights():
+    # Fresh copy of the inventory, safe to modify
+    return get_backend().load_flights()
+
+def current_flights_json(day=None):
+    # The inventory as JSON, with seats on hold left out. With a day, that
+    # day's dated inventory (see dated_inventory.py) instead of Flights.txt.
+    held = _held_seats(day)
+    base_json = get_backend().flights_json if day is None else lambda: dated_inventory.day_json(day)
+    if not held:
+        return base_json()
+    key = (day, flights_version(day))
+    with _held_json_lock:
+        if _held_json["key"] == key:
+            return _held_json["json"]
+    flights = json.loads(base_json())
+    for flight_number, seats in held.items():
+        if flight_number in flights:
+            flights[flight_number]["seats"] = [seat for seat in flights[flight_number]["seats"] if seat not in seats]
+    flights_json = json.dumps(flights, sort_keys=True)
+    with _held_json_lock:
+        _held_json["key"] = key
+        _held_json["json"] = flights_json
+    return flights_json
+
+def flights_version(day=None):
+    # Covers the stored inventory and the seats on hold, which both shape
+    # what /api/flights and /api/flights/availability return
+    if day is not None:
+        return (dated_inventory.day_version(day), _holds.version)
+    return (get_backend().flights_version(), _holds.version)
+
+def bookings_version():
+    return get_backend().bookings_version()
+
+def current_availability(day=None):
+    # {flight_number: {"destination", "seatsLeft"}} from the seat maps' counts,
+    # less the seats on hold
+    availability = get_backend().availability() if day is None else dated_inventory.day_availability(day)
+    for flight_number, seats in _held_seats(day).items():
+        if flight_number in availability:
+            info = availability[flight_number]
+            info["seatsLeft"] = max(0, info["seatsLeft"] - len(seats))
+    return availability
+
+def load_bookings():
+    return get_backend().load_bookings()
+
+def schedule_version():
+    return routes.schedule_version()
+
+def search_days(max_stops):
+    # Days an itinerary starting on a given day can reach: every leg may
+    # arrive the next day and every connection may wait up to MAX_LAYOVER
+    return 1 + (max_stops + 1) * (1 + -(-routes.MAX_LAYOVER // routes.DAY))
+
+def search_flights(origin, destination, depart_after=0, max_stops=1, limit=10, day=None):
+    # Itineraries from origin to destination (see routes.py) whose every leg
+    # still has a seat, as dicts ready for the API, best first. With a day,
+    # each leg is checked against the dated inventory of the day it departs.
+    availability = {}
+
+    def seats_left(leg, departs):
+        offset = departs // routes.DAY if day is not None else 0
+        if offset not in availability:
+            availability[offset] = current_availability(
+                None if day is None else day + timedelta(days=offset))
+        return availability[offset].get(leg.flight_number, {}).get("seatsLeft", 0)
+
+    itineraries = []
+    for path in routes.search(origin, destination, depart_after, max_stops):
+        seats = [seats_left(leg, departs) for leg, departs, _ in path]
+        if not all(seats):
+            continue
+        itineraries.append({
+            "stops": len(path) - 1,
+            "departs": routes.format_time(path[0][1]),
+            "arrives": routes.format_time(path[-1][2]),
+            "durationMinutes": path[-1][2] - path[0][1],
+            "legs": [{
+                "flightNumber": leg.flight_number,
+                "from": leg.origin,
+                "to": leg.destination,
+                "departs": routes.format_time(departs),
+                "arrives": routes.format_time(arrives),
+                "seatsLeft": left
+            } for (leg, departs, arrives), left in zip(path, seats)]
+        })
+        if day is not None:
+            for leg, (_, departs, _) in zip(itineraries[-1]["legs"], path):
+                leg["date"] = (day + timedelta(days=departs // routes.DAY)).isoformat()
+        if len(itineraries) >= limit:
+            break
+    return itineraries
+
+_booking_index = None
+_booking_index_lock = threading.Lock()
+
+def booking_index():
+    # Index over the current bookings. This process's own writes are folded
+    # in as they finish (see _finish_update); it is rebuilt in full only when
+    # bookings changed somewhere else. Use it under _booking_index_lock.
+    global _booking_index
+    backend = get_backend()
+    version = backend.bookings_version()
+    with _booking_index_lock:
+        if _booking_index is None or (not _booking_index.pending and _booking_index.version != version):
+            _booking_index = BookingIndex(backend.load_bookings(), version)
+        return _booking_index
+
+def query_bookings(cursor=None, limit=DEFAULT_PAGE_SIZE, flight_number=None, destination=None, has_services=None):
+    # One page of bookings as ([(booking_index, booking), ...], next_cursor)
+    index = booking_index()
+    with _booking_index_lock:
+        return index.page(cursor, limit, flight_number, destination, has_services)
+
+def iter_bookings(malformed=None):
+    # Bookings in booking order, one at a time. With the text backend this
+    # streams BookedFlights.txt; malformed lines are appended to `malformed`
+    # as (line_number, line, reason) or reported on stderr.
+    return get_backend().iter_bookings(malformed)
+
+def get_booking(booking_id):
+    return get_backend().get_booking(booking_id)
+
+def booking_id_at(position):
+    # For clients that still address bookings by their position in the list
+    index = booking_index()
+    with _booking_index_lock:
+        booking = index.booking_at(position)
+    return booking["booking_id"] if booking is not None else None
+
+_stats = None
+_stats_lock = threading.Lock()
+
+def booking_stats():
+    # Per-flight/destination sales report (see analytics.py). The running
+    # aggregates are rebuilt only when bookings changed somewhere other than
+    # this process, in one streaming pass that never holds the whole list.
+    global _stats
+    backend = get_backend()
+    version = backend.bookings_version()
+    with _stats_lock:
+        # Writes still in flight here will fold themselves in when they finish
+        if _stats is None or (not _stats.pending and _stats.version != version):
+            _stats = analytics.BookingStats.from_bookings(backend.iter_bookings(), version)
+        return _stats.report(backend.availability())
+
+def _begin_update():
+    # Called before a write. Returns the views over the bookings the write
+    # should update - (aggregates, booking index) - each None when there is
+    # none (or it is already stale and will be rebuilt).
+    global _stats, _booking_index
+    version = get_backend().bookings_version()
+    with _stats_lock:
+        if _stats is not None and not _stats.pending and _stats.version != version:
+            _stats = None
+        stats = _stats
+        if stats is not None:
+            stats.pending += 1
+    with _booking_index_lock:
+        if _booking_index is not None and not _booking_index.pending and _booking_index.version != version:
+            _booking_index = None
+        index = _booking_index
+        if index is not None:
+            index.pending += 1
+    return stats, index
+
+def _finish_update(views, added=(), removed=()):
+    # Fold a finished write (or nothing, if it failed) into the views. A
+    # booking both removed and added was changed in place.
+    stats, index = views
+    with _stats_lock:
+        if stats is not None and stats is _stats:
+            for booking in removed:
+                stats.remove(booking)
+            for booking in added:
+                stats.add(booking)
+            stats.pending -= 1
+            if not stats.pending:
+                stats.version = get_backend().bookings_version()
+    with _booking_index_lock:
+        if index is not None and index is _booking_index:
+            changed = {booking["booking_id"] for booking in added} & {booking["booking_id"] for booking in removed}
+            for booking in removed:
+                if booking["booking_id"] not in changed:
+                    index.remove(booking["booking_id"])
+            for booking in added:
+                if booking["booking_id"] in changed:
+                    index.replace(booking)
+                else:
+                    index.add(booking)
+            index.pending -= 1
+            if not index.pending:
+                index.version = get_backend().bookings_version()
+
+# --- seat holds (see holds.py) ---
+
+def _publish_released(flight_number, seats):
+    # A hold that ends puts its seat back on sale, unless the seat was booked
+    # meanwhile
+    backend = get_backend()
+    seats = [seat for seat in seats if backend.seat_available(flight_number, seat)]
+    if seats:
+        events.publish_seats(flight_number, released=seats)
+
+# Shared with the other worker processes through holds.HOLDS_FILE
+_holds = holds.SeatHolds(on_expire=_publish_released, path=holds.HOLDS_FILE)
+_held_json = {"key": None, "json": None}
+_held_json_lock = threading.Lock()
+
+def seat_holds():
+    return _holds
+
+def _held_seats(day=None):
+    # {flight_number: {seat, ...}} on hold for undated flights, or for the
+    # flights of one day
+    held = {}
+    for key, seats in _holds.held_seats().items():
+        if dated_inventory.is_dated(key) != (day is not None):
+            continue
+        flight_number, key_day = dated_inventory.split_flight_key(key)
+        if key_day == day:
+            held[flight_number] = seats
+    return held
+
+def _check_seats(seats):
+    # seats: (flight_number, seat). An error if a client sent either as
+    # something other than a string (a seat number on its own, say).
+    for flight_number, seat in seats:
+        if flight_number.__class__ is not str or seat.__class__ is not str:
+            return "Invalid flight or seat"
+    return None
+
+def _check_flights(flight_numbers):
+    # An error if any flight is dated and can't be booked for its date
+    for flight_number in flight_numbers:
+        if dated_inventory.is_dated(flight_number):
+            if not get_backend().dated:
+                return f"Dated flights need FLIGHT_STORAGE_MODE=text, not {get_backend().name}"
+            error = dated_inventory.check_key(flight_number)
+            if error:
+                return error
+    return None
+
+def seat_on_sale(flight_number, seat):
+    # Whether the flight can take bookings and the seat is still free, for
+    # turning doomed requests away before they queue for the flight
+    return (_check_seats([(flight_number, seat)]) is None and _check_flights([flight_number]) is None and
+            get_backend().seat_available(flight_number, seat))
+
+def hold_seat(flight_number, seat, ttl=None):
+    # Set a seat aside for ttl seconds. Returns (hold dict, None) or (None, error).
+    for expired_flight, seats in _holds.expire().items():
+        _publish_released(expired_flight, seats)
+    error = _check_seats([(flight_number, seat)]) or _check_flights([flight_number])
+    if error:
+        return None, error
+    taken = []
+
+    def take():
+        hold, error = _holds.hold(flight_number, seat, ttl)
+        taken.append(hold)
+        return error
+
+    # Under the seat's claim lock, so a booking can't slip in between seeing
+    # the seat free and the hold being recorded
+    error = get_backend().hold_seat(flight_number, seat, take)
+    if error:
+        return None, error
+    hold = taken[0]
+    events.publish_seats(flight_number, claimed=[seat])
+    return hold.to_dict(), None
+
+def release_hold(hold_id):
+    # Give a held seat back before its time is up. Returns an error or None.
+    hold = _holds.release(hold_id)
+    if hold is None:
+        return "Hold not found or expired"
+    _publish_released(hold.flight_number, [hold.seat])
+    return None
+
+def _check_holds(seats):
+    # seats: (flight_number, seat, hold_id or None). An error if any seat is
+    # held by someone else or a hold doesn't cover its seat. A hold that has
+    # already ended books like no hold at all, if the seat is still free.
+    for flight_number, seat, hold_id in seats:
+        hold = _holds.get(hold_id) if hold_id is not None else None
+        if hold is not None:
+            if (hold.flight_number, hold.seat) != (flight_number, seat):
+                return f"Hold is not for {flight_number} {seat}"
+        elif _holds.held_by_other(flight_number, seat):
+            return f"Seat {seat} on {flight_number} is on hold"
+    return None
+
+def book_seat(flight_number, seat, services=None, hold_id=None):
+    # Claim a seat and record the booking, confirming hold_id if given.
+    # Returns (booking_id, None) or (None, error).
+    services, error = flight_manager.check_services(services)
+    error = error or _check_seats([(flight_number, seat)]) or _check_flights([flight_number])
+    if error:
+        metrics.BOOKINGS.inc("failed")
+        return None, error
+    total_cost = flight_manager.services_total_cost(services)
+    booking_id = flight_manager.new_booking_id()
+    views = _begin_update()
+    # Holds are checked under the claim's lock, which hold_seat takes too
+    destination, error = get_backend().book_seat(flight_number, seat, services, total_cost, booking_id,
+                                                 check=lambda: _check_holds([(flight_number, seat, hold_id)]))
+    if error:
+        # The hold (if any) stays, so the customer can try again
+        _finish_update(views)
+        metrics.BOOKINGS.inc("failed")
+        return None, error
+    # Whether the seat was still shown as held (so already published as claimed)
+    was_held = hold_id is not None and _holds.consume(hold_id) is not None
+    metrics.BOOKINGS.inc("booked")
+    _finish_update(views, added=[{"booking_id": booking_id, "flight_number": flight_number,
+                                        "destination": destination, "seat": seat, "services": services,
+                                        "total_cost": total_cost}])
+    # A held seat was published as claimed when it was held; the empty event
+    # still tells streams the inventory change was ours
+    events.publish_seats(flight_number, claimed=[] if was_held else [seat])
+    return booking_id, None
+
+def book_seats(seats):
+    # Book several seats, across one or more flights, all-or-nothing. seats is
+    # a list of {"flight_number", "seat", "services", "hold_id"} dicts
+    # (services and hold_id optional).
+    # Returns ([booking_id, ...], None) or (None, error).
+    if not seats:
+        return None, "No seats requested"
+    if len(seats) > MAX_BATCH_SIZE:
+        return None, f"At most {MAX_BATCH_SIZE} seats per batch"
+    checked = [flight_manager.check_services(item.get("services")) for item in seats]
+    error = (next((error for _, error in checked if error), None) or
+             _check_seats([(item["flight_number"], item["seat"]) for item in seats]) or
+             _check_flights({item["flight_number"] for item in seats}))
+    if error:
+        metrics.BOOKINGS.inc("failed", amount=len(seats))
+        return None, error
+    seats = [dict(item, services=services) for item, (services, _) in zip(seats, checked)]
+    # Price the whole group in one call
+    costs = flight_manager.services_total_costs([item.get("services") for item in seats])
+    bookings = []
+    for item, total_cost in zip(seats, costs):
+        bookings.append({
+            "booking_id": flight_manager.new_booking_id(),
+            "flight_number": item["flight_number"],
+            "seat": item["seat"],
+            "services": item.get("services"),
+            "total_cost": float(total_cost)
+        })
+    views = _begin_update()
+    held = [(item["flight_number"], item["seat"], item.get("hold_id")) for item in seats]
+    destinations, error = get_backend().book_seats(bookings, check=lambda: _check_holds(held))
+    if error:
+        _finish_update(views)
+        metrics.BOOKINGS.inc("failed", amount=len(bookings))
+        return None, error
+    metrics.BOOKINGS.inc("booked", amount=len(bookings))
+    for booking, destination in zip(bookings, destinations):
+        booking["destination"] = destination
+    _finish_update(views, added=bookings)
+    claimed = {}
+    for item, booking in zip(seats, bookings):
+        flight_seats = claimed.setdefault(booking["flight_number"], [])
+        if item.get("hold_id") is None or _holds.consume(item["hold_id"]) is None:
+            flight_seats.append(booking["seat"])
+    for flight_number, flight_seats in claimed.items():
+        events.publish_seats(flight_number, claimed=flight_seats)
+    return [b["booking_id"] for b in bookings], None
+
+def cancel_booking(booking_id):
+    # Cancel a booking and put its seat back
+    views = _begin_update()
+    booking = get_booking(booking_id)
+    error = get_backend().cancel_booking(booking_id)
+    _finish_update(views, removed=[booking] if booking and not error else ())
+    metrics.CANCELLATIONS.inc("failed" if error else "cancelled")
+    if booking and not error:
+        events.publish_seats(booking["flight_number"], released=[booking["seat"]])
+    return error
+
+def update_booking_services(booking_id, services):
+    services, error = flight_manager.check_services(services)
+    if error:
+        return error
+    total_cost = flight_manager.services_total_cost(services)
+    views = _begin_update()
+    booking = get_booking(booking_id) if views != (None, None) else None
+    error = get_backend().update_booking_services(booking_id, services, total_cost)
+    if booking and not error:
+        _finish_update(views, added=[dict(booking, services=services, total_cost=total_cost)],
+                             removed=[booking])
+    else:
+        _finish_update(views)
+    return error
+
+def compact_storage():
+    get_backend().compact()
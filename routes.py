@@ -0,0 +1,274 @@
+import bisect
+import heapq
+import itertools
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+# Itinerary search over the flight schedule. Schedule.txt gives each flight
+# number its origin and daily departure/arrival times (UTC):
+#
+#   AA234 | Chicago -> New York | 07:00 -> 09:05
+#   BA982 | New York -> London | 18:30 -> 01:40+1
+#
+# It is read into a RouteGraph - each route's departures sorted by time of
+# day, and adjacency sets in both directions - which is rebuilt only when the
+# file changes. search() looks for itineraries of up to max_stops
+# connections, each connection at least MIN_CONNECTION and at most
+# MAX_LAYOVER minutes. It is a best-first search: partial itineraries are
+# expanded in order of a lower bound on their total time, connections are
+# found by bisecting to the first departure after landing plus
+# MIN_CONNECTION, and it stops once it has `limit` itineraries, so it never
+# enumerates every path between two hubs. Results are cached per query until
+# the schedule changes. Seat counts are not part of the cache; reservations.search_flights
+# filters the cached itineraries against live availability.
+SCHEDULE_FILE = "Schedule.txt"
+MIN_CONNECTION = 45
+MAX_LAYOVER = 24 * 60
+MAX_STOPS = 2
+# Itineraries kept per cached query, best first
+MAX_RESULTS = 200
+SEARCH_CACHE_SIZE = 256
+DAY = 24 * 60
+
+class Leg:
+    __slots__ = ("flight_number", "origin", "destination", "departs", "arrives")
+
+    def __init__(self, flight_number, origin, destination, departs, arrives):
+        self.flight_number = flight_number
+        self.origin = origin
+        self.destination = destination
+        # Minutes after midnight UTC of the departure day; arrives can run
+        # past DAY for overnight flights
+        self.departs = departs
+        self.arrives = arrives
+
+def parse_time(text):
+    # "HH:MM" or "HH:MM+N" (N days later) -> minutes
+    text = text.strip()
+    clock, _, days = text.partition("+")
+    hours, _, minutes = clock.partition(":")
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"invalid time: {text}")
+    return int(days or 0) * DAY + hours * 60 + minutes
+
+def format_time(minutes):
+    days, minutes = divmod(minutes, DAY)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}" + (f"+{days}" if days else "")
+
+def parse_schedule_line(line):
+    # One Schedule.txt line -> Leg, None for blank lines and comments, or ValueError
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    try:
+        flight_number, route, times = (part.strip() for part in line.split("|"))
+        origin, destination = (part.strip() for part in route.split("->"))
+        departs, arrives = (part.strip() for part in times.split("->"))
+    except ValueError:
+        raise ValueError("expected 'FLIGHT | ORIGIN -> DESTINATION | HH:MM -> HH:MM'")
+    if not flight_number or not origin or not destination:
+        raise ValueError("missing flight number or airport")
+    departs = parse_time(departs)
+    if departs >= DAY:
+        raise ValueError("departure must be on day 0")
+    arrives = parse_time(arrives)
+    if arrives <= departs and "+" not in times.split("->")[1]:
+        # An arrival clock time before the departure is the next day
+        arrives += DAY
+    if arrives <= departs:
+        raise ValueError("arrival before departure")
+    return Leg(flight_number, origin, destination, departs, arrives)
+
+def load_schedule(path=None):
+    legs = []
+    try:
+        with open(path or SCHEDULE_FILE) as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    leg = parse_schedule_line(line)
+                except ValueError as e:
+                    print(f"Warning: skipping schedule line {line_number}: {e}", file=sys.stderr)
+                    continue
+                if leg is not None:
+                    legs.append(leg)
+    except FileNotFoundError:
+        pass
+    return legs
+
+def _key(airport):
+    return airport.strip().casefold()
+
+class RouteGraph:
+    def __init__(self, legs, version=None):
+        self.version = version
+        self.legs = {}
+        # (origin key, destination key) -> [Leg, ...] by departure
+        self.by_pair = {}
+        # (origin key, destination key) -> [departs, ...] of by_pair, for bisecting
+        self.pair_times = {}
+        # (origin key, destination key) -> quickest flying time
+        self.quickest = {}
+        self.departures = {}
+        self.arrivals = {}
+        # airport key -> name as written in the schedule
+        self.names = {}
+        for leg in legs:
+            origin, destination = _key(leg.origin), _key(leg.destination)
+            self.legs[leg.flight_number] = leg
+            self.by_pair.setdefault((origin, destination), []).append(leg)
+            self.departures.setdefault(origin, set()).add(destination)
+            self.arrivals.setdefault(destination, set()).add(origin)
+            self.names.setdefault(origin, leg.origin)
+            self.names.setdefault(destination, leg.destination)
+        for (origin, destination), pair_legs in self.by_pair.items():
+            pair_legs.sort(key=lambda leg: leg.departs)
+            self.pair_times[(origin, destination)] = [leg.departs for leg in pair_legs]
+            self.quickest[(origin, destination)] = min(leg.arrives - leg.departs for leg in pair_legs)
+
+    def airports(self):
+        return sorted(self.names.values())
+
+    def _hops_to(self, target, max_hops):
+        # airport -> fewest legs from it to target, by BFS back from target
+        hops = {target: 0}
+        frontier = [target]
+        for depth in range(1, max_hops + 1):
+            next_frontier = []
+            for airport in frontier:
+                for origin in self.arrivals.get(airport, ()):
+                    if origin not in hops:
+                        hops[origin] = depth
+                        next_frontier.append(origin)
+            frontier = next_frontier
+        return hops
+
+    def _minutes_to(self, target):
+        # airport -> lower bound on the minutes from landing there to landing
+        # at target: every further leg needs a connection and at least the
+        # quickest flight on its route. Dijkstra back from target.
+        best = {target: 0}
+        heap = [(0, target)]
+        while heap:
+            minutes, airport = heapq.heappop(heap)
+            if minutes > best[airport]:
+                continue
+            for origin in self.arrivals.get(airport, ()):
+                total = minutes + MIN_CONNECTION + self.quickest[(origin, airport)]
+                if total < best.get(origin, total + 1):
+                    best[origin] = total
+                    heapq.heappush(heap, (total, origin))
+        return best
+
+    def search(self, origin, destination, depart_after=0, max_stops=1, limit=MAX_RESULTS):
+        # Itineraries as lists of (Leg, departs, arrives), times in minutes
+        # from midnight of the first departure day, shortest total time first
+        # (then fewest legs, then earliest departure)
+        origin, destination = _key(origin), _key(destination)
+        if origin == destination or origin not in self.departures or destination not in self.arrivals:
+            return []
+        hops = self._hops_to(destination, max_stops + 1)
+        if origin not in hops:
+            return []
+        rest = self._minutes_to(destination)
+        # Entries are (key, tie-break, path, connection). key is a lower bound
+        # on (total minutes, legs, first departure) of every itinerary the
+        # entry leads to - exact for a complete one - so itineraries come off
+        # in order. Rather than every departure on a route, a partial
+        # itinerary queues one connection (route, step): the step-th departure
+        # on that route it can make, whose bound only grows with step, and the
+        # next step is queued when that one comes off.
+        heap = []
+        order = itertools.count()
+
+        def connect(path, pair, step):
+            legs = self.by_pair[pair]
+            if path:
+                arrived = path[-1][2]
+                earliest = arrived + MIN_CONNECTION
+                if step >= len(legs):
+                    return
+                first = bisect.bisect_left(self.pair_times[pair], earliest % DAY)
+                leg = legs[(first + step) % len(legs)]
+                # Its first day we can make; these only grow with step
+                departs = leg.departs + -(-(earliest - leg.departs) // DAY) * DAY
+                if departs - arrived > MAX_LAYOVER:
+                    return
+                start = path[0][1]
+            else:
+                first = bisect.bisect_left(self.pair_times[pair], depart_after)
+                if first + step >= len(legs):
+                    return
+                leg = legs[first + step]
+                departs = start = leg.departs
+            key = (departs + self.quickest[pair] - start + rest[pair[1]], len(path) + 1 + hops[pair[1]], start)
+            heapq.heappush(heap, (key, next(order), path, (pair, step, leg, departs)))
+
+        def connections(path, here, visited):
+            legs_left = max_stops + 1 - len(path)
+            for next_airport in self.departures.get(here, ()):
+                if next_airport not in visited and hops.get(next_airport, legs_left + 1) <= legs_left - 1:
+                    connect(path, (here, next_airport), 0)
+
+        connections((), origin, {origin})
+        found = []
+        while heap and len(found) < limit:
+            _, _, path, connection = heapq.heappop(heap)
+            if connection is not None:
+                pair, step, leg, departs = connection
+                connect(path, pair, step + 1)
+                path = path + ((leg, departs, departs + leg.arrives - leg.departs),)
+                here = pair[1]
+                key = (path[-1][2] - path[0][1] + rest[here], len(path) + hops[here], path[0][1])
+                heapq.heappush(heap, (key, next(order), path, None))
+                continue
+            here = _key(path[-1][0].destination)
+            if here == destination:
+                found.append(list(path))
+                continue
+            connections(path, here, {origin}.union(_key(leg.destination) for leg, _, _ in path))
+        return found
+
+# The graph for Schedule.txt as of its last (inode, mtime, size), and
+# search results for that version
+_graph = None
+_graph_lock = threading.Lock()
+_search_cache = OrderedDict()
+_search_cache_lock = threading.Lock()
+
+def _schedule_signature():
+    try:
+        st = os.stat(SCHEDULE_FILE)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def schedule_version():
+    return _schedule_signature()
+
+def get_route_graph():
+    global _graph
+    signature = _schedule_signature()
+    with _graph_lock:
+        if _graph is None or _graph.version != signature:
+            _graph = RouteGraph(load_schedule(), signature)
+            with _search_cache_lock:
+                _search_cache.clear()
+        return _graph
+
+def search(origin, destination, depart_after=0, max_stops=1):
+    # Cached RouteGraph.search for the current schedule
+    graph = get_route_graph()
+    key = (graph.version, _key(origin), _key(destination), depart_after, max_stops)
+    with _search_cache_lock:
+        if key in _search_cache:
+            _search_cache.move_to_end(key)
+            return _search_cache[key]
+    results = graph.search(origin, destination, depart_after, max_stops)
+    with _search_cache_lock:
+        _search_cache[key] = results
+        if len(_search_cache) > SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+    return results
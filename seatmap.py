@@ -0,0 +1,159 @@
+import re
+
+# Compact per-flight seat availability. Seats are laid out row by row
+# ("1A", "1B", ... "2A", ...) and each one is a bit in a Python int, so
+# membership, claim and release are single bit operations and iteration comes
+# out in natural seat order ("1C" before "10D"). It behaves enough like the
+# list of seat strings it replaces (in, len, iteration, remove, append, sort)
+# that code written against the old lists keeps working.
+# A seat name is exactly its canonical spelling - "1A", never "01A", "1A\n" or
+# one with non-ASCII digits - so a seat matches the inventory only as stored.
+# Use SEAT_PATTERN.fullmatch().
+SEAT_PATTERN = re.compile(r"([1-9][0-9]*)([A-Z])")
+DEFAULT_LETTERS = "ABCD"
+
+class SeatMap:
+    __slots__ = ("letters", "bits", "count", "extra")
+
+    def __init__(self, seats=(), letters=DEFAULT_LETTERS):
+        self.letters = letters
+        self.bits = 0
+        self.count = 0
+        # Seats that don't fit the row/letter layout are kept as a plain list
+        self.extra = []
+        for seat in seats:
+            self.add(seat)
+
+    def _index(self, seat):
+        # None for anything that isn't a row/letter seat - including whatever
+        # a client sent that isn't a string at all
+        if seat.__class__ is not str:
+            return None
+        match = SEAT_PATTERN.fullmatch(seat)
+        if not match:
+            return None
+        col = self.letters.find(match.group(2))
+        if col < 0:
+            return -1
+        return (int(match.group(1)) - 1) * len(self.letters) + col
+
+    def _seat(self, index):
+        row, col = divmod(index, len(self.letters))
+        return f"{row + 1}{self.letters[col]}"
+
+    def _widen(self, letter):
+        # A seat letter we haven't seen yet - re-lay the bits out with it included
+        seats = list(self._iter_bits())
+        self.letters = "".join(sorted(self.letters + letter))
+        self.bits = 0
+        for seat in seats:
+            self.bits |= 1 << self._index(seat)
+
+    def _iter_bits(self):
+        bits = self.bits
+        while bits:
+            low = bits & -bits
+            yield self._seat(low.bit_length() - 1)
+            bits ^= low
+
+    def add(self, seat):
+        # Release a seat. Returns False if it was already available.
+        index = self._index(seat)
+        if index == -1:
+            self._widen(SEAT_PATTERN.fullmatch(seat).group(2))
+            index = self._index(seat)
+        if index is None:
+            if seat in self.extra:
+                return False
+            self.extra.append(seat)
+            self.extra.sort()
+            return True
+        bit = 1 << index
+        if self.bits & bit:
+            return False
+        self.bits |= bit
+        self.count += 1
+        return True
+
+    def discard(self, seat):
+        # Claim a seat. Returns False if it wasn't available.
+        index = self._index(seat)
+        if index is None:
+            if seat not in self.extra:
+                return False
+            self.extra.remove(seat)
+            return True
+        if index < 0:
+            return False
+        bit = 1 << index
+        if not self.bits & bit:
+            return False
+        self.bits &= ~bit
+        self.count -= 1
+        return True
+
+    claim = discard
+    release = add
+
+    def remove(self, seat):
+        if not self.discard(seat):
+            raise ValueError(f"{seat} is not available")
+
+    def append(self, seat):
+        self.add(seat)
+
+    def sort(self):
+        # Always kept in natural order
+        pass
+
+    def copy(self):
+        other = SeatMap(letters=self.letters)
+        other.bits = self.bits
+        other.count = self.count
+        other.extra = list(self.extra)
+        return other
+
+    @classmethod
+    def from_bits(cls, bits, letters=DEFAULT_LETTERS, count=None):
+        # A seat map over an existing bitmap, e.g. one read from an inventory snapshot
+        seats = cls(letters=letters)
+        seats.bits = bits
+        seats.count = bin(bits).count("1") if count is None else count
+        return seats
+
+    def seat_index(self, seat):
+        # Bit position of a seat in self.bits, or None if it has none
+        index = self._index(seat)
+        return index if index is not None and index >= 0 else None
+
+    def __contains__(self, seat):
+        index = self._index(seat)
+        if index is None:
+            return seat in self.extra
+        return index >= 0 and bool(self.bits >> index & 1)
+
+    def __iter__(self):
+        yield from self._iter_bits()
+        yield from self.extra
+
+    def __len__(self):
+        return self.count + len(self.extra)
+
+    def __bool__(self):
+        return bool(self.bits or self.extra)
+
+    def __eq__(self, other):
+        if isinstance(other, SeatMap):
+            return list(self) == list(other)
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"SeatMap([{', '.join(self)}])"
+
+def json_default(obj):
+    # json.dumps hook so flights dicts holding SeatMaps serialize as seat lists
+    if isinstance(obj, SeatMap):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,119 @@
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+from werkzeug.serving import make_server
+
+import consistency
+import dated_inventory
+import web_interface
+
+# Production launcher: a prefork server. The master binds the listening
+# socket, writes templates/index.html once and forks --workers processes that
+# all accept on that socket, each serving requests on its own threads. The
+# master only restarts workers that die and forwards SIGTERM/SIGINT.
+#
+# Workers share nothing in memory. Seat claims are serialized across them by
+# the storage backend - the flock on Flights.txt.lock (text), the journal
+# lock (journal) or SQLite's write lock (sqlite) - and every per-process cache
+# revalidates against the files or database version, so a change made by one
+# worker is seen by the others on their next request.
+
+def serve_worker(sock, threads):
+    # SIGTERM unwinds normally so atexit handlers (journal fsync) run
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    signal.signal(signal.SIGINT, lambda signum, frame: sys.exit(0))
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, web_interface.app, threaded=threads, fd=sock.fileno())
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+def spawn(sock, threads):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            serve_worker(sock, threads)
+        finally:
+            os._exit(0)
+    return pid
+
+def run(host, port, workers, threads=True):
+    web_interface.write_template()
+    # Days that have passed move to the archive before anything serves them
+    archived = dated_inventory.archive()
+    if archived:
+        print(f"Archived inventory for {len(archived)} past day(s)")
+    # Seats and bookings left disagreeing by a crash are reported (or repaired)
+    # before workers can sell them again
+    if consistency.STARTUP_CHECK != "off":
+        report = consistency.run(fix=consistency.STARTUP_CHECK == "repair")
+        if report is not None and not report.ok:
+            print(f"{'Repaired' if report.repaired else 'Inconsistent data'}: {report.summary()}", file=sys.stderr)
+            for line in report.describe():
+                print(f"  {line}", file=sys.stderr)
+            if not report.repaired:
+                print("Run python consistency.py --repair to fix it", file=sys.stderr)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+
+    children = {spawn(sock, threads) for _ in range(workers)}
+    print(f"Serving on http://{host}:{port} with {workers} workers (pids {', '.join(map(str, sorted(children)))})")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            # Keep the worker count up; pause briefly so a crash loop can't spin
+            print(f"Worker {pid} exited with status {status}, restarting", file=sys.stderr)
+            time.sleep(0.5)
+            children.add(spawn(sock, threads))
+    sock.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the booking web app with several worker processes")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=5000, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--build", action="store_true", help="only write templates/index.html and exit")
+    args = parser.parse_args()
+
+    if args.build:
+        web_interface.write_template()
+        return
+    if consistency.STARTUP_CHECK not in consistency.STARTUP_CHECK_MODES:
+        sys.exit(f"Unknown FLIGHT_STARTUP_CHECK: {consistency.STARTUP_CHECK} "
+                 f"(use {', '.join(consistency.STARTUP_CHECK_MODES)})")
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py needs os.fork; on this platform run the ASGI app (asgi_app.py) instead")
+    run(args.host, args.port, args.workers)
+
+if __name__ == "__main__":
+    main()
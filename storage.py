@@ -0,0 +1,787 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import ExitStack, nullcontext
+
+import dated_inventory
+import flight_manager
+import inventory_snapshot
+from locks import flight_lock, flight_locks, file_lock
+from journal import get_journal
+from seatmap import SeatMap, json_default
+
+# Which backend holds flights and bookings: "text" rewrites Flights.txt and
+# BookedFlights.txt on every change, "journal" appends each change to the
+# booking journal and folds it in periodically, "sqlite" keeps everything in
+# an indexed SQLite database (import the text files first with migrate.py).
+STORAGE_MODE = os.environ.get("FLIGHT_STORAGE_MODE", "text")
+SQLITE_DB = os.environ.get("FLIGHT_SQLITE_DB", "flights.db")
+
+class StorageBackend:
+    # Every backend exposes the same operations. Bookings are dicts (or
+    # flight_manager.BookingRecords) with the BookingRecord fields, kept in
+    # booking order and addressed by their stable booking_id.
+    name = None
+    # Whether dated flight keys ("AA234@2026-10-18", see dated_inventory.py)
+    # can be booked
+    dated = False
+
+    def load_flights(self):
+        # Fresh copy of the inventory, safe to modify
+        raise NotImplementedError
+
+    def flights_json(self):
+        raise NotImplementedError
+
+    def flights_version(self):
+        # Changes whenever the inventory does; used for HTTP ETags
+        raise NotImplementedError
+
+    def availability(self):
+        # Seats left per flight, without building seat lists
+        return {flight_number: {"destination": info["destination"], "seatsLeft": len(info["seats"])}
+                for flight_number, info in self.load_flights().items()}
+
+    def seat_available(self, flight_number, seat):
+        flight = self.load_flights().get(flight_number)
+        return flight is not None and seat in flight["seats"]
+
+    def load_bookings(self):
+        raise NotImplementedError
+
+    def get_booking(self, booking_id):
+        raise NotImplementedError
+
+    def bookings_version(self):
+        # Changes whenever the stored bookings do; used to invalidate read indexes
+        raise NotImplementedError
+
+    def iter_bookings(self, malformed=None):
+        # BookingRecords one at a time, for callers that only need a single
+        # pass. malformed collects unreadable stored lines, where the backend has any.
+        for booking in self.load_bookings():
+            yield flight_manager.BookingRecord(**booking)
+
+    def book_seat(self, flight_number, seat, services=None, total_cost=0.0, booking_id=None, check=None):
+        # Returns (destination, None) or (None, error). check() -> error or
+        # None runs under the claim's lock once the seat is known to be free;
+        # an error leaves the seat on sale (reservations checks holds with it).
+        raise NotImplementedError
+
+    def book_seats(self, bookings, check=None):
+        # Book several seats all-or-nothing. bookings are dicts with
+        # flight_number, seat, services, total_cost and booking_id.
+        # Returns ([destination, ...], None) or (None, error).
+        raise NotImplementedError
+
+    def hold_seat(self, flight_number, seat, hold):
+        # Run hold() -> error or None under the lock a claim of this seat
+        # takes, if the seat is on sale, so a hold and a booking of the same
+        # seat can't both get past their checks. Returns an error or None.
+        raise NotImplementedError
+
+    def cancel_booking(self, booking_id):
+        # Returns None or an error message
+        raise NotImplementedError
+
+    def update_booking_services(self, booking_id, services, total_cost):
+        raise NotImplementedError
+
+    def import_data(self, flights, bookings):
+        # Replace all stored data, used by migrate.py
+        raise NotImplementedError
+
+    def import_flights(self, flights):
+        # Replace the inventory, keeping the bookings (bulk.py)
+        self.import_data(flights, self.load_bookings())
+
+    def import_bookings(self, bookings, claimed):
+        # Add already validated bookings in bulk (bulk.py), taking the
+        # (flight_number, seat) pairs in claimed off sale. Returns None or an
+        # error if a seat was booked since the bookings were checked.
+        flights = self.load_flights()
+        stored = self.load_bookings()
+        booked = {(b["flight_number"], b["seat"]) for b in stored}
+        for flight_number, seat in claimed:
+            if flight_number in flights and not flights[flight_number]["seats"].discard(seat):
+                return f"Seat {seat} on {flight_number} is no longer on sale"
+        for b in bookings:
+            if (b["flight_number"], b["seat"]) in booked:
+                return f"Seat {b['seat']} on {b['flight_number']} is already booked"
+        self.import_data(flights, stored + [dict(b) for b in bookings])
+        return None
+
+    def compact(self):
+        pass
+
+class TextBackend(StorageBackend):
+    name = "text"
+    # Dated seats are claimed from their day's partition instead of
+    # Flights.txt; the bookings themselves go to BookedFlights.txt as usual
+    dated = True
+
+    def __init__(self):
+        # Bumped on every write from this process, in case the file's mtime doesn't move
+        self._writes = 0
+        # booking_id -> BookingRecord, in file order, for BookedFlights.txt as
+        # of _index_signature. Writes from this process keep it current; a
+        # change by anyone else makes the next lookup reparse the file.
+        self._index = None
+        self._index_signature = None
+        self._index_lock = threading.RLock()
+
+    def load_flights(self):
+        return flight_manager.load_flights()
+
+    def flights_json(self):
+        return flight_manager.get_flights_json()
+
+    def flights_version(self):
+        return flight_manager.flights_version()
+
+    def availability(self):
+        # Straight from the mapped snapshot when there is a current one
+        snapshot = inventory_snapshot.current()
+        if snapshot is not None:
+            return snapshot.availability()
+        return {flight_number: {"destination": info["destination"], "seatsLeft": len(info["seats"])}
+                for flight_number, info in flight_manager.get_cached_flights().items()}
+
+    def seat_available(self, flight_number, seat):
+        if dated_inventory.is_dated(flight_number):
+            return dated_inventory.seat_available(flight_number, seat)
+        snapshot = inventory_snapshot.current()
+        if snapshot is not None:
+            return snapshot.seat_available(flight_number, seat)
+        flight = flight_manager.get_cached_flights().get(flight_number)
+        return flight is not None and seat in flight["seats"]
+
+    def iter_bookings(self, malformed=None):
+        # Straight from the file, without building the ID index
+        return flight_manager.iter_bookings(malformed=malformed)
+
+    def _signature(self):
+        try:
+            st = os.stat(flight_manager.BOOKED_FILE)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _booking_map(self):
+        signature = self._signature()
+        with self._index_lock:
+            if self._index is None or signature != self._index_signature:
+                self._index = {record.booking_id: record for record in flight_manager.iter_bookings()}
+                self._index_signature = signature
+            return self._index
+
+    def _wrote(self):
+        # Caller holds the bookings file lock and has already patched the index
+        self._writes += 1
+        self._index_signature = self._signature()
+
+    def load_bookings(self):
+        with self._index_lock:
+            return [record.to_dict() for record in self._booking_map().values()]
+
+    def get_booking(self, booking_id):
+        record = self._booking_map().get(booking_id)
+        return record.to_dict() if record else None
+
+    def bookings_version(self):
+        return (self._writes, self._signature())
+
+    def claim_seat(self, flight_number, seat, check=None):
+        if dated_inventory.is_dated(flight_number):
+            destinations, error = dated_inventory.claim_seats([(flight_number, seat)], check=check)
+            return (None, error) if error else (destinations[flight_number], None)
+        with flight_lock(flight_number):
+            # Cheap rejection from the cached inventory before touching the file
+            cached = flight_manager.get_cached_flights()
+            if flight_number not in cached or seat not in cached[flight_number]["seats"]:
+                return None, "Invalid flight or seat"
+
+            with file_lock(flight_manager.FLIGHTS_FILE):
+                flights = flight_manager.load_flights()
+                if flight_number not in flights or seat not in flights[flight_number]["seats"]:
+                    return None, "Invalid flight or seat"
+                error = check() if check is not None else None
+                if error:
+                    return None, error
+                flights[flight_number]["seats"].remove(seat)
+                flight_manager.save_flights(flights)
+                return flights[flight_number]["destination"], None
+
+    def claim_seats(self, seats, lock_flights=True, check=None):
+        # Claim every (flight_number, seat) pair with one load and one save of
+        # Flights.txt (and of each day's partition), or none of them.
+        # Returns ({flight: destination}, None) or (None, error).
+        # lock_flights=False when the caller holds the data file locks, which
+        # already shut out other claims and come after the flight locks.
+        # check() runs once, under the last of the claim's locks.
+        dated = [(flight_number, seat) for flight_number, seat in seats if dated_inventory.is_dated(flight_number)]
+        if not dated:
+            return self._claim_undated(seats, lock_flights, check)
+        undated = [(flight_number, seat) for flight_number, seat in seats
+                   if not dated_inventory.is_dated(flight_number)]
+        destinations, error = dated_inventory.claim_seats(dated, lock_flights, None if undated else check)
+        if error:
+            return None, error
+        if undated:
+            more, error = self._claim_undated(undated, lock_flights, check)
+            if error:
+                dated_inventory.release_seats(dated, lock_flights)
+                return None, error
+            destinations.update(more)
+        return destinations, None
+
+    def _claim_undated(self, seats, lock_flights=True, check=None):
+        flight_numbers = {flight_number for flight_number, _ in seats}
+        with flight_locks(flight_numbers) if lock_flights else nullcontext(), \
+                file_lock(flight_manager.FLIGHTS_FILE):
+            flights = flight_manager.load_flights()
+            for flight_number, seat in seats:
+                # Claiming the loaded copy also rejects a seat listed twice
+                if flight_number not in flights or not flights[flight_number]["seats"].discard(seat):
+                    return None, f"Invalid flight or seat: {flight_number} {seat}"
+            error = check() if check is not None else None
+            if error:
+                return None, error
+            flight_manager.save_flights(flights)
+            return {flight_number: flights[flight_number]["destination"] for flight_number in flight_numbers}, None
+
+    def release_seats(self, seats, lock_flights=True):
+        dated = [(flight_number, seat) for flight_number, seat in seats if dated_inventory.is_dated(flight_number)]
+        if dated:
+            dated_inventory.release_seats(dated, lock_flights)
+            seats = [(flight_number, seat) for flight_number, seat in seats
+                     if not dated_inventory.is_dated(flight_number)]
+            if not seats:
+                return
+        flight_numbers = {flight_number for flight_number, _ in seats}
+        with flight_locks(flight_numbers) if lock_flights else nullcontext(), \
+                file_lock(flight_manager.FLIGHTS_FILE):
+            flights = flight_manager.load_flights()
+            for flight_number, seat in seats:
+                if flight_number in flights:
+                    flights[flight_number]["seats"].add(seat)
+            flight_manager.save_flights(flights)
+
+    def release_seat(self, flight_number, seat, lock_flight=True):
+        # Put a seat back on sale. Returns False if the flight (or its day's
+        # partition) no longer exists. lock_flight=False when the caller
+        # already holds the flight's lock.
+        if dated_inventory.is_dated(flight_number):
+            return dated_inventory.release_seats([(flight_number, seat)], lock_flight)
+        with flight_lock(flight_number) if lock_flight else nullcontext():
+            with file_lock(flight_manager.FLIGHTS_FILE):
+                flights = flight_manager.load_flights()
+                if flight_number not in flights:
+                    return False
+                if flights[flight_number]["seats"].add(seat):
+                    flight_manager.save_flights(flights)
+                return True
+
+    def hold_seat(self, flight_number, seat, hold):
+        if dated_inventory.is_dated(flight_number):
+            return dated_inventory.hold_seat(flight_number, seat, hold)
+        with flight_lock(flight_number), file_lock(flight_manager.FLIGHTS_FILE):
+            flight = flight_manager.load_flights().get(flight_number)
+            if flight is None or seat not in flight["seats"]:
+                return "Invalid flight or seat"
+            return hold()
+
+    def book_seat(self, flight_number, seat, services=None, total_cost=0.0, booking_id=None, check=None):
+        destination, error = self.claim_seat(flight_number, seat, check)
+        if error:
+            return None, error
+        with file_lock(flight_manager.BOOKED_FILE), self._index_lock:
+            index = self._booking_map()
+            saved = flight_manager.save_booking_with_services(flight_number, destination, seat, services,
+                                                              total_cost, booking_id)
+            if saved:
+                index[booking_id] = flight_manager.BookingRecord(booking_id, flight_number, destination, seat,
+                                                                 services, total_cost)
+                self._wrote()
+        if not saved:
+            # Restore seat if booking failed
+            self.release_seat(flight_number, seat)
+            return None, "Booking failed"
+        return destination, None
+
+    def book_seats(self, bookings, check=None):
+        seats = [(b["flight_number"], b["seat"]) for b in bookings]
+        destinations, error = self.claim_seats(seats, check=check)
+        if error:
+            return None, error
+        records = [dict(b, destination=destinations[b["flight_number"]]) for b in bookings]
+        with file_lock(flight_manager.BOOKED_FILE), self._index_lock:
+            index = self._booking_map()
+            saved = flight_manager.save_bookings_with_services(records)
+            if saved:
+                for record in records:
+                    index[record["booking_id"]] = flight_manager.BookingRecord(**record)
+                self._wrote()
+        if not saved:
+            self.release_seats(seats)
+            return None, "Booking failed"
+        return [record["destination"] for record in records], None
+
+    def cancel_booking(self, booking_id):
+        booking = self._booking_map().get(booking_id)
+        if booking is None:
+            return "Invalid booking"
+        flight_number = booking.flight_number
+        # Locks in the order in locks.py - the flight, Flights.txt (a dated
+        # seat goes back to its day's file instead), then BookedFlights.txt
+        with ExitStack() as stack:
+            stack.enter_context(flight_lock(flight_number))
+            if not dated_inventory.is_dated(flight_number):
+                stack.enter_context(file_lock(flight_manager.FLIGHTS_FILE))
+            stack.enter_context(file_lock(flight_manager.BOOKED_FILE))
+            with self._index_lock:
+                index = self._booking_map()
+                if booking_id not in index:
+                    return "Invalid booking"
+
+                # Remove booking by rewriting the file without this booking
+                if not flight_manager.rewrite_booking(booking_id):
+                    self._index = None
+                    return "Invalid booking"
+                booking = index.pop(booking_id)
+                self._wrote()
+
+            # Add seat back to available seats
+            self.release_seat(booking["flight_number"], booking["seat"], lock_flight=False)
+        return None
+
+    def update_booking_services(self, booking_id, services, total_cost):
+        with file_lock(flight_manager.BOOKED_FILE), self._index_lock:
+            index = self._booking_map()
+            if booking_id not in index:
+                return "Invalid booking"
+            booking = index[booking_id]
+            if not flight_manager.update_booking_with_services(booking_id, booking.flight_number,
+                                                               booking.destination, booking.seat, services,
+                                                               total_cost):
+                self._index = None
+                return "Booking update failed"
+            booking.services = services
+            booking.total_cost = total_cost
+            self._wrote()
+        return None
+
+    def import_data(self, flights, bookings):
+        with file_lock(flight_manager.FLIGHTS_FILE), file_lock(flight_manager.BOOKED_FILE), self._index_lock:
+            flight_manager.save_flights(flights)
+            with open(flight_manager.BOOKED_FILE, "w") as f:
+                for b in bookings:
+                    f.write(flight_manager.format_booking_line(b["flight_number"], b["destination"], b["seat"],
+                                                               b["services"], b["total_cost"], b["booking_id"]))
+            self._index = None
+            self._wrote()
+
+    def import_flights(self, flights):
+        with file_lock(flight_manager.FLIGHTS_FILE):
+            flight_manager.save_flights(flights)
+
+    def import_bookings(self, bookings, claimed):
+        # One save of the inventory and one append, however many bookings.
+        # The data file locks shut out every other claim, so the flight locks
+        # aren't taken: taking them after the file locks would invert the
+        # order in locks.py (and bulk.py already holds the file locks).
+        with file_lock(flight_manager.FLIGHTS_FILE), file_lock(flight_manager.BOOKED_FILE):
+            if claimed:
+                _, error = self.claim_seats(claimed, lock_flights=False)
+                if error:
+                    return error
+            with self._index_lock:
+                saved = flight_manager.save_bookings_with_services(bookings)
+                if saved:
+                    self._index = None
+                    self._wrote()
+            if not saved:
+                self.release_seats(claimed, lock_flights=False)
+                return "Saving bookings failed"
+        return None
+
+class JournalBackend(StorageBackend):
+    name = "journal"
+
+    def __init__(self):
+        self.journal = get_journal()
+
+    def load_flights(self):
+        return self.journal.flights_copy()
+
+    def flights_json(self):
+        return self.journal.flights_json()
+
+    def flights_version(self):
+        self.journal.refresh()
+        return self.journal.version
+
+    def availability(self):
+        return self.journal.availability()
+
+    def seat_available(self, flight_number, seat):
+        return self.journal.seat_available(flight_number, seat)
+
+    def load_bookings(self):
+        return self.journal.bookings_copy()
+
+    def get_booking(self, booking_id):
+        return self.journal.get_booking(booking_id)
+
+    def bookings_version(self):
+        self.journal.refresh()
+        return self.journal.version
+
+    def hold_seat(self, flight_number, seat, hold):
+        with flight_lock(flight_number):
+            return self.journal.while_on_sale(flight_number, seat, hold)
+
+    def book_seat(self, flight_number, seat, services=None, total_cost=0.0, booking_id=None, check=None):
+        with flight_lock(flight_number):
+            return self.journal.claim(flight_number, seat, services, total_cost, booking_id, check)
+
+    def book_seats(self, bookings, check=None):
+        with flight_locks(b["flight_number"] for b in bookings):
+            return self.journal.claim_many(bookings, check)
+
+    def cancel_booking(self, booking_id):
+        booking = self.journal.get_booking(booking_id)
+        if booking is None:
+            return "Invalid booking"
+        with flight_lock(booking["flight_number"]):
+            return self.journal.cancel(booking_id)
+
+    def update_booking_services(self, booking_id, services, total_cost):
+        return self.journal.update_services(booking_id, services, total_cost)
+
+    def import_data(self, flights, bookings):
+        TextBackend().import_data(flights, bookings)
+        self.journal.reset()
+
+    def compact(self):
+        self.journal.compact()
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS flights (
+    flight_number TEXT PRIMARY KEY,
+    destination TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS available_seats (
+    id INTEGER PRIMARY KEY,
+    flight_number TEXT NOT NULL,
+    seat TEXT NOT NULL,
+    UNIQUE (flight_number, seat)
+);
+CREATE TABLE IF NOT EXISTS bookings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    flight_number TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    seat TEXT NOT NULL,
+    food TEXT,
+    drinks TEXT,
+    comfort TEXT,
+    total_cost REAL NOT NULL DEFAULT 0,
+    booking_id TEXT
+);
+CREATE INDEX IF NOT EXISTS bookings_flight_seat ON bookings (flight_number, seat);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+class _Rollback(Exception):
+    # Raised inside a _write transaction to undo it and report an error
+    pass
+
+BOOKING_COLUMNS = "booking_id, flight_number, destination, seat, food, drinks, comfort, total_cost"
+
+class SQLiteBackend(StorageBackend):
+    name = "sqlite"
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or SQLITE_DB
+        self._local = threading.local()
+        self._json_lock = threading.Lock()
+        self._json = None
+        self._json_version = None
+        conn = self._connect()
+        conn.executescript(SQLITE_SCHEMA)
+        self._upgrade_schema(conn)
+
+    def _upgrade_schema(self, conn):
+        # Databases created before booking IDs existed get legacy IDs filled
+        # in and a unique index on them, all in one transaction, so an upgrade
+        # that fails leaves the database as it was. A row whose ID is already
+        # taken - a legacy seat booked twice, say - gets a numeric suffix, the
+        # same as when BookedFlights.txt is read, and is reported.
+        def upgraded(conn):
+            return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' "
+                                "AND name = 'bookings_booking_id'").fetchone() is not None
+
+        def work(conn):
+            # Another worker may have upgraded it while we waited for the lock
+            if upgraded(conn):
+                return
+            if "booking_id" not in [row[1] for row in conn.execute("PRAGMA table_info(bookings)")]:
+                conn.execute("ALTER TABLE bookings ADD COLUMN booking_id TEXT")
+            seen_ids = set()
+            renamed = 0
+            # Rows that have an ID keep it where they can
+            rows = conn.execute("SELECT id, booking_id, flight_number, seat FROM bookings "
+                                "ORDER BY booking_id IS NULL, id").fetchall()
+            for row_id, booking_id, flight_number, seat in rows:
+                booking = {"booking_id": booking_id or flight_manager.legacy_booking_id(flight_number, seat)}
+                flight_manager.unique_booking_id(booking, seen_ids)
+                if booking["booking_id"] == booking_id:
+                    continue
+                if booking["booking_id"] != flight_manager.legacy_booking_id(flight_number, seat):
+                    renamed += 1
+                conn.execute("UPDATE bookings SET booking_id = ? WHERE id = ?", (booking["booking_id"], row_id))
+            if renamed:
+                print(f"Warning: {renamed} booking(s) shared an ID and were given a numeric suffix",
+                      file=sys.stderr)
+            conn.execute("CREATE UNIQUE INDEX bookings_booking_id ON bookings (booking_id)")
+
+        if not upgraded(conn):
+            self._write(work)
+
+    def _connect(self):
+        # One connection per thread; transactions are managed explicitly
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, work):
+        # Run work(conn) in an IMMEDIATE transaction and bump the data version
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn)
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def _version(self):
+        return self._connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def load_flights(self):
+        conn = self._connect()
+        flights = {}
+        for flight_number, destination in conn.execute(
+                "SELECT flight_number, destination FROM flights ORDER BY position"):
+            flights[flight_number] = {"destination": destination, "seats": SeatMap()}
+        for flight_number, seat in conn.execute("SELECT flight_number, seat FROM available_seats ORDER BY id"):
+            if flight_number in flights:
+                flights[flight_number]["seats"].add(seat)
+        return flights
+
+    def flights_json(self):
+        version = self._version()
+        with self._json_lock:
+            if self._json_version != version:
+                self._json = json.dumps(self.load_flights(), sort_keys=True, default=json_default)
+                self._json_version = version
+            return self._json
+
+    def availability(self):
+        rows = self._connect().execute(
+            "SELECT f.flight_number, f.destination, COUNT(s.seat) FROM flights f "
+            "LEFT JOIN available_seats s ON s.flight_number = f.flight_number "
+            "GROUP BY f.flight_number ORDER BY f.position")
+        return {flight_number: {"destination": destination, "seatsLeft": seats_left}
+                for flight_number, destination, seats_left in rows}
+
+    def seat_available(self, flight_number, seat):
+        return self._connect().execute("SELECT 1 FROM available_seats WHERE flight_number = ? AND seat = ?",
+                                       (flight_number, seat)).fetchone() is not None
+
+    def _booking_from_row(self, row):
+        booking_id, flight_number, destination, seat, food, drinks, comfort, total_cost = row
+        services = None
+        if food:
+            services = {"food": food, "drinks": drinks, "comfort": comfort}
+        return {
+            "booking_id": booking_id,
+            "flight_number": flight_number,
+            "destination": destination,
+            "seat": seat,
+            "services": services,
+            "total_cost": total_cost
+        }
+
+    def load_bookings(self):
+        rows = self._connect().execute(f"SELECT {BOOKING_COLUMNS} FROM bookings ORDER BY id")
+        return [self._booking_from_row(row) for row in rows]
+
+    def iter_bookings(self, malformed=None):
+        # Rows are fetched from the cursor as we go
+        for row in self._connect().execute(f"SELECT {BOOKING_COLUMNS} FROM bookings ORDER BY id"):
+            yield flight_manager.BookingRecord(**self._booking_from_row(row))
+
+    def get_booking(self, booking_id):
+        row = self._connect().execute(f"SELECT {BOOKING_COLUMNS} FROM bookings WHERE booking_id = ?",
+                                      (booking_id,)).fetchone()
+        return self._booking_from_row(row) if row else None
+
+    def bookings_version(self):
+        return self._version()
+
+    def flights_version(self):
+        return self._version()
+
+    def _insert_booking(self, conn, booking_id, flight_number, destination, seat, services, total_cost):
+        services = services or {}
+        conn.execute(
+            "INSERT INTO bookings (booking_id, flight_number, destination, seat, food, drinks, comfort, total_cost) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (booking_id, flight_number, destination, seat, services.get("food"), services.get("drinks"),
+             services.get("comfort"), total_cost))
+
+    def hold_seat(self, flight_number, seat, hold):
+        # The IMMEDIATE transaction shuts out claims until the hold is taken
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            on_sale = conn.execute("SELECT 1 FROM available_seats WHERE flight_number = ? AND seat = ?",
+                                   (flight_number, seat)).fetchone()
+            return hold() if on_sale else "Invalid flight or seat"
+        finally:
+            conn.execute("COMMIT")
+
+    def book_seat(self, flight_number, seat, services=None, total_cost=0.0, booking_id=None, check=None):
+        def work(conn):
+            # Deleting the availability row is the claim - only one transaction can win it
+            claimed = conn.execute("DELETE FROM available_seats WHERE flight_number = ? AND seat = ?",
+                                   (flight_number, seat)).rowcount
+            if not claimed:
+                raise _Rollback("Invalid flight or seat")
+            error = check() if check is not None else None
+            if error:
+                raise _Rollback(error)
+            destination = conn.execute("SELECT destination FROM flights WHERE flight_number = ?",
+                                       (flight_number,)).fetchone()[0]
+            self._insert_booking(conn, booking_id, flight_number, destination, seat, services, total_cost)
+            return destination
+
+        try:
+            return self._write(work), None
+        except _Rollback as e:
+            return None, str(e)
+
+    def book_seats(self, bookings, check=None):
+        def work(conn):
+            destinations = []
+            for b in bookings:
+                claimed = conn.execute("DELETE FROM available_seats WHERE flight_number = ? AND seat = ?",
+                                       (b["flight_number"], b["seat"])).rowcount
+                if not claimed:
+                    raise _Rollback(f"Invalid flight or seat: {b['flight_number']} {b['seat']}")
+                destination = conn.execute("SELECT destination FROM flights WHERE flight_number = ?",
+                                           (b["flight_number"],)).fetchone()[0]
+                self._insert_booking(conn, b["booking_id"], b["flight_number"], destination, b["seat"],
+                                     b["services"], b["total_cost"])
+                destinations.append(destination)
+            error = check() if check is not None else None
+            if error:
+                raise _Rollback(error)
+            return destinations
+
+        try:
+            return self._write(work), None
+        except _Rollback as e:
+            return None, str(e)
+
+    def cancel_booking(self, booking_id):
+        def work(conn):
+            row = conn.execute("SELECT flight_number, seat FROM bookings WHERE booking_id = ?",
+                               (booking_id,)).fetchone()
+            if row is None:
+                return "Invalid booking"
+            flight_number, seat = row
+            conn.execute("DELETE FROM bookings WHERE booking_id = ?", (booking_id,))
+            # Only flights we still sell get the seat back
+            conn.execute("INSERT OR IGNORE INTO available_seats (flight_number, seat) "
+                         "SELECT flight_number, ? FROM flights WHERE flight_number = ?", (seat, flight_number))
+            return None
+
+        return self._write(work)
+
+    def update_booking_services(self, booking_id, services, total_cost):
+        def work(conn):
+            updated = conn.execute(
+                "UPDATE bookings SET food = ?, drinks = ?, comfort = ?, total_cost = ? WHERE booking_id = ?",
+                (services["food"], services["drinks"], services["comfort"], total_cost, booking_id)).rowcount
+            return None if updated else "Invalid booking"
+
+        return self._write(work)
+
+    def import_bookings(self, bookings, claimed):
+        def work(conn):
+            # The app may have booked some of these seats since bulk.py checked them
+            for flight_number, seat in claimed:
+                if not conn.execute("DELETE FROM available_seats WHERE flight_number = ? AND seat = ?",
+                                    (flight_number, seat)).rowcount:
+                    raise _Rollback(f"Seat {seat} on {flight_number} is no longer on sale")
+            for b in bookings:
+                if conn.execute("SELECT 1 FROM bookings WHERE flight_number = ? AND seat = ?",
+                                (b["flight_number"], b["seat"])).fetchone():
+                    raise _Rollback(f"Seat {b['seat']} on {b['flight_number']} is already booked")
+                self._insert_booking(conn, b["booking_id"], b["flight_number"], b["destination"], b["seat"],
+                                     b["services"], b["total_cost"])
+
+        try:
+            self._write(work)
+        except _Rollback as e:
+            return str(e)
+        return None
+
+    def import_data(self, flights, bookings):
+        def work(conn):
+            conn.execute("DELETE FROM flights")
+            conn.execute("DELETE FROM available_seats")
+            conn.execute("DELETE FROM bookings")
+            for position, (flight_number, info) in enumerate(flights.items()):
+                conn.execute("INSERT INTO flights (flight_number, destination, position) VALUES (?, ?, ?)",
+                             (flight_number, info["destination"], position))
+                conn.executemany("INSERT OR IGNORE INTO available_seats (flight_number, seat) VALUES (?, ?)",
+                                 [(flight_number, seat) for seat in info["seats"]])
+            for b in bookings:
+                self._insert_booking(conn, b["booking_id"], b["flight_number"], b["destination"], b["seat"],
+                                     b["services"], b["total_cost"])
+
+        self._write(work)
+
+BACKENDS = {
+    "text": TextBackend,
+    "journal": JournalBackend,
+    "sqlite": SQLiteBackend
+}
+
+_backend = None
+_backend_guard = threading.Lock()
+
+def get_backend():
+    global _backend
+    with _backend_guard:
+        if _backend is None:
+            if STORAGE_MODE not in BACKENDS:
+                raise ValueError(f"Unknown storage mode: {STORAGE_MODE}")
+            _backend = BACKENDS[STORAGE_MODE]()
+        return _backend
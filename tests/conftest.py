@@ -0,0 +1,48 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+DATA_FILES = ("Flights.txt", "BookedFlights.txt", "Schedule.txt")
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # A scratch copy of the sample data, as the working directory
+    for name in DATA_FILES:
+        shutil.copy(os.path.join(REPO_DIR, name), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def spawn(data_dir):
+    # Start `python -c code` in the data directory, like another worker process
+    processes = []
+
+    def start(code, **env):
+        process = subprocess.Popen([sys.executable, "-c", code], cwd=data_dir,
+                                   env=dict(os.environ, PYTHONPATH=REPO_DIR, **env),
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        processes.append(process)
+        return process
+
+    yield start
+    for process in processes:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+def finish(process, timeout=30):
+    # (stdout, stderr) of a process that must exit cleanly within timeout
+    try:
+        out, err = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        out, err = process.communicate()
+        pytest.fail(f"process hung (deadlock?)\n{out}\n{err}")
+    assert process.returncode == 0, err
+    return out, err
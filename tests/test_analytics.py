@@ -0,0 +1,17 @@
+from conftest import finish
+
+def test_stats_are_rebuilt_by_streaming_the_bookings(spawn, data_dir):
+    sold = sum(line.startswith("BA982 ") for line in (data_dir / "BookedFlights.txt").read_text().splitlines())
+    out, _ = finish(spawn("""
+import reservations, storage
+
+def load_bookings(self):
+    raise AssertionError("the whole booking list was loaded")
+
+storage.TextBackend.load_bookings = load_bookings
+before = reservations.booking_stats()["flights"]["BA982"]["seatsSold"]
+with open("BookedFlights.txt", "a") as f:
+    f.write("BA982 - London: 3A | ID:external1\\n")
+print(before, reservations.booking_stats()["flights"]["BA982"]["seatsSold"])
+"""))
+    assert out.split() == [str(sold), str(sold + 1)]
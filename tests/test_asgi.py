@@ -0,0 +1,60 @@
+import json
+
+from conftest import finish
+
+# Drives asgi_app.app directly, without a server. Prints one JSON line per
+# request: [status, {header: value}, body].
+CALL = """
+import asyncio, json
+import asgi_app
+
+async def call(method, path, body=None):
+    sent = []
+    request = [{"type": "http.request", "body": json.dumps(body).encode() if body is not None else b""}]
+
+    async def receive():
+        return request.pop() if request else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app.app({"type": "http", "method": method, "path": path, "headers": [],
+                        "query_string": b""}, receive, send)
+    start = sent[0]
+    body = b"".join(message.get("body", b"") for message in sent[1:])
+    print(json.dumps([start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, body.decode()]))
+
+async def main():
+{calls}
+    print(json.dumps(sorted(asgi_app._write_queues.queues)))
+
+asyncio.run(main())
+"""
+
+def run(spawn, *calls):
+    script = CALL.replace("{calls}", "\n".join(f"    await call{call!r}" for call in calls))
+    lines = finish(spawn(script))[0].splitlines()
+    return [json.loads(line) for line in lines[:-1]], json.loads(lines[-1])
+
+def test_book_leaves_no_write_queues_behind(spawn):
+    responses, queues = run(spawn, ("POST", "/api/book", {"flightNumber": "ZZ999", "seat": "1A"}),
+                            ("POST", "/api/book", {"flightNumber": "AA234", "seat": "1C"}))
+    assert json.loads(responses[0][2])["success"] is False
+    assert json.loads(responses[1][2])["success"] is True
+    assert queues == []
+
+def test_head_sends_headers_only(spawn):
+    responses, _ = run(spawn, ("GET", "/api/services"), ("HEAD", "/api/services"))
+    (get_status, get_headers, get_body), (head_status, head_headers, head_body) = responses
+    assert head_status == get_status == 200
+    assert head_headers["content-length"] == get_headers["content-length"] == str(len(get_body))
+    assert get_body and head_body == ""
+
+def test_missing_fields_are_a_bad_request(spawn):
+    responses, queues = run(spawn, ("POST", "/api/book", {"flightNumber": "AA234"}),
+                            ("POST", "/api/book", ["AA234", "1C"]),
+                            ("POST", "/api/update-services", {"services": {}}))
+    assert [status for status, _, _ in responses] == [400, 400, 400]
+    assert [json.loads(body)["error"] for _, _, body in responses] == [
+        "A booking needs a flightNumber and seat", "Invalid JSON data", "A services update needs a bookingId"]
+    assert queues == []
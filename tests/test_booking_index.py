@@ -0,0 +1,109 @@
+import json
+import random
+
+from booking_index import BookingIndex
+from conftest import finish
+
+def booking(n, services=False):
+    return {"booking_id": f"b{n}", "flight_number": f"FL{n % 3}", "destination": ["Paris", "Rome"][n % 2],
+            "seat": f"{n + 1}A", "services": {"food": "F1", "drinks": "D0", "comfort": "C0"} if services else None,
+            "total_cost": 0.0}
+
+def pages(index, **filters):
+    # Every (position, booking_id) reached by following the cursors, 3 at a time
+    seen, cursor = [], None
+    while True:
+        page, cursor = index.page(cursor, 3, **filters)
+        seen += [(position, b["booking_id"]) for position, b in page]
+        if cursor is None:
+            return seen
+
+FILTERS = [{}, {"flight_number": "FL1"}, {"destination": "rome"}, {"has_services": True},
+           {"has_services": False, "flight_number": "FL2"}]
+
+def test_incremental_changes_match_a_rebuild():
+    rng = random.Random(7)
+    bookings = [booking(n, n % 4 == 0) for n in range(40)]
+    index = BookingIndex(list(bookings))
+    for n in range(40, 400):
+        op = rng.random()
+        if op < 0.4 or not bookings:
+            bookings.append(booking(n, rng.random() < 0.5))
+            index.add(bookings[-1])
+        elif op < 0.8:
+            gone = bookings.pop(rng.randrange(len(bookings)))
+            index.remove(gone["booking_id"])
+        else:
+            i = rng.randrange(len(bookings))
+            bookings[i] = dict(bookings[i], services=None if bookings[i]["services"] else booking(0, True)["services"])
+            index.replace(bookings[i])
+        if n % 37 == 0:
+            rebuilt = BookingIndex(list(bookings))
+            assert len(index) == len(rebuilt)
+            for filters in FILTERS:
+                assert pages(index, **filters) == pages(rebuilt, **filters)
+            for position in range(len(bookings)):
+                assert index.booking_at(position) is bookings[position]
+                assert index.position_of(bookings[position]["booking_id"]) == position
+
+def test_cursor_survives_a_cancellation():
+    index = BookingIndex([booking(n) for n in range(6)])
+    page, cursor = index.page(None, 3)
+    index.remove("b1")
+    page, _ = index.page(cursor, 3)
+    assert [(position, b["booking_id"]) for position, b in page] == [(2, "b3"), (3, "b4"), (4, "b5")]
+
+def test_own_writes_update_the_index_in_place(spawn):
+    out, _ = finish(spawn("""
+import reservations
+index = reservations.booking_index()
+size = len(index)
+booking_id, error = reservations.book_seat("AA234", "1C")
+assert error is None, error
+assert reservations.booking_index() is index and len(index) == size + 1
+assert reservations.booking_id_at(size) == booking_id
+assert reservations.update_booking_services(booking_id, {"food": "F1"}) is None
+page, _ = reservations.query_bookings(None, 500, has_services=True)
+assert booking_id in [b["booking_id"] for _, b in page]
+assert reservations.cancel_booking(booking_id) is None
+assert reservations.booking_index() is index and len(index) == size
+# A change from another process still means a rebuild
+with open("BookedFlights.txt", "a") as f:
+    f.write("BA982 - London: 3A | ID:external1\\n")
+print(reservations.booking_index() is index, len(reservations.booking_index()) - size)
+"""))
+    assert out.split() == ["False", "1"]
+
+def test_api_pages_filters_and_projects(spawn, data_dir):
+    out, _ = finish(spawn("""
+import json
+import reservations
+from web_interface import app
+
+for n, seat in enumerate(["3A", "3C", "4B", "6D", "8A"]):
+    services = {"food": "F1"} if n % 2 else None
+    assert reservations.book_seat("BA982", seat, services)[1] is None
+client = app.test_client()
+everything = client.get("/api/bookings").get_json()
+pages, cursor = [], None
+while True:
+    query = {"limit": 2, "flightNumber": "BA982", "fields": "bookingId,seat"}
+    if cursor:
+        query["cursor"] = cursor
+    page = client.get("/api/bookings", query_string=query).get_json()
+    pages.append(page["bookings"])
+    cursor = page["nextCursor"]
+    if cursor is None:
+        break
+with_services = client.get("/api/bookings", query_string={"hasServices": "true", "destination": "london"}).get_json()
+bad = [client.get("/api/bookings", query_string=query).get_json()
+       for query in ({"limit": "x"}, {"fields": "nope"}, {"cursor": "x:y"})]
+print(json.dumps([everything, pages, with_services, bad]))
+"""))
+    everything, pages, with_services, bad = json.loads(out)
+    london = [b for b in everything if b["flightNumber"] == "BA982"]
+    assert len(pages) == (len(london) + 1) // 2
+    assert [b for page in pages for b in page] == [{"bookingId": b["bookingId"], "seat": b["seat"]} for b in london]
+    assert [b["bookingId"] for b in with_services["bookings"]] == [
+        b["bookingId"] for b in london if "food" in b]
+    assert [response["error"] for response in bad] == ["Invalid limit", "Unknown fields: nope", "Invalid cursor"]
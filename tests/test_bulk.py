@@ -0,0 +1,31 @@
+from conftest import finish
+
+IMPORT = "import sys, bulk; sys.argv = ['bulk.py', 'import', 'bookings', 'bookings.csv']; bulk.main()"
+
+def test_import_defaults_left_out_services(data_dir, spawn):
+    (data_dir / "bookings.csv").write_text("flight_number,destination,seat,food\nBA982,London,3A,F1\n")
+    finish(spawn(IMPORT))
+    assert "BA982 - London: 3A | SERVICES:F1,D0,C0 | COST:$12.50" in (data_dir / "BookedFlights.txt").read_text()
+
+def test_import_rejects_unknown_service_code(data_dir, spawn):
+    (data_dir / "bookings.csv").write_text("flight_number,destination,seat,food\nBA982,London,3A,F9\n")
+    process = spawn(IMPORT)
+    _, err = process.communicate(timeout=30)
+    assert process.returncode == 1
+    assert "row 1: Invalid food code: F9" in err
+    assert "BA982 - London: 3A" not in (data_dir / "BookedFlights.txt").read_text()
+
+def test_import_checks_seats_against_the_flight(data_dir, spawn):
+    flights = (data_dir / "Flights.txt").read_text()
+    (data_dir / "bookings.csv").write_text("flight_number,destination,seat\n"
+                                           "BA982,London,99Z\nBA982,London,35C\nBA982,London,3B\n")
+    process = spawn(IMPORT.replace("'import',", "'import', '--skip-invalid',"))
+    _, err = process.communicate(timeout=30)
+    assert "row 1: no seat 99Z on BA982" in err
+    assert "row 2: seat 35C on BA982 is already booked" in err
+    booked = (data_dir / "BookedFlights.txt").read_text()
+    assert "BA982 - London: 99Z" not in booked
+    assert booked.count("BA982 - London: 35C") == 1
+    # 3B is in the cabin but not on sale, so it was sold before bookings were kept
+    assert "BA982 - London: 3B" in booked
+    assert (data_dir / "Flights.txt").read_text() == flights
@@ -0,0 +1,41 @@
+import json
+
+from conftest import finish
+
+RUN = """
+import json
+import consistency
+report = consistency.{action}()
+print(json.dumps(report.to_dict()))
+"""
+
+def run(spawn, action):
+    out, _ = finish(spawn(RUN.format(action=action)))
+    return json.loads(out)
+
+def test_repair_fixes_what_check_finds(spawn, data_dir):
+    flights = (data_dir / "Flights.txt").read_text()
+    with open(data_dir / "BookedFlights.txt", "a") as f:
+        # On sale, twice over, on a flight the inventory lacks, and a line the
+        # store itself skips (three service codes are required)
+        f.write("AA234 - New York: 1C | ID:first\n"
+                "AA234 - New York: 1C | ID:second\n"
+                "ZZ100 - Nowhere: 2B | ID:orphan\n"
+                "AA234 - New York: 4D | SERVICES:F1,D1\n")
+    report = run(spawn, "check")
+    assert not report["ok"]
+    assert report["malformed"] == 1
+    assert report["doubleBooked"] == [{"flightNumber": "AA234", "seat": "1C", "line": 5}]
+    assert report["onSale"] == [{"flightNumber": "AA234", "seat": "1C"}]
+    assert report["orphaned"] == [{"flightNumber": "ZZ100", "destination": "Nowhere", "seats": ["2B"]}]
+    # The malformed line isn't a booking, so 4D stays on sale
+    assert "4D" in flights.splitlines()[0]
+
+    assert run(spawn, "repair")["repaired"] is True
+    assert run(spawn, "check")["ok"] is True
+    booked = (data_dir / "BookedFlights.txt").read_text()
+    assert "ID:first" in booked and "ID:second" not in booked
+    assert "ID:second" in (data_dir / "BookedFlights.rejected").read_text()
+    inventory = (data_dir / "Flights.txt").read_text()
+    assert "[1C," not in inventory.splitlines()[0]
+    assert "ZZ100 - Nowhere: []" in inventory
@@ -0,0 +1,28 @@
+import json
+
+from conftest import finish
+
+def test_flights_are_served_from_the_cache_until_the_file_changes(spawn):
+    out, _ = finish(spawn("""
+import json
+import flight_manager
+from web_interface import app
+
+client = app.test_client()
+first = client.get("/api/flights").get_json()
+misses = flight_manager.flights_cache_stats()["misses"]
+again = client.get("/api/flights").get_json()
+unchanged = flight_manager.flights_cache_stats()["misses"] == misses
+# Another process edits the file
+with open("Flights.txt", "a") as f:
+    f.write("ZZ100 - Nowhere: [1A, 2B]\\n")
+edited = client.get("/api/flights").get_json()
+# A booking made here shows up at once
+assert client.post("/api/book", json={"flightNumber": "AA234", "seat": "1C"}).get_json()["success"]
+booked = client.get("/api/flights").get_json()
+print(json.dumps([first == again, unchanged, edited.get("ZZ100"), "1C" in booked["AA234"]["seats"]]))
+"""))
+    same, unchanged, added, still_on_sale = json.loads(out)
+    assert same and unchanged
+    assert added == {"destination": "Nowhere", "seats": ["1A", "2B"]}
+    assert still_on_sale is False
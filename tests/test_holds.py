@@ -0,0 +1,100 @@
+from conftest import finish
+
+HOLD = """
+import reservations
+hold, error = reservations.hold_seat("AA234", "1C")
+assert error is None, error
+print(hold["holdId"])
+"""
+
+def run(spawn, code):
+    return finish(spawn(code))[0].strip()
+
+def test_hold_is_confirmed_through_another_worker(spawn):
+    hold_id = run(spawn, HOLD)
+    assert run(spawn, """
+import reservations
+print(reservations.book_seat("AA234", "1C"))
+""") == "(None, 'Seat 1C on AA234 is on hold')"
+    booking_id = run(spawn, f"""
+import reservations
+booking_id, error = reservations.book_seat("AA234", "1C", hold_id={hold_id!r})
+assert error is None, error
+print(booking_id)
+""")
+    assert booking_id
+    assert run(spawn, f"""
+import reservations
+print(reservations.release_hold({hold_id!r}))
+""") == "Hold not found or expired"
+
+def test_hold_is_released_through_another_worker(spawn):
+    hold_id = run(spawn, HOLD)
+    assert run(spawn, f"""
+import reservations
+print(reservations.release_hold({hold_id!r}), reservations.book_seat("AA234", "1C")[1])
+""") == "None None"
+
+def test_unknown_hold_books_a_free_seat(spawn):
+    assert run(spawn, """
+import reservations
+print(reservations.book_seat("AA234", "1C", hold_id="0123456789abcdef")[1])
+""") == "None"
+
+def test_hold_waits_for_a_booking_in_progress(spawn):
+    # The booking stops inside its hold check, under the claim lock; a hold
+    # on the same seat must wait for it and then find the seat gone
+    assert run(spawn, """
+import threading, time
+import reservations
+
+check_holds = reservations._check_holds
+checking = threading.Event()
+
+def slow_check(seats):
+    checking.set()
+    time.sleep(0.5)
+    return check_holds(seats)
+
+reservations._check_holds = slow_check
+booked = []
+booking = threading.Thread(target=lambda: booked.append(reservations.book_seat("AA234", "1C")))
+booking.start()
+checking.wait(10)
+hold, error = reservations.hold_seat("AA234", "1C")
+booking.join(10)
+print(booked[0][1], hold, error)
+""") == "None None Invalid flight or seat"
+
+def test_failed_booking_keeps_the_hold(spawn):
+    hold_id = run(spawn, HOLD)
+    assert run(spawn, f"""
+import flight_manager, reservations
+flight_manager.save_booking_with_services = lambda *args, **kwargs: False
+print(reservations.book_seat("AA234", "1C", hold_id={hold_id!r})[1])
+""") == "Booking failed"
+    assert run(spawn, f"""
+import reservations
+print(reservations.book_seat("AA234", "1C")[1], reservations.book_seat("AA234", "1C", hold_id={hold_id!r})[1])
+""") == "Seat 1C on AA234 is on hold None"
+
+def test_holds_log_is_read_incrementally_and_compacted(data_dir):
+    import holds
+
+    a = holds.SeatHolds(path="H.txt")
+    b = holds.SeatHolds(path="H.txt")
+    first, _ = a.hold("AA234", "1C")
+    assert b.held_seats() == {"AA234": {"1C"}}
+    # Nothing new in the log: no re-read, so the view's version stays put
+    version = b.version
+    b.held_seats()
+    b.get(first.hold_id)
+    assert b.version == version
+    for _ in range(holds.HOLDS_LOG_SLACK):
+        hold, _ = b.hold("BA982", "3A")
+        assert a.release(hold.hold_id) is not None
+    # Rewritten down to the live holds along the way
+    assert len((data_dir / "H.txt").read_text().splitlines()) < holds.HOLDS_LOG_SLACK
+    assert a.held_seats() == b.held_seats() == {"AA234": {"1C"}}
+    assert b.consume(first.hold_id) is not None
+    assert a.held_seats() == {}
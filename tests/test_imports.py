@@ -0,0 +1,14 @@
+import subprocess
+import sys
+
+import pytest
+
+from conftest import REPO_DIR
+
+# Each of these must import in a fresh interpreter without anything imported
+# before it
+@pytest.mark.parametrize("module", ["storage", "journal", "flight_manager", "reservations"])
+def test_module_imports_on_its_own(module):
+    result = subprocess.run([sys.executable, "-c", f"import {module}"], cwd=REPO_DIR,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,57 @@
+import pytest
+
+import flight_manager
+import inventory_snapshot
+from conftest import finish
+from inventory_snapshot import InventorySnapshot
+from seatmap import SeatMap
+
+def text_flights(data_dir):
+    with open(data_dir / "Flights.txt") as f:
+        return flight_manager.parse_flights(f)
+
+def test_snapshot_answers_like_the_text(data_dir):
+    count = inventory_snapshot.build("Flights.txt", "Flights.bin")
+    flights = text_flights(data_dir)
+    snapshot = InventorySnapshot("Flights.bin")
+    assert count == len(snapshot) == len(flights)
+    loaded = snapshot.load_flights()
+    assert list(loaded) == list(flights)
+    for flight_number, info in flights.items():
+        assert loaded[flight_number]["destination"] == info["destination"]
+        assert list(loaded[flight_number]["seats"]) == list(info["seats"])
+        assert snapshot.seats_left(flight_number) == len(info["seats"])
+        first = next(iter(info["seats"]))
+        assert snapshot.seat_available(flight_number, first)
+        assert not snapshot.seat_available(flight_number, "99Z")
+    assert snapshot.availability() == {flight_number: {"destination": info["destination"],
+                                                       "seatsLeft": len(info["seats"])}
+                                       for flight_number, info in flights.items()}
+    assert snapshot.find("ZZ999") is None and snapshot.seats_left("ZZ999") is None
+
+def test_snapshot_is_only_used_while_it_matches(spawn, data_dir):
+    out, _ = finish(spawn("""
+import flight_manager, inventory_snapshot
+inventory_snapshot.build()
+assert inventory_snapshot.current() is not None
+flights = flight_manager.load_flights()
+flights["AA234"]["seats"].discard("1C")
+# save_flights keeps an existing snapshot current
+flight_manager.save_flights(flights)
+snapshot = inventory_snapshot.current()
+print(snapshot is not None and not snapshot.seat_available("AA234", "1C"))
+with open("Flights.txt", "a") as f:
+    f.write("ZZ100 - Nowhere: [1A]\\n")
+print(inventory_snapshot.current() is None, "ZZ100" in flight_manager.load_flights())
+"""))
+    assert out.split() == ["True", "True", "True"]
+
+def test_what_the_format_cannot_hold_is_refused(data_dir):
+    with pytest.raises(ValueError):
+        inventory_snapshot.encode({"AA1": {"destination": "X", "seats": SeatMap(["1A", "exit"])}})
+    with pytest.raises(ValueError):
+        inventory_snapshot.encode({"A" * 17: {"destination": "X", "seats": SeatMap(["1A"])}})
+    data = inventory_snapshot.encode({"AA1": {"destination": "X", "seats": SeatMap(["1A"])}})
+    (data_dir / "short.bin").write_bytes(data[:-1])
+    with pytest.raises(ValueError):
+        InventorySnapshot("short.bin")
@@ -0,0 +1,87 @@
+import json
+
+from conftest import finish
+
+JOURNAL = {"FLIGHT_STORAGE_MODE": "journal"}
+
+# The state a fresh process reads back, journal replayed over the snapshot
+STATE = """
+import json
+import reservations
+bookings = {b["booking_id"]: b for b in reservations.load_bookings()}
+print(json.dumps({"AA234": sorted(reservations.current_flights()["AA234"]["seats"]),
+                  "bookings": bookings}))
+"""
+
+def read_state(spawn):
+    out, _ = finish(spawn(STATE, **JOURNAL))
+    return json.loads(out)
+
+def write_some(spawn):
+    out, _ = finish(spawn("""
+import reservations
+kept, error = reservations.book_seat("AA234", "1C", {"food": "F1", "drinks": "D1", "comfort": "C1"})
+assert error is None, error
+gone, error = reservations.book_seat("AA234", "4D")
+assert error is None, error
+assert reservations.update_booking_services(kept, {"food": "F2", "drinks": "D2", "comfort": "C2"}) is None
+assert reservations.cancel_booking(gone) is None
+print(kept)
+""", **JOURNAL))
+    return out.strip()
+
+def test_journal_is_replayed_by_the_next_process(spawn, data_dir):
+    flights = (data_dir / "Flights.txt").read_text()
+    kept = write_some(spawn)
+    # Nothing but the journal was written
+    assert (data_dir / "Flights.txt").read_text() == flights
+    assert [json.loads(line)["op"] for line in (data_dir / "Bookings.journal").read_text().splitlines()] == \
+        ["claim", "claim", "services", "cancel"]
+    state = read_state(spawn)
+    assert "1C" not in state["AA234"] and "4D" in state["AA234"]
+    assert state["bookings"][kept]["services"] == {"food": "F2", "drinks": "D2", "comfort": "C2"}
+    assert sum(b["flight_number"] == "AA234" and b["seat"] == "4D" for b in state["bookings"].values()) == 0
+
+def test_compaction_folds_the_journal_into_the_snapshot(spawn, data_dir):
+    kept = write_some(spawn)
+    before = read_state(spawn)
+    finish(spawn("import reservations; reservations.compact_storage()", **JOURNAL))
+    assert (data_dir / "Bookings.journal").read_text() == ""
+    assert "[1C," not in (data_dir / "Flights.txt").read_text().splitlines()[0]
+    assert f"ID:{kept}" in (data_dir / "BookedFlights.txt").read_text()
+    assert read_state(spawn) == before
+
+def test_torn_record_is_skipped_and_dropped(spawn, data_dir):
+    write_some(spawn)
+    with open(data_dir / "Bookings.journal", "a") as f:
+        f.write('{"op":"claim","id":"torn","flight":"AA234","se')
+    assert "torn" not in read_state(spawn)["bookings"]
+    finish(spawn("""
+import reservations
+assert reservations.book_seat("AA234", "7A")[1] is None
+""", **JOURNAL))
+    for line in (data_dir / "Bookings.journal").read_text().splitlines():
+        json.loads(line)
+
+def test_a_burst_is_synced_within_the_interval(spawn):
+    out, _ = finish(spawn("""
+import os, time
+import journal, reservations
+synced = []
+fsync = os.fsync
+os.fsync = lambda fd: (synced.append(fd), fsync(fd))
+for seat in ("1C", "4D"):
+    assert reservations.book_seat("AA234", seat)[1] is None
+j = journal.get_journal()
+unsynced = j._pending_sync
+deadline = time.monotonic() + 5
+while j._pending_sync and time.monotonic() < deadline:
+    time.sleep(0.01)
+print(unsynced, j._pending_sync, len(synced))
+""", FLIGHT_JOURNAL_FSYNC_INTERVAL="0.5", **JOURNAL))
+    unsynced, pending, syncs = map(int, out.split())
+    # The last booking was acknowledged before its fsync, and the flusher
+    # caught up without another write coming along
+    assert unsynced >= 1
+    assert pending == 0
+    assert syncs >= 1
@@ -0,0 +1,68 @@
+import os
+import time
+
+from conftest import finish
+
+# The canceller stops inside the BookedFlights.txt rewrite, after taking its
+# locks, long enough for the other process to take whatever it takes first.
+# With the locks taken in different orders the two would wait on each other.
+SLOW_CANCEL = """
+import time
+import flight_manager
+import reservations
+
+rewrite_booking = flight_manager.rewrite_booking
+
+def slow_rewrite(*args, **kwargs):
+    open("cancel.started", "w").close()
+    time.sleep(1.0)
+    return rewrite_booking(*args, **kwargs)
+
+flight_manager.rewrite_booking = slow_rewrite
+booking_id, error = reservations.book_seat("AA234", "1C")
+assert error is None, error
+print(reservations.cancel_booking(booking_id))
+"""
+
+def wait_for(path, timeout=15):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        assert time.monotonic() < deadline, f"{path} never appeared"
+        time.sleep(0.01)
+
+def test_repair_and_cancel_take_locks_in_the_same_order(data_dir, spawn):
+    cancel = spawn(SLOW_CANCEL)
+    wait_for(data_dir / "cancel.started")
+    repair = spawn("import consistency; print(consistency.repair().ok)")
+    assert finish(cancel)[0].strip() == "None"
+    assert finish(repair)[0].strip() == "True"
+    assert "1C" in (data_dir / "Flights.txt").read_text().splitlines()[0]
+
+def test_bulk_import_and_cancel_take_locks_in_the_same_order(data_dir, spawn):
+    (data_dir / "bookings.csv").write_text("flight_number,destination,seat\nBA982,London,3A\n")
+    cancel = spawn(SLOW_CANCEL)
+    wait_for(data_dir / "cancel.started")
+    bulk = spawn("import sys, bulk; sys.argv = ['bulk.py', 'import', 'bookings', 'bookings.csv']; bulk.main()")
+    assert finish(cancel)[0].strip() == "None"
+    finish(bulk)
+    assert "BA982 - London: 3A" in (data_dir / "BookedFlights.txt").read_text()
+
+def test_bulk_import_does_not_wait_on_flight_locks(data_dir):
+    import threading
+    import reservations
+    from locks import flight_lock
+
+    # A claim on BA982 holds its flight lock and is about to ask for
+    # Flights.txt; the import already holds Flights.txt and must not need it
+    backend = reservations.get_backend()
+    booking = {"booking_id": "imported1", "flight_number": "BA982", "destination": "London", "seat": "3A",
+               "services": None, "total_cost": 0.0}
+    result = []
+    with flight_lock("BA982"):
+        importer = threading.Thread(target=lambda: result.append(
+            backend.import_bookings([booking], [("BA982", "3A")])))
+        importer.start()
+        importer.join(10)
+        assert not importer.is_alive(), "import waited on a flight lock while holding the file locks"
+    assert result == [None]
+    assert not backend.seat_available("BA982", "3A")
@@ -0,0 +1,50 @@
+import itertools
+import random
+
+import pytest
+
+import pricing
+from flight_manager import INFLIGHT_SERVICES
+from pricing import PriceTable
+
+def catalog_total(services):
+    # The price of a selection straight from the catalog dict
+    if not services:
+        return 0.0
+    return sum(INFLIGHT_SERVICES[category][services[category]]["price"] for category in pricing.SERVICE_CATEGORIES)
+
+def selections(count, seed=3):
+    rng = random.Random(seed)
+    picks = []
+    for _ in range(count):
+        if rng.random() < 0.2:
+            picks.append(None)
+        else:
+            picks.append({category: rng.choice(list(INFLIGHT_SERVICES[category]))
+                          for category in pricing.SERVICE_CATEGORIES})
+    return picks
+
+def test_single_selection_matches_the_catalog():
+    table = PriceTable(INFLIGHT_SERVICES)
+    for food, drinks, comfort in itertools.product(*(INFLIGHT_SERVICES[c] for c in pricing.SERVICE_CATEGORIES)):
+        services = {"food": food, "drinks": drinks, "comfort": comfort}
+        assert table.total(services) == pytest.approx(catalog_total(services))
+    assert table.total(None) == 0.0
+    assert table.price("drinks", "D7") == 7.50 and table.name("comfort", "C3") == "Headphones"
+    with pytest.raises(KeyError):
+        table.price("food", "F9")
+
+@pytest.mark.parametrize("vectorized", [True, False])
+def test_batch_matches_one_at_a_time(monkeypatch, vectorized):
+    if not vectorized:
+        # The array('d') fallback used when NumPy isn't installed
+        monkeypatch.setattr(pricing, "np", None)
+    elif pricing.np is None:
+        pytest.skip("NumPy is not installed")
+    table = PriceTable(INFLIGHT_SERVICES)
+    picks = selections(500)
+    totals = table.total_many(picks)
+    assert len(totals) == len(picks)
+    assert list(totals) == pytest.approx([catalog_total(services) for services in picks])
+    assert table.sum_many(picks) == pytest.approx(sum(map(catalog_total, picks)))
+    assert len(table.total_many([])) == 0
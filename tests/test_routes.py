@@ -0,0 +1,98 @@
+import itertools
+import random
+
+from routes import DAY, MAX_LAYOVER, MIN_CONNECTION, RouteGraph, parse_schedule_line
+
+SCHEDULE = """
+AA1 | Chicago -> New York | 07:00 -> 09:00
+AA2 | Chicago -> New York | 12:00 -> 14:30
+AA3 | New York -> London | 09:30 -> 16:00
+AA4 | New York -> London | 18:00 -> 06:00
+AA5 | Chicago -> London | 20:00 -> 10:00
+AA6 | New York -> Boston | 10:00 -> 11:00
+AA7 | Boston -> London | 12:00 -> 19:00
+"""
+
+def graph(text=SCHEDULE):
+    return RouteGraph([leg for leg in map(parse_schedule_line, text.splitlines()) if leg])
+
+def flights(itinerary):
+    return [leg.flight_number for leg, _, _ in itinerary]
+
+def brute_force(legs, origin, destination, depart_after, max_stops):
+    # Every itinerary by plain enumeration, in the order search() promises
+    found = []
+
+    def extend(path, here, visited):
+        if here == destination:
+            found.append(path)
+            return
+        if len(path) > max_stops:
+            return
+        arrived = path[-1][2] if path else None
+        for leg in legs:
+            if leg.origin != here or leg.destination in visited:
+                continue
+            if arrived is None:
+                if leg.departs < depart_after:
+                    continue
+                departs = leg.departs
+            else:
+                earliest = arrived + MIN_CONNECTION
+                departs = leg.departs + -(-(earliest - leg.departs) // DAY) * DAY
+                if departs - arrived > MAX_LAYOVER:
+                    continue
+            extend(path + [(leg, departs, departs + leg.arrives - leg.departs)], leg.destination,
+                   visited | {leg.destination})
+
+    extend([], origin, {origin})
+    found.sort(key=lambda path: (path[-1][2] - path[0][1], len(path), path[0][1]))
+    return found
+
+def test_shortest_itinerary_first():
+    results = graph().search("Chicago", "London", max_stops=1)
+    assert [flights(path) for path in results] == [["AA5"], ["AA2", "AA4"], ["AA1", "AA4"], ["AA2", "AA3"]]
+
+def test_connections_respect_the_minimum():
+    for path in graph().search("Chicago", "London", max_stops=2):
+        for (_, _, arrived), (_, departs, _) in zip(path, path[1:]):
+            assert MIN_CONNECTION <= departs - arrived <= MAX_LAYOVER
+    # AA1 lands 30 minutes before AA3 leaves, and the next day's AA3 is past
+    # MAX_LAYOVER; AA2 makes the next day's AA3
+    results = graph().search("Chicago", "London", max_stops=1)
+    assert ["AA1", "AA3"] not in [flights(path) for path in results]
+    [(_, _, landed), (_, departs, _)] = results[-1]
+    assert departs == 9 * 60 + 30 + DAY and landed == 14 * 60 + 30
+
+def test_max_stops_and_depart_after():
+    routes = graph()
+    assert [flights(path) for path in routes.search("Chicago", "London", max_stops=0)] == [["AA5"]]
+    assert ["AA1", "AA6", "AA7"] in [flights(path) for path in routes.search("Chicago", "London", max_stops=2)]
+    later = routes.search("Chicago", "London", depart_after=8 * 60, max_stops=2)
+    assert all(path[0][1] >= 8 * 60 for path in later)
+    assert routes.search("Chicago", "Nowhere") == []
+
+def test_matches_enumerating_every_path():
+    rng = random.Random(7)
+    airports = ["A", "B", "C", "D", "E"]
+    for _ in range(30):
+        lines = []
+        for n in range(rng.randrange(5, 40)):
+            origin, destination = rng.sample(airports, 2)
+            departs = rng.randrange(DAY)
+            arrives = departs + rng.randrange(30, 900)
+            lines.append(f"X{n} | {origin} -> {destination} | {departs // 60:02d}:{departs % 60:02d} -> "
+                         f"{arrives % DAY // 60:02d}:{arrives % 60:02d}+{arrives // DAY}")
+        routes = graph("\n".join(lines))
+        legs = list(routes.legs.values())
+        for max_stops, depart_after in itertools.product(range(3), (0, 600)):
+            expected = brute_force(legs, "A", "B", depart_after, max_stops)
+            got = routes.search("A", "B", depart_after, max_stops, limit=len(expected) + 1)
+            key = lambda path: (path[-1][2] - path[0][1], len(path), path[0][1])
+            assert [key(path) for path in got] == [key(path) for path in expected]
+            assert sorted(map(flights, got)) == sorted(map(flights, expected))
+
+def test_limit_keeps_the_best():
+    routes = graph()
+    everything = routes.search("Chicago", "London", max_stops=2)
+    assert routes.search("Chicago", "London", max_stops=2, limit=2) == everything[:2]
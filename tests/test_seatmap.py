@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from seatmap import SeatMap, json_default
+
+@pytest.mark.parametrize("seat", ["01A", "001A", "1A\n", "١A", "0A", " 1A", "1a"])
+def test_only_the_canonical_spelling_matches(seat):
+    seats = SeatMap(["1A", "1B"])
+    assert seat not in seats
+    assert seats.seat_index(seat) is None
+    assert not seats.discard(seat)
+    assert list(seats) == ["1A", "1B"]
+
+def test_seats_iterate_in_natural_order():
+    seats = SeatMap(["10D", "1C", "2A", "1A"])
+    assert list(seats) == ["1A", "1C", "2A", "10D"]
+    assert len(seats) == 4 and seats == ["1A", "1C", "2A", "10D"]
+
+def test_claim_and_release():
+    seats = SeatMap(["1A", "1B"])
+    assert seats.claim("1A") and "1A" not in seats
+    assert not seats.claim("1A")
+    assert seats.release("1A") and not seats.release("1A")
+    with pytest.raises(ValueError):
+        SeatMap().remove("1A")
+    seats.remove("1B")
+    assert list(seats) == ["1A"] and len(seats) == 1
+
+def test_a_new_letter_widens_the_layout():
+    seats = SeatMap(["1A", "2D"])
+    seats.add("1F")
+    assert seats.letters == "ABCDF"
+    assert list(seats) == ["1A", "1F", "2D"]
+    assert "2D" in seats and "2F" not in seats
+
+def test_seats_outside_the_layout_are_kept_aside():
+    seats = SeatMap(["1A", "exit"])
+    assert "exit" in seats and len(seats) == 2
+    assert list(seats) == ["1A", "exit"]
+    assert seats.seat_index("exit") is None
+    assert seats.discard("exit") and list(seats) == ["1A"]
+
+def test_copy_and_bits_round_trip():
+    seats = SeatMap(["1A", "3C", "12B"])
+    copy = seats.copy()
+    copy.discard("1A")
+    assert "1A" in seats
+    assert SeatMap.from_bits(seats.bits, seats.letters) == seats
+    assert json.dumps({"seats": seats}, default=json_default) == '{"seats": ["1A", "3C", "12B"]}'
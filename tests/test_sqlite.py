@@ -0,0 +1,66 @@
+import sqlite3
+
+import pytest
+
+from conftest import finish
+
+SQLITE = {"FLIGHT_STORAGE_MODE": "sqlite", "FLIGHT_SQLITE_DB": "flights.db"}
+
+# A bookings table from before booking IDs existed, with a legacy seat
+# booked twice
+LEGACY_SCHEMA = """
+CREATE TABLE bookings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    flight_number TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    seat TEXT NOT NULL,
+    food TEXT,
+    drinks TEXT,
+    comfort TEXT,
+    total_cost REAL NOT NULL DEFAULT 0
+);
+INSERT INTO bookings (flight_number, destination, seat) VALUES ('AA234', 'New York', '2A');
+INSERT INTO bookings (flight_number, destination, seat) VALUES ('AA234', 'New York', '2A');
+INSERT INTO bookings (flight_number, destination, seat) VALUES ('BA982', 'London', '5C');
+"""
+
+def test_bookings_after_migrating(spawn, data_dir):
+    out, _ = finish(spawn("""
+import migrate, reservations
+migrate.migrate("sqlite", "flights.db")
+booked = len(reservations.load_bookings())
+booking_id, error = reservations.book_seat("AA234", "1C", {"food": "F1", "drinks": "D1", "comfort": "C1"})
+assert error is None, error
+assert reservations.book_seat("AA234", "1C")[1] == "Invalid flight or seat"
+assert "1C" not in reservations.current_flights()["AA234"]["seats"]
+assert reservations.get_booking(booking_id)["services"]["food"] == "F1"
+assert reservations.cancel_booking(booking_id) is None
+assert "1C" in reservations.current_flights()["AA234"]["seats"]
+print(booked, len(reservations.load_bookings()))
+""", **SQLITE))
+    stored = len((data_dir / "BookedFlights.txt").read_text().splitlines())
+    assert out.split() == [str(stored), str(stored)]
+
+def test_upgrade_gives_duplicate_legacy_rows_distinct_ids(spawn, data_dir):
+    sqlite3.connect(data_dir / "flights.db").executescript(LEGACY_SCHEMA)
+    out, err = finish(spawn("""
+import storage
+print(sorted(b["booking_id"] for b in storage.SQLiteBackend("flights.db").load_bookings()))
+"""))
+    assert out.strip() == "['AA234-2A', 'AA234-2A-2', 'BA982-5C']"
+    assert "1 booking(s) shared an ID" in err
+    conn = sqlite3.connect(data_dir / "flights.db")
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("UPDATE bookings SET booking_id = 'BA982-5C' WHERE booking_id = 'AA234-2A'")
+
+def test_failed_upgrade_changes_nothing(spawn, data_dir):
+    conn = sqlite3.connect(data_dir / "flights.db")
+    conn.executescript(LEGACY_SCHEMA)
+    # Something already has the unique index's name, so creating it fails
+    conn.execute("CREATE TABLE bookings_booking_id (x)")
+    conn.commit()
+    process = spawn("import storage; storage.SQLiteBackend('flights.db')")
+    process.communicate(timeout=30)
+    assert process.returncode != 0
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(bookings)")]
+    assert "booking_id" not in columns
@@ -0,0 +1,79 @@
+import json
+
+from conftest import finish
+
+# Each script runs in its own process so the app's caches start from the
+# scratch data directory
+BOOK = """
+import json
+from web_interface import app
+
+client = app.test_client()
+response = client.post("/api/book", json={body})
+print(response.status_code, json.dumps(response.get_json()))
+"""
+
+def post_book(spawn, body):
+    out, _ = finish(spawn(BOOK.format(body=repr(body))))
+    status, payload = out.strip().split(" ", 1)
+    return int(status), json.loads(payload)
+
+def test_unknown_service_code_is_rejected(spawn):
+    status, payload = post_book(spawn, {"flightNumber": "AA234", "seat": "1C",
+                                        "services": {"food": "F9", "drinks": "D1", "comfort": "C1"}})
+    assert status == 200
+    assert payload == {"success": False, "error": "Invalid food code: F9"}
+
+def test_left_out_service_categories_default_to_none(spawn):
+    status, payload = post_book(spawn, {"flightNumber": "AA234", "seat": "1C", "services": {"food": "F1"}})
+    assert status == 200
+    assert payload["success"], payload
+
+def test_update_services_rejects_unknown_code(spawn):
+    out, _ = finish(spawn("""
+import reservations
+booking_id, error = reservations.book_seat("AA234", "1C")
+assert error is None, error
+print(reservations.update_booking_services(booking_id, {"food": "F1", "drinks": "DX", "comfort": "C0"}))
+"""))
+    assert out.strip() == "Invalid drinks code: DX"
+
+def test_non_string_seat_is_rejected(spawn):
+    for seat in (5, None, ["1C"]):
+        status, payload = post_book(spawn, {"flightNumber": "AA234", "seat": seat})
+        assert status == 200
+        assert payload["success"] is False
+
+def test_non_string_seat_cannot_be_held(spawn):
+    out, _ = finish(spawn("""
+import reservations
+print(reservations.hold_seat("AA234", 5)[1])
+"""))
+    assert out.strip() == "Invalid flight or seat"
+
+def test_non_canonical_seat_is_rejected(spawn, data_dir):
+    booked = (data_dir / "BookedFlights.txt").read_text()
+    for seat in ("01A", "1A\n", "١A"):
+        status, payload = post_book(spawn, {"flightNumber": "AA112", "seat": seat})
+        assert status == 200
+        assert payload["success"] is False
+    assert (data_dir / "BookedFlights.txt").read_text() == booked
+
+def test_missing_fields_are_a_bad_request(spawn):
+    out, _ = finish(spawn("""
+import json
+from web_interface import app
+
+client = app.test_client()
+for path, body in (("/api/book", {"seat": "1C"}), ("/api/book", "1C"), ("/api/update-services", {})):
+    response = client.post(path, json=body)
+    print(response.status_code, json.dumps(response.get_json()))
+print(client.post("/api/book", data="{", content_type="application/json").status_code)
+"""))
+    lines = out.splitlines()
+    assert lines[:3] == [
+        '400 {"error": "A booking needs a flightNumber and seat", "success": false}',
+        '400 {"error": "Invalid JSON data", "success": false}',
+        '400 {"error": "A services update needs a bookingId", "success": false}',
+    ]
+    assert lines[3] == "400"
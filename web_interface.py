@@ -1,14 +1,39 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, Response, g, request, jsonify, redirect, url_for, stream_with_context
+import gzip
+import hashlib
+import hmac
 import json
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 
+try:
+    import brotli
+except ImportError:
+    # No brotli module - compressed responses are gzip only
+    brotli = None
+
 # Import existing functions
 from flight_manager import (
     load_flights, save_flights, INFLIGHT_SERVICES,
     select_inflight_services, save_booking_with_services,
-    update_booking_with_services, parse_services_codes
+    update_booking_with_services, parse_services_codes,
+    flights_cache_stats, format_booking_line
+)
+from reservations import (
+    current_flights_json, current_availability, flights_version, bookings_version, load_bookings, book_seat,
+    book_seats, cancel_booking, query_bookings, get_booking, booking_id_at,
+    update_booking_services, booking_stats, hold_seat, release_hold, search_flights, schedule_version, search_days
 )
+import dated_inventory
+import routes
+from booking_index import DEFAULT_PAGE_SIZE
+from events import get_bus
+import metrics
+import profiling
+import replay
 
 app = Flask(__name__)
 
@@ -16,179 +41,509 @@ app = Flask(__name__)
 FLIGHTS_FILE = "Flights.txt"
 BOOKED_FILE = "BookedFlights.txt"
 
-def load_bookings_web():
-    bookings = []
-    try:
-        with open(BOOKED_FILE, "r") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                    
-                booking = {"raw_line": line}
-                
-                if "|" in line:
-                    parts = line.split("|")
-                    flight_info = parts[0].strip()
-                    
-                    # Parse flight info
-                    if ":" in flight_info:
-                        flight_part, seat = flight_info.split(":")
-                        flight_number, destination = flight_part.split(" - ")
-                        booking.update({
-                            "flightNumber": flight_number.strip(),
-                            "destination": destination.strip(),
-                            "seat": seat.strip()
-                        })
-                    
-                    # Parse services
-                    for part in parts[1:]:
-                        part = part.strip()
-                        if part.startswith("SERVICES:"):
-                            services_codes = part.replace("SERVICES:", "").strip()
-                            try:
-                                food_code, drink_code, comfort_code = services_codes.split(",")
-                                # Store services as individual string properties instead of a nested object
-                                booking["food"] = food_code
-                                booking["drinks"] = drink_code
-                                booking["comfort"] = comfort_code
-                                booking["services_display"] = parse_services_codes(services_codes)
-                            except:
-                                booking["services_display"] = "Error parsing services"
-                                
-                        elif part.startswith("COST:"):
-                            cost_str = part.replace("COST:", "").strip()
-                            try:
-                                # Convert to string to avoid type issues in JavaScript
-                                booking["totalCost"] = cost_str
-                            except:
-                                booking["totalCost"] = "$0.00"
-                else:
-                    # Booking without services
-                    if ":" in line:
-                        flight_info, seat = line.split(":")
-                        flight_number, destination = flight_info.split(" - ")
-                        booking["flightNumber"] = flight_number.strip()
-                        booking["destination"] = destination.strip()
-                        booking["seat"] = seat.strip()
-                        booking["services"] = "none"
-                
-                bookings.append(booking)
-                
-    except FileNotFoundError:
-        pass
-        
-    return bookings
+# JSON and HTML responses at least this big are compressed for clients that
+# accept gzip (or brotli, if installed); 0 turns compression off
+HTTP_COMPRESS_MIN_SIZE = int(os.environ.get("FLIGHT_HTTP_COMPRESS_MIN_SIZE", "1024"))
+COMPRESSIBLE_TYPES = {"application/json", "text/html"}
 
-def save_booking_web(flight_number, destination, seat, services=None):
-    try:
-        with open(BOOKED_FILE, "a") as f:
-            if services:
-                services_code = f"{services['food']},{services['drinks']},{services['comfort']}"
-                total_cost = (INFLIGHT_SERVICES["food"][services['food']]["price"] +
-                            INFLIGHT_SERVICES["drinks"][services['drinks']]["price"] +
-                            INFLIGHT_SERVICES["comfort"][services['comfort']]["price"])
-                f.write(f"{flight_number} - {destination}: {seat} | SERVICES:{services_code} | COST:${total_cost:.2f}\n")
-            else:
-                f.write(f"{flight_number} - {destination}: {seat}\n")
+# Seconds between keepalive comments on an idle /api/flights/stream; also how
+# often it notices inventory changes made by other processes
+SSE_KEEPALIVE = float(os.environ.get("FLIGHT_SSE_KEEPALIVE", "15"))
+
+# Token for the /admin endpoints, sent as X-Admin-Token; unset disables them
+ADMIN_TOKEN = os.environ.get("FLIGHT_ADMIN_TOKEN", "")
+
+# The services catalog only changes with a deploy, so clients may reuse it for a while
+SERVICES_MAX_AGE = 3600
+
+def make_etag(*parts):
+    # Strong ETag from whatever identifies the data behind a response
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+SERVICES_ETAG = make_etag("services", json.dumps(INFLIGHT_SERVICES, sort_keys=True))
+
+def etag_matches(etag):
+    # Compressed responses carry "<etag>-gzip"/"<etag>-br", which match too
+    if request.if_none_match.star_tag:
         return True
-    except Exception as e:
-        print(f"Error saving booking: {e}")
-        return False
+    return any(tag == etag or tag.startswith(etag + "-") for tag in request.if_none_match.as_set())
+
+def conditional_response(etag, build, cache_control="no-cache"):
+    # Answer If-None-Match with a 304 before doing any work; otherwise build
+    # the response and tag it. "no-cache" lets clients keep the body but
+    # makes them revalidate each time.
+    if etag_matches(etag):
+        response = app.response_class(status=304)
+    else:
+        response = build()
+        if not isinstance(response, app.response_class):
+            response = app.make_response(response)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+# Compressed bodies of ETagged responses, so polling clients don't cost a recompress
+_compressed_cache = OrderedDict()
+_compressed_cache_lock = threading.Lock()
+COMPRESSED_CACHE_SIZE = 32
+
+def compress_body(data, encoding, etag=None):
+    key = (etag, encoding)
+    if etag:
+        with _compressed_cache_lock:
+            if key in _compressed_cache:
+                _compressed_cache.move_to_end(key)
+                return _compressed_cache[key]
+    if encoding == 'br':
+        body = brotli.compress(data, quality=5)
+    else:
+        body = gzip.compress(data, compresslevel=6, mtime=0)
+    if etag:
+        with _compressed_cache_lock:
+            _compressed_cache[key] = body
+            if len(_compressed_cache) > COMPRESSED_CACHE_SIZE:
+                _compressed_cache.popitem(last=False)
+    return body
+
+@app.after_request
+def compress_response(response):
+    if (not HTTP_COMPRESS_MIN_SIZE or response.status_code != 200 or response.is_streamed
+            or response.direct_passthrough or response.mimetype not in COMPRESSIBLE_TYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < HTTP_COMPRESS_MIN_SIZE:
+        return response
+    if brotli is not None and request.accept_encodings['br']:
+        encoding = 'br'
+    elif request.accept_encodings['gzip']:
+        encoding = 'gzip'
+    else:
+        return response
+    etag, weak = response.get_etag()
+    response.set_data(compress_body(data, encoding, etag))
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        # A different representation needs its own strong ETag
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+# Per-route latency and in-flight requests for /metrics. Recorded at teardown
+# so the time includes compression, and a streamed response counts until its
+# stream ends.
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    # Opt-in profiling of a sample of requests (see profiling.py)
+    g.profile = profiling.get_profiler().start(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.after_request
+def note_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+# Opt-in traffic capture for replay.py (FLIGHT_TRAFFIC_LOG). Runs before
+# compress_response, so write responses are logged as plain JSON.
+@app.after_request
+def record_traffic(response):
+    recorder = replay.get_recorder()
+    if recorder.enabled and recorder.wants(request.path) and 'request_start' in g:
+        recorder.record(request.method, request.path, request.url_rule.rule if request.url_rule else 'unmatched',
+                        request.query_string.decode('latin-1'), request.get_json(silent=True),
+                        response.status_code, time.perf_counter() - g.request_start,
+                        response.get_json(silent=True) if request.method == 'POST' else None)
+    return response
+
+@app.teardown_request
+def record_request_metrics(exc):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiling.get_profiler().stop(profile)
+    start = g.pop('request_start', None)
+    if start is None:
+        return
+    metrics.REQUESTS_IN_FLIGHT.dec()
+    # The route pattern, not the path, so IDs don't each get their own series
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = 500 if exc is not None else g.get('response_status', 500)
+    metrics.REQUEST_LATENCY.observe(time.perf_counter() - start, request.method, route, str(status))
+
+BOOKING_FIELDS = [
+    "bookingId", "bookingIndex", "flightNumber", "destination", "seat", "food", "drinks",
+    "comfort", "services", "services_display", "totalCost", "raw_line"
+]
+
+def booking_to_web(position, booking, fields=None):
+    # Same shape as load_bookings_web, but only builds the requested fields
+    services = booking["services"]
+    item = {
+        "bookingId": booking["booking_id"],
+        "bookingIndex": position,
+        "flightNumber": booking["flight_number"],
+        "destination": booking["destination"],
+        "seat": booking["seat"]
+    }
+    if services:
+        item.update(services)
+        item["totalCost"] = f"${booking['total_cost']:.2f}"
+        if fields is None or "services_display" in fields:
+            item["services_display"] = parse_services_codes(
+                f"{services['food']},{services['drinks']},{services['comfort']}")
+    else:
+        item["services"] = "none"
+    if fields is None or "raw_line" in fields:
+        item["raw_line"] = format_booking_line(booking["flight_number"], booking["destination"],
+                                               booking["seat"], services, booking["total_cost"],
+                                               booking["booking_id"]).strip()
+    if fields is not None:
+        item = {key: value for key, value in item.items() if key in fields}
+    return item
+
+def load_bookings_web():
+    return [booking_to_web(position, booking) for position, booking in enumerate(load_bookings())]
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return conditional_response(INDEX_ETAG, lambda: app.response_class(INDEX_HTML, mimetype='text/html'))
+
+def requested_day(args):
+    # ?date=YYYY-MM-DD selects one day's dated inventory. Returns (date or
+    # None, error or None); days that have passed or aren't on sale yet are errors.
+    if not args.get('date'):
+        return None, None
+    try:
+        day = dated_inventory.parse_date(args['date'])
+    except ValueError:
+        return None, 'date must be YYYY-MM-DD'
+    return day, dated_inventory.check_date(day)
+
+def dated_flight(flight_number, date):
+    # The flight key bookings and holds use for a flight on a given date
+    return f"{flight_number}{dated_inventory.DATE_SEPARATOR}{date}" if date else flight_number
 
 @app.route('/api/flights')
 def api_flights():
-    flights = load_flights()
-    return jsonify(flights)
+    # Served from the in-memory inventory cache, reparsed only when the data changes
+    day, error = requested_day(request.args)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    return conditional_response(make_etag("flights", day, flights_version(day)),
+                                lambda: app.response_class(current_flights_json(day), mimetype='application/json'))
+
+@app.route('/api/flights/availability')
+def api_flights_availability():
+    # Seat counts only - enough for the flight list without shipping every seat
+    day, error = requested_day(request.args)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    return conditional_response(make_etag("availability", day, flights_version(day)),
+                                lambda: jsonify(current_availability(day)))
+
+@app.route('/api/flights/stream')
+def api_flights_stream():
+    # Server-sent events: one "seats" event per claim/release batch on a
+    # flight ({"flight", "claimed", "released"}). A "resync" event means the
+    # client missed something and should refetch availability.
+    bus = get_bus()
+    try:
+        last_seq = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_seq = bus.seq
+
+    def stream():
+        nonlocal last_seq
+        seen_version = flights_version()
+        yield "retry: 3000\n\n"
+        if last_seq > bus.seq:
+            # The server restarted since this client's last event
+            last_seq = bus.seq
+            yield f"id: {last_seq}\nevent: resync\ndata: {{}}\n\n"
+        while True:
+            pending, missed = bus.wait(last_seq, SSE_KEEPALIVE)
+            version = flights_version()
+            if missed:
+                last_seq = bus.seq
+                chunk = f"id: {last_seq}\nevent: resync\ndata: {{}}\n\n"
+            elif pending:
+                last_seq = pending[-1][0]
+                chunk = "".join(f"id: {seq}\nevent: seats\ndata: {json.dumps(event)}\n\n" for seq, event in pending)
+            elif version != seen_version:
+                # Quiet here, but another worker changed the inventory
+                chunk = f"id: {last_seq}\nevent: resync\ndata: {{}}\n\n"
+            else:
+                chunk = ": keepalive\n\n"
+            seen_version = version
+            yield chunk
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/metrics')
+def api_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+def admin_allowed():
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN)
+
+@app.route('/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    # Read or change the profiling settings of the process that answers:
+    # {"rate": 0.1, "mode": "cprofile"|"sample", "routes": [...], "interval": 0.005}
+    if not admin_allowed():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    profiler = profiling.get_profiler()
+    if request.method == 'POST':
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'error': 'Invalid JSON data'}), 400
+        try:
+            profiler.configure(**{key: data[key] for key in ('rate', 'mode', 'routes', 'interval') if key in data})
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, **profiler.settings()})
+
+@app.route('/admin/profile/dump', methods=['POST'])
+def admin_profile_dump():
+    if not admin_allowed():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    return jsonify({'success': True, 'files': profiling.get_profiler().dump()})
+
+@app.route('/api/flights/cache-stats')
+def api_flights_cache_stats():
+    return jsonify(flights_cache_stats())
 
 @app.route('/api/bookings')
 def api_bookings():
-    bookings = load_bookings_web()
-    return jsonify(bookings)
+    etag = make_etag("bookings", bookings_version(), request.query_string)
+    return conditional_response(etag, lambda: jsonify(bookings_payload(request.args)))
+
+def bookings_payload(args):
+    # The /api/bookings body for a mapping of query arguments
+    paging_args = {'cursor', 'limit', 'flightNumber', 'destination', 'hasServices', 'fields'}
+    if not paging_args & set(args):
+        # No paging requested - the full list, as before
+        return load_bookings_web()
+    
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return {'success': False, 'error': 'Invalid limit'}
+    
+    has_services = args.get('hasServices')
+    if has_services is not None:
+        has_services = has_services.lower() in ('1', 'true', 'yes')
+    
+    fields = None
+    if args.get('fields'):
+        fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in BOOKING_FIELDS]
+        if unknown:
+            return {'success': False, 'error': f"Unknown fields: {', '.join(unknown)}"}
+    
+    try:
+        page, next_cursor = query_bookings(args.get('cursor'), limit, args.get('flightNumber'),
+                                           args.get('destination'), has_services)
+    except ValueError:
+        return {'success': False, 'error': 'Invalid cursor'}
+    return {
+        'bookings': [booking_to_web(position, booking, fields) for position, booking in page],
+        'nextCursor': next_cursor
+    }
+
+@app.route('/api/bookings/<booking_id>')
+def api_booking(booking_id):
+    return conditional_response(make_etag("booking", bookings_version(), booking_id),
+                                lambda: jsonify(booking_payload(booking_id)))
+
+def booking_payload(booking_id):
+    booking = get_booking(booking_id)
+    if booking is None:
+        return {'success': False, 'error': 'Invalid booking'}
+    item = booking_to_web(None, booking)
+    del item['bookingIndex']
+    return item
+
+@app.route('/api/stats')
+def api_stats():
+    # Seats sold/remaining, load factor, ancillary revenue and service mix
+    # per flight and per destination
+    return conditional_response(make_etag("stats", flights_version(), bookings_version()),
+                                lambda: jsonify(booking_stats()))
 
 @app.route('/api/services')
 def api_services():
-    return jsonify(INFLIGHT_SERVICES)
+    return conditional_response(SERVICES_ETAG, lambda: jsonify(INFLIGHT_SERVICES),
+                                f"public, max-age={SERVICES_MAX_AGE}")
+
+@app.route('/api/search')
+def api_search():
+    args = request.args
+    return conditional_response(make_etag("search", search_version(args), sorted(args.items())),
+                                lambda: jsonify(search_payload(args)))
+
+def search_version(args):
+    # A dated search reads every day its itineraries can reach
+    day, error = requested_day(args)
+    if day is None or error:
+        return schedule_version(), flights_version()
+    return (schedule_version(), flights_version(day)[1],
+            dated_inventory.days_version(day, search_days(routes.MAX_STOPS)))
+
+def search_payload(args):
+    # ?from=&to=[&after=HH:MM][&maxStops=1][&limit=10][&date=YYYY-MM-DD]
+    origin, destination = args.get('from', '').strip(), args.get('to', '').strip()
+    if not origin or not destination:
+        return {'success': False, 'error': 'from and to are required'}
+    try:
+        depart_after = routes.parse_time(args['after']) if args.get('after') else 0
+        max_stops = int(args.get('maxStops', 1))
+        limit = int(args.get('limit', 10))
+    except ValueError:
+        return {'success': False, 'error': 'Invalid after, maxStops or limit'}
+    if not 0 <= max_stops <= routes.MAX_STOPS:
+        return {'success': False, 'error': f"maxStops must be between 0 and {routes.MAX_STOPS}"}
+    if not 1 <= limit <= 100:
+        return {'success': False, 'error': 'limit must be between 1 and 100'}
+    day, error = requested_day(args)
+    if error:
+        return {'success': False, 'error': error}
+    return {'success': True,
+            'itineraries': search_flights(origin, destination, depart_after, max_stops, limit, day)}
+
+@app.route('/api/hold', methods=['POST'])
+def api_hold():
+    return jsonify(hold_payload(request.get_json(silent=True)))
+
+def hold_payload(data):
+    # {"flightNumber", "seat", "date"?, "ttl"?} -> the hold; pass its holdId to /api/book
+    if not isinstance(data, dict) or 'flightNumber' not in data or 'seat' not in data:
+        return {'success': False, 'error': 'Invalid JSON data'}
+    try:
+        ttl = float(data['ttl']) if data.get('ttl') is not None else None
+    except (TypeError, ValueError):
+        return {'success': False, 'error': 'Invalid ttl'}
+    hold, error = hold_seat(dated_flight(data['flightNumber'], data.get('date')), data['seat'], ttl)
+    if error:
+        return {'success': False, 'error': error}
+    return {'success': True, **hold}
+
+@app.route('/api/hold/release', methods=['POST'])
+def api_release_hold():
+    return jsonify(release_hold_payload(request.get_json(silent=True)))
+
+def release_hold_payload(data):
+    if not isinstance(data, dict) or not data.get('holdId'):
+        return {'success': False, 'error': 'Invalid JSON data'}
+    error = release_hold(data['holdId'])
+    if error:
+        return {'success': False, 'error': error}
+    return {'success': True}
+
+# Fields a write endpoint's JSON body must have, and the error (a 400) for
+# one without them
+REQUIRED_FIELDS = {
+    'book': (('flightNumber', 'seat'), 'A booking needs a flightNumber and seat'),
+    'update-services': (('bookingId',), 'A services update needs a bookingId'),
+}
+
+def request_error(data, endpoint):
+    # None if data is a JSON object with the endpoint's required fields
+    if not isinstance(data, dict):
+        return 'Invalid JSON data'
+    fields, error = REQUIRED_FIELDS[endpoint]
+    return error if any(field not in data for field in fields) else None
 
 @app.route('/api/book', methods=['POST'])
 def api_book():
-    data = request.get_json()
-    if data is None:
-        return jsonify({'success': False, 'error': 'Invalid JSON data'})
-    flight_number = data['flightNumber']
+    data = request.get_json(silent=True)
+    error = request_error(data, 'book')
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    return jsonify(book_payload(data))
+
+def book_payload(data):
+    error = request_error(data, 'book')
+    if error:
+        return {'success': False, 'error': error}
+    # "date": "YYYY-MM-DD" books the flight on that day (see dated_inventory.py)
+    flight_number = dated_flight(data['flightNumber'], data.get('date'))
     seat = data['seat']
     services = data.get('services')
     
-    flights = load_flights()
-    
-    if flight_number not in flights or seat not in flights[flight_number]['seats']:
-        return jsonify({'success': False, 'error': 'Invalid flight or seat'})
-    
-    # Remove seat from available seats
-    flights[flight_number]['seats'].remove(seat)
-    save_flights(flights)
-    
-    # Save booking
-    destination = flights[flight_number]['destination']
-    success = save_booking_web(flight_number, destination, seat, services)
-    
-    if success:
-        return jsonify({'success': True})
-    else:
-        # Restore seat if booking failed
-        flights[flight_number]['seats'].append(seat)
-        save_flights(flights)
-        return jsonify({'success': False, 'error': 'Booking failed'})
+    # Claim the seat and record the booking atomically under the flight's lock
+    booking_id, error = book_seat(flight_number, seat, services, data.get('holdId'))
+    if error:
+        return {'success': False, 'error': error}
+    return {'success': True, 'bookingId': booking_id}
+
+@app.route('/api/book/batch', methods=['POST'])
+def api_book_batch():
+    return jsonify(book_batch_payload(request.get_json()))
+
+def book_batch_payload(data):
+    # Group booking: {"bookings": [{"flightNumber", "seat", "date"?, "services"}, ...]}.
+    # Either every seat is booked or none is.
+    if data is None or not isinstance(data.get('bookings'), list):
+        return {'success': False, 'error': 'Invalid JSON data'}
+    try:
+        seats = [{'flight_number': dated_flight(item['flightNumber'], item.get('date')), 'seat': item['seat'],
+                  'services': item.get('services'),
+                  'hold_id': item.get('holdId')} for item in data['bookings']]
+    except (KeyError, TypeError):
+        return {'success': False, 'error': 'Each booking needs a flightNumber and seat'}
+
+    booking_ids, error = book_seats(seats)
+    if error:
+        return {'success': False, 'error': error}
+    return {'success': True, 'bookingIds': booking_ids}
 
 @app.route('/api/cancel-booking', methods=['POST'])
 def api_cancel_booking():
-    data = request.get_json()
+    return jsonify(cancel_payload(request.get_json()))
+
+def cancel_payload(data):
     if data is None:
-        return jsonify({'success': False, 'error': 'Invalid JSON data'})
-    booking_index = data['bookingIndex']
-    
-    bookings = load_bookings_web()
-    flights = load_flights()
-    
-    if booking_index >= len(bookings):
-        return jsonify({'success': False, 'error': 'Invalid booking'})
+        return {'success': False, 'error': 'Invalid JSON data'}
+    # Bookings are addressed by ID; bookingIndex is still accepted from older clients
+    booking_id = data.get('bookingId')
+    if booking_id is None and 'bookingIndex' in data:
+        booking_id = booking_id_at(data['bookingIndex'])
+    if booking_id is None:
+        return {'success': False, 'error': 'Invalid booking'}
     
-    booking = bookings[booking_index]
-    
-    # Add seat back to available seats
-    if booking['flightNumber'] in flights:
-        flights[booking['flightNumber']]['seats'].append(booking['seat'])
-        flights[booking['flightNumber']]['seats'].sort()
-    
-    # Remove booking by rewriting the file without this booking
     try:
-        with open(BOOKED_FILE, "r") as f:
-            all_lines = f.readlines()
-        
-        # Remove the specific line
-        if 0 <= booking_index < len(all_lines):
-            all_lines.pop(booking_index)
-            
-        with open(BOOKED_FILE, "w") as f:
-            f.writelines(all_lines)
-            
-        save_flights(flights)
-        return jsonify({'success': True})
+        error = cancel_booking(booking_id)
+        if error:
+            return {'success': False, 'error': error}
+        return {'success': True}
         
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        return {'success': False, 'error': str(e)}
 
-if __name__ == '__main__':
-    # Create templates directory if it doesn't exist
-    os.makedirs('templates', exist_ok=True)
-    
-    # Create the HTML template with fixed JavaScript types
-    with open('templates/index.html', 'w') as f:
-        f.write("""<!DOCTYPE html>
+@app.route('/api/update-services', methods=['POST'])
+def api_update_services():
+    data = request.get_json(silent=True)
+    error = request_error(data, 'update-services')
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    return jsonify(update_services_payload(data))
+
+def update_services_payload(data):
+    error = request_error(data, 'update-services')
+    if error:
+        return {'success': False, 'error': error}
+    # Leaving services out clears them, like an empty selection
+    error = update_booking_services(data['bookingId'], data.get('services'))
+    if error:
+        return {'success': False, 'error': error}
+    return {'success': True}
+
+# The single-page frontend. It has no template variables, so it is served
+# straight from memory and never re-rendered; write_template() keeps
+# templates/index.html in step for anything that still reads the file.
+INDEX_HTML = """<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -335,6 +690,11 @@ if __name__ == '__main__':
 
         let currentFlight = null;
         let currentSeat = null;
+        // Hold on currentSeat while services are being chosen (see /api/hold)
+        let currentHold = null;
+        // Seat counts per flight, and the open flight's seats, kept current by the event stream
+        let availability = {};
+        let currentFlightInfo = null;
 
         // Tab management
         function showTab(tabName) {
@@ -363,99 +723,118 @@ if __name__ == '__main__':
         // Load and display flights
         async function loadFlights() {
             try {
-                const response = await fetch('/api/flights');
-                const flights = await response.json();
-                
-                const flightsGrid = document.getElementById('flightsGrid');
-                flightsGrid.innerHTML = '';
-                
-                for (const [flightNumber, info] of Object.entries(flights)) {
-                    const flightCard = `
-                        <div class="bg-white border rounded-lg p-6 hover:shadow-lg transition-shadow">
-                            <div class="flex items-center gap-2 mb-2">
-                                <i class="fas fa-plane text-blue-600"></i>
-                                <h3 class="text-lg font-semibold">${flightNumber}</h3>
-                            </div>
-                            <p class="text-gray-600 mb-4">${info.destination}</p>
-                            <div class="flex items-center justify-between">
-                                <span class="text-sm text-gray-500">
-                                    ${info.seats.length} ${info.seats.length === 1 ? 'seat' : 'seats'} available
-                                </span>
-                                <button class="bg-blue-600 text-white px-4 py-2 rounded hover:bg-blue-700 transition-colors ${info.seats.length === 0 ? 'opacity-50 cursor-not-allowed' : ''}"
-                                        ${info.seats.length === 0 ? 'disabled' : ''}
-                                        onclick="selectFlight('${flightNumber}')">
-                                    Select
-                                </button>
-                            </div>
-                        </div>
-                    `;
-                    flightsGrid.innerHTML += flightCard;
-                }
+                const response = await fetch('/api/flights/availability');
+                availability = await response.json();
+                renderFlights();
             } catch (error) {
                 console.error('Error loading flights:', error);
             }
         }
 
+        function renderFlights() {
+            const flightsGrid = document.getElementById('flightsGrid');
+            flightsGrid.innerHTML = '';
+            
+            for (const [flightNumber, info] of Object.entries(availability)) {
+                const flightCard = `
+                    <div class="bg-white border rounded-lg p-6 hover:shadow-lg transition-shadow">
+                        <div class="flex items-center gap-2 mb-2">
+                            <i class="fas fa-plane text-blue-600"></i>
+                            <h3 class="text-lg font-semibold">${flightNumber}</h3>
+                        </div>
+                        <p class="text-gray-600 mb-4">${info.destination}</p>
+                        <div class="flex items-center justify-between">
+                            <span class="text-sm text-gray-500">
+                                ${info.seatsLeft} ${info.seatsLeft === 1 ? 'seat' : 'seats'} available
+                            </span>
+                            <button class="bg-blue-600 text-white px-4 py-2 rounded hover:bg-blue-700 transition-colors ${info.seatsLeft === 0 ? 'opacity-50 cursor-not-allowed' : ''}"
+                                    ${info.seatsLeft === 0 ? 'disabled' : ''}
+                                    onclick="selectFlight('${flightNumber}')">
+                                Select
+                            </button>
+                        </div>
+                    </div>
+                `;
+                flightsGrid.innerHTML += flightCard;
+            }
+        }
+
         function showFlightList() {
+            releaseHold();
             document.getElementById('flightList').classList.remove('hidden');
             document.getElementById('seatSelection').classList.add('hidden');
             document.getElementById('servicesSelection').classList.add('hidden');
-            loadFlights();
+            // With the event stream up, the counts we have are already current
+            if (seatStream) {
+                renderFlights();
+            } else {
+                loadFlights();
+            }
         }
 
-        async function selectFlight(flightNumber) {
+        async function selectFlight(flightNumber, keepSeat = false) {
             currentFlight = flightNumber;
+            if (!keepSeat) {
+                currentSeat = null;
+            }
             
             try {
                 const response = await fetch('/api/flights');
                 const flights = await response.json();
-                const flight = flights[flightNumber];
+                currentFlightInfo = flights[flightNumber];
+                if (currentSeat && !currentFlightInfo.seats.includes(currentSeat)) {
+                    currentSeat = null;
+                }
                 
                 document.getElementById('flightList').classList.add('hidden');
                 document.getElementById('seatSelection').classList.remove('hidden');
-                
-                const seatContent = document.getElementById('seatSelectionContent');
-                seatContent.innerHTML = `
-                    <div class="bg-white border rounded-lg p-6">
-                        <h2 class="text-xl font-semibold mb-2">Select Your Seat</h2>
-                        <p class="text-gray-600 mb-6">Flight ${flightNumber} to ${flight.destination}</p>
-                        
-                        ${flight.seats.length === 0 ? `
-                            <p class="text-center text-gray-500 py-8">No seats available on this flight.</p>
-                        ` : `
-                            <div class="seat-grid mb-6">
-                                ${flight.seats.map(seat => `
-                                    <div class="seat" onclick="selectSeat('${seat}')">
-                                        <i class="fas fa-chair text-sm"></i>
-                                        <span class="text-xs mt-1">${seat}</span>
-                                    </div>
-                                `).join('')}
-                            </div>
-                            
-                            <div id="seatActions" class="hidden bg-blue-50 rounded-lg p-4">
-                                <div class="flex justify-between items-center mb-4">
-                                    <span class="font-medium">Selected Seat:</span>
-                                    <span class="bg-blue-100 text-blue-800 px-3 py-1 rounded-full text-sm font-medium" id="selectedSeatDisplay"></span>
-                                </div>
-                                <div class="flex flex-col sm:flex-row gap-2">
-                                    <button class="flex-1 bg-white border border-gray-300 text-gray-700 px-4 py-2 rounded hover:bg-gray-50 transition-colors"
-                                            onclick="bookSeat(false)">
-                                        Book Without Services
-                                    </button>
-                                    <button class="flex-1 bg-blue-600 text-white px-4 py-2 rounded hover:bg-blue-700 transition-colors"
-                                            onclick="bookSeat(true)">
-                                        Book With Services
-                                    </button>
-                                </div>
-                            </div>
-                        `}
-                    </div>
-                `;
+                renderSeatSelection();
             } catch (error) {
                 console.error('Error loading flight details:', error);
             }
         }
 
+        function renderSeatSelection() {
+            const flight = currentFlightInfo;
+            const seatContent = document.getElementById('seatSelectionContent');
+            seatContent.innerHTML = `
+                <div class="bg-white border rounded-lg p-6">
+                    <h2 class="text-xl font-semibold mb-2">Select Your Seat</h2>
+                    <p class="text-gray-600 mb-6">Flight ${currentFlight} to ${flight.destination}</p>
+                    
+                    ${flight.seats.length === 0 ? `
+                        <p class="text-center text-gray-500 py-8">No seats available on this flight.</p>
+                    ` : `
+                        <div class="seat-grid mb-6">
+                            ${flight.seats.map(seat => `
+                                <div class="seat ${seat === currentSeat ? 'selected' : ''}" onclick="selectSeat('${seat}')">
+                                    <i class="fas fa-chair text-sm"></i>
+                                    <span class="text-xs mt-1">${seat}</span>
+                                </div>
+                            `).join('')}
+                        </div>
+                        
+                        <div id="seatActions" class="${currentSeat ? '' : 'hidden'} bg-blue-50 rounded-lg p-4">
+                            <div class="flex justify-between items-center mb-4">
+                                <span class="font-medium">Selected Seat:</span>
+                                <span class="bg-blue-100 text-blue-800 px-3 py-1 rounded-full text-sm font-medium" id="selectedSeatDisplay">${currentSeat || ''}</span>
+                            </div>
+                            <div class="flex flex-col sm:flex-row gap-2">
+                                <button class="flex-1 bg-white border border-gray-300 text-gray-700 px-4 py-2 rounded hover:bg-gray-50 transition-colors"
+                                        onclick="bookSeat(false)">
+                                    Book Without Services
+                                </button>
+                                <button class="flex-1 bg-blue-600 text-white px-4 py-2 rounded hover:bg-blue-700 transition-colors"
+                                        onclick="bookSeat(true)">
+                                    Book With Services
+                                </button>
+                            </div>
+                        </div>
+                    `}
+                </div>
+            `;
+        }
+
         function selectSeat(seat) {
             currentSeat = seat;
             
@@ -473,6 +852,7 @@ if __name__ == '__main__':
         }
 
         function showSeatSelection() {
+            releaseHold();
             document.getElementById('seatSelection').classList.remove('hidden');
             document.getElementById('servicesSelection').classList.add('hidden');
         }
@@ -495,7 +875,6 @@ if __name__ == '__main__':
                     if (result.success) {
                         alert(`Successfully booked seat ${currentSeat} on ${currentFlight}!`);
                         showFlightList();
-                        loadFlights();
                     } else {
                         alert('Booking failed: ' + result.error);
                     }
@@ -503,11 +882,45 @@ if __name__ == '__main__':
                     alert('Booking failed: ' + error.message);
                 }
             } else {
-                // Show services selection
+                // Keep the seat while services are chosen, then show them
+                try {
+                    const response = await fetch('/api/hold', {
+                        method: 'POST',
+                        headers: {'Content-Type': 'application/json'},
+                        body: JSON.stringify({
+                            flightNumber: currentFlight,
+                            seat: currentSeat
+                        })
+                    });
+                    
+                    const result = await response.json();
+                    if (!result.success) {
+                        alert('Seat no longer available: ' + result.error);
+                        selectFlight(currentFlight);
+                        return;
+                    }
+                    currentHold = result.holdId;
+                } catch (error) {
+                    alert('Booking failed: ' + error.message);
+                    return;
+                }
                 await showServicesSelection();
             }
         }
 
+        function releaseHold() {
+            if (!currentHold) {
+                return;
+            }
+            const holdId = currentHold;
+            currentHold = null;
+            fetch('/api/hold/release', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({holdId: holdId})
+            }).catch(() => {});
+        }
+
         async function showServicesSelection() {
             document.getElementById('seatSelection').classList.add('hidden');
             document.getElementById('servicesSelection').classList.remove('hidden');
@@ -664,15 +1077,17 @@ if __name__ == '__main__':
                     body: JSON.stringify({
                         flightNumber: currentFlight,
                         seat: currentSeat,
-                        services: services
+                        services: services,
+                        holdId: currentHold
                     })
                 });
                 
+                // Booked or not, the hold has been used up
+                currentHold = null;
                 const result = await response.json();
                 if (result.success) {
                     alert(`Successfully booked seat ${currentSeat} on ${currentFlight} with services!`);
                     showFlightList();
-                    loadFlights();
                 } else {
                     alert('Booking failed: ' + result.error);
                 }
@@ -681,14 +1096,25 @@ if __name__ == '__main__':
             }
         }
 
-        async function loadBookings() {
+        // Bookings are fetched a page at a time
+        const BOOKINGS_PAGE_SIZE = 50;
+        let bookingsCursor = null;
+        
+        async function loadBookings(append = false) {
             try {
-                const response = await fetch('/api/bookings');
-                const bookings = await response.json();
+                const cursor = append ? bookingsCursor : '';
+                const response = await fetch(`/api/bookings?limit=${BOOKINGS_PAGE_SIZE}&cursor=${encodeURIComponent(cursor)}`);
+                const page = await response.json();
+                const bookings = page.bookings;
+                bookingsCursor = page.nextCursor;
                 
                 const bookingsList = document.getElementById('bookingsList');
+                const loadMore = document.getElementById('loadMoreBookings');
+                if (loadMore) {
+                    loadMore.remove();
+                }
                 
-                if (bookings.length === 0) {
+                if (!append && bookings.length === 0) {
                     bookingsList.innerHTML = `
                         <div class="bg-white border rounded-lg p-6 text-center">
                             <p class="text-gray-500">No booked flights yet.</p>
@@ -698,7 +1124,7 @@ if __name__ == '__main__':
                     return;
                 }
                 
-                bookingsList.innerHTML = bookings.map((booking, index) => `
+                const cards = bookings.map(booking => `
                     <div class="bg-white border rounded-lg p-6">
                         <div class="flex items-start justify-between mb-4">
                             <div>
@@ -737,31 +1163,45 @@ if __name__ == '__main__':
                         
                         <div class="mt-4">
                             <button class="bg-red-600 text-white px-3 py-2 rounded text-sm hover:bg-red-700 transition-colors"
-                                    onclick="cancelBooking(${index})">
+                                    onclick="cancelBooking('${booking.bookingId}')">
                                 <i class="fas fa-trash mr-1"></i>Cancel Booking
                             </button>
                         </div>
                     </div>
                 `).join('');
+                
+                const more = bookingsCursor === null ? '' : `
+                    <button id="loadMoreBookings" class="w-full bg-white border border-gray-300 text-gray-700 px-4 py-2 rounded hover:bg-gray-50 transition-colors"
+                            onclick="loadBookings(true)">
+                        Load more bookings
+                    </button>
+                `;
+                if (append) {
+                    bookingsList.insertAdjacentHTML('beforeend', cards + more);
+                } else {
+                    bookingsList.innerHTML = cards + more;
+                }
             } catch (error) {
                 console.error('Error loading bookings:', error);
             }
         }
 
-        async function cancelBooking(bookingIndex) {
+        async function cancelBooking(bookingId) {
             if (confirm('Are you sure you want to cancel this booking?')) {
                 try {
                     const response = await fetch('/api/cancel-booking', {
                         method: 'POST',
                         headers: {'Content-Type': 'application/json'},
-                        body: JSON.stringify({ bookingIndex: parseInt(bookingIndex) })
+                        body: JSON.stringify({ bookingId: bookingId })
                     });
                     
                     const result = await response.json();
                     if (result.success) {
                         alert('Booking cancelled successfully!');
                         loadBookings();
-                        loadFlights();
+                        if (!seatStream) {
+                            loadFlights();
+                        }
                     } else {
                         alert('Cancellation failed: ' + result.error);
                     }
@@ -771,11 +1211,94 @@ if __name__ == '__main__':
             }
         }
 
+        // Live seat updates from /api/flights/stream
+        let seatStream = null;
+
+        function seatOrder(a, b) {
+            const rowA = parseInt(a), rowB = parseInt(b);
+            return rowA !== rowB ? rowA - rowB : a.localeCompare(b);
+        }
+
+        function applySeatEvent(change) {
+            const info = availability[change.flight];
+            if (info) {
+                info.seatsLeft += change.released.length - change.claimed.length;
+                renderFlights();
+            }
+            if (change.flight !== currentFlight || !currentFlightInfo) {
+                return;
+            }
+            const seats = new Set(currentFlightInfo.seats);
+            change.claimed.forEach(seat => seats.delete(seat));
+            change.released.forEach(seat => seats.add(seat));
+            currentFlightInfo.seats = Array.from(seats).sort(seatOrder);
+            // Our own hold shows up as a claim too
+            if (currentSeat && !seats.has(currentSeat) && !currentHold) {
+                currentSeat = null;
+            }
+            if (!document.getElementById('seatSelection').classList.contains('hidden')) {
+                renderSeatSelection();
+            }
+        }
+
+        function subscribeSeats() {
+            if (!window.EventSource) {
+                return;
+            }
+            const source = new EventSource('/api/flights/stream');
+            source.onopen = () => {
+                // Anything may have changed while we were disconnected
+                if (seatStream !== source) {
+                    seatStream = source;
+                    loadFlights();
+                }
+            };
+            source.addEventListener('seats', e => applySeatEvent(JSON.parse(e.data)));
+            source.addEventListener('resync', () => {
+                loadFlights();
+                if (currentFlight && !document.getElementById('seatSelection').classList.contains('hidden')) {
+                    selectFlight(currentFlight, true);
+                }
+            });
+            source.onerror = () => {
+                if (source.readyState === EventSource.CLOSED) {
+                    seatStream = null;
+                }
+            };
+        }
+
         // Initialize
         document.addEventListener('DOMContentLoaded', function() {
             loadFlights();
+            subscribeSeats();
+        });
+        
+        // Give a held seat back straight away when the page is closed
+        window.addEventListener('pagehide', function() {
+            if (currentHold && navigator.sendBeacon) {
+                navigator.sendBeacon('/api/hold/release',
+                    new Blob([JSON.stringify({holdId: currentHold})], {type: 'application/json'}));
+                currentHold = null;
+            }
         });
     </script>
 </body>
-</html>""")
-    app.run(debug=True, port=5000)
\ No newline at end of file
+</html>"""
+INDEX_ETAG = make_etag("index", INDEX_HTML)
+
+def write_template():
+    # Create templates directory if it doesn't exist
+    os.makedirs('templates', exist_ok=True)
+    path = os.path.join('templates', 'index.html')
+    try:
+        with open(path) as f:
+            if f.read() == INDEX_HTML:
+                return
+    except FileNotFoundError:
+        pass
+    with open(path, 'w') as f:
+        f.write(INDEX_HTML)
+
+if __name__ == '__main__':
+    write_template()
+    app.run(debug=True, port=5000)